@@ -0,0 +1,151 @@
+import json
+import os
+import platform
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Any
+
+from src.benchmarks.corpus import generate_raw_file
+from src.processing.chunking import CHUNKER_VERSION, MarkdownChunker
+from src.utils.config import BENCHMARK_DIR
+from src.utils.json_stream import iter_json_array
+from src.utils.logger import configure_logging, get_logger
+
+logger = get_logger()
+
+# Corpus shapes benchmarked by default: typical docs, code-heavy pages, deep headers and pages with minified lines
+DEFAULT_CASES = {
+    "docs": {"pages": 200},
+    "code_heavy": {"pages": 100, "code_block_lines": (50, 400), "code_block_probability": 0.8},
+    "deep_headers": {"pages": 200, "sections": 20, "max_header_depth": 6},
+    "long_lines": {"pages": 100, "long_line_probability": 0.3, "long_line_words": 6000},
+}
+
+
+class CountingTokenizer:
+    """Wraps a tiktoken encoding and counts the calls made to it"""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.calls = {}
+
+    def __getattr__(self, name: str):
+        # only called for missing attributes; read __dict__ directly so that an instance without its attributes
+        # (e.g. while unpickling) raises AttributeError instead of recursing
+        tokenizer = self.__dict__.get("tokenizer")
+        if tokenizer is None:
+            raise AttributeError(name)
+        attribute = getattr(tokenizer, name)
+        if not callable(attribute):
+            return attribute
+
+        def counted(*args, **kwargs):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return attribute(*args, **kwargs)
+
+        return counted
+
+
+def _peak_rss_mb() -> tuple[float, float]:
+    """Peak resident set size of this process and of its largest child process, in MB"""
+    scale = 1024 * 1024 if platform.system() == "Darwin" else 1024  # ru_maxrss is bytes on macOS, KB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return own, children
+
+
+def _run_chunker(filepath: str, max_workers: int) -> dict[str, Any]:
+    """Chunks one raw file and measures it, runs in a fresh process so peak RSS belongs to this run only"""
+    chunker = MarkdownChunker(
+        input_filename=os.path.basename(filepath), output_dir=os.path.dirname(filepath), max_workers=max_workers
+    )
+    counting_tokenizer = CountingTokenizer(chunker.tokenizer)
+    encoding = chunker.token_service.encoding
+    if max_workers == 1:
+        # worker processes get their own copy of the chunker, so calls are only counted in serial runs
+        chunker.tokenizer = counting_tokenizer
+        chunker.token_service.encoding = counting_tokenizer
+
+    pages = 0
+
+    def counted_pages():
+        nonlocal pages
+        for page in iter_json_array(filepath, key="data"):
+            pages += 1
+            yield page
+
+    chunks = 0
+    try:
+        start = time.perf_counter()
+        # chunks are counted and dropped as they stream out, so peak RSS measures the chunker and not a chunk list
+        for _ in chunker.iter_validated_chunks(counted_pages()):
+            chunks += 1
+        elapsed = time.perf_counter() - start
+    finally:
+        # the token service is shared by the whole process, e.g. with later tests
+        chunker.token_service.encoding = encoding
+
+    peak_rss_mb, peak_worker_rss_mb = _peak_rss_mb()
+    return {
+        "pages": pages,
+        "chunks": chunks,
+        "tokens": chunker.validator.total_tokens,
+        "seconds": round(elapsed, 4),
+        "pages_per_sec": round(pages / elapsed, 2),
+        "tokens_per_sec": round(chunker.validator.total_tokens / elapsed, 1),
+        "tokenizer_calls": sum(counting_tokenizer.calls.values()) if max_workers == 1 else None,
+        "tokenizer_calls_by_method": counting_tokenizer.calls if max_workers == 1 else None,
+        "token_count_cache": chunker.token_service.cache_info(),
+        "peak_rss_mb": round(peak_rss_mb, 1),
+        "peak_worker_rss_mb": round(peak_worker_rss_mb, 1) if max_workers > 1 else None,
+    }
+
+
+def run_benchmark(
+    cases: dict[str, dict[str, Any]] | None = None, max_workers: int = 1, seed: int = 0, save: bool = True
+) -> dict[str, Any]:
+    """Generates a synthetic corpus per case, chunks it in a fresh process and returns (and saves) the results"""
+    cases = cases or DEFAULT_CASES
+    results = {
+        "chunker_version": CHUNKER_VERSION,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "max_workers": max_workers,
+        "seed": seed,
+        "cases": {},
+    }
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        for name, options in cases.items():
+            filepath = generate_raw_file(os.path.join(corpus_dir, f"{name}.json"), seed=seed, **options)
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                measurements = executor.submit(_run_chunker, filepath, max_workers).result()
+            results["cases"][name] = {"corpus": options, **measurements}
+            logger.info(
+                f"{name}: {measurements['pages_per_sec']} pages/sec, {measurements['tokens_per_sec']} tokens/sec, "
+                f"{measurements['tokenizer_calls']} tokenizer calls, peak RSS {measurements['peak_rss_mb']} MB"
+            )
+
+    if save:
+        output_filepath = os.path.join(
+            BENCHMARK_DIR, f"chunking-v{CHUNKER_VERSION}-{datetime.now():%Y%m%d-%H%M%S}.json"
+        )
+        with open(output_filepath, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Benchmark results saved to {output_filepath}")
+    return results
+
+
+def main():
+    configure_logging()
+    run_benchmark(max_workers=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import json
+import os
+import random
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+_WORDS = (
+    "the api client sends a request with the model name and returns a streamed response token usage is reported "
+    "per message embeddings are stored in the vector database chunk headers keep the page structure config error "
+    "handler retry timeout batch prompt cache tool result"
+).split()
+_CODE_LINES = [
+    "import anthropic",
+    "client = anthropic.Anthropic()",
+    "def handler(event, context):",
+    "    response = client.messages.create(model=model, max_tokens=1024, messages=messages)",
+    "    return response.content[0].text",
+    "",
+    "    # retry on rate limits",
+    "for attempt in range(3):",
+    '    print(f"attempt {attempt}")',
+]
+_BOILERPLATE = ["[Anthropic home page](/logo/light.svg)", "English", "Search...", "Ctrl K", "Navigation", ""]
+
+
+def _sentence(rng: random.Random, n_words: int | None = None) -> str:
+    n_words = n_words or rng.randint(6, 28)
+    words = [rng.choice(_WORDS) for _ in range(n_words)]
+    return " ".join(words).capitalize() + rng.choice([".", ".", ".", "?", ":"])
+
+
+def generate_page(
+    rng: random.Random,
+    page_number: int,
+    sections: int = 8,
+    max_header_depth: int = 3,
+    paragraphs_per_section: int = 4,
+    code_block_lines: tuple[int, int] = (3, 60),
+    code_block_probability: float = 0.3,
+    long_line_probability: float = 0.02,
+    long_line_words: int = 4000,
+) -> dict:
+    """Generates one FireCrawl-shaped page with boilerplate, nested headers, lists, tables and code blocks"""
+    lines = list(_BOILERPLATE)
+    lines += [f"# Guide {page_number}", "", _sentence(rng), ""]
+    for section in range(sections):
+        depth = rng.randint(2, max(2, max_header_depth))
+        lines += [f"{'#' * depth} Section {section} `{rng.choice(_WORDS)}`", ""]
+        for _ in range(rng.randint(1, paragraphs_per_section)):
+            lines += [" ".join(_sentence(rng) for _ in range(rng.randint(1, 6))), ""]
+            if rng.random() < 0.3:
+                lines += [f"- {_sentence(rng, 5)}" for _ in range(rng.randint(2, 6))] + [""]
+            if rng.random() < 0.15:
+                lines += ["| Parameter | Description |", "| --- | --- |"]
+                lines += [f"| `{rng.choice(_WORDS)}` | {_sentence(rng, 8)} |" for _ in range(rng.randint(2, 8))] + [""]
+            if rng.random() < code_block_probability:
+                n_lines = rng.randint(*code_block_lines)
+                lines += ["```python"] + [rng.choice(_CODE_LINES) for _ in range(n_lines)] + ["```", ""]
+            if rng.random() < long_line_probability:
+                lines += [" ".join(rng.choice(_WORDS) for _ in range(long_line_words)), ""]
+    return {
+        "markdown": "\n".join(lines),
+        "metadata": {
+            "title": f"Guide {page_number}",
+            "description": _sentence(rng, 12),
+            "sourceURL": f"https://docs.example.com/guides/{page_number}",
+            "language": "en",
+        },
+    }
+
+
+def generate_raw_file(filepath: str, pages: int = 200, seed: int = 0, **page_options) -> str:
+    """Writes a synthetic raw crawl file in the format saved by the crawler and returns its path.
+
+    `page_options` are passed to generate_page to tune header depth, code block sizes and very long lines.
+    """
+    rng = random.Random(seed)
+    data = [generate_page(rng, page_number, **page_options) for page_number in range(pages)]
+    raw = {
+        "job_failed": False,
+        "input_url": "https://docs.example.com/guides",
+        "total_pages": len(data),
+        "unique_links": [page["metadata"]["sourceURL"] for page in data],
+        "data": data,
+    }
+    os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+    with open(filepath, "w", encoding="utf-8") as f:
+        json.dump(raw, f)
+    logger.info(f"Generated synthetic corpus with {pages} pages at {filepath}")
+    return filepath
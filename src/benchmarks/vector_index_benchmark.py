@@ -0,0 +1,137 @@
+import json
+import os
+import platform
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Any
+
+import numpy as np
+
+from src.utils.config import BENCHMARK_DIR
+from src.utils.logger import configure_logging, get_logger
+
+logger = get_logger()
+
+COLLECTION_NAME = "benchmark"
+BACKENDS = ("numpy", "chroma")
+
+
+def _unit_vectors(n: int, dimensions: int, seed: int) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(n, dimensions)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _open_collection(backend: str, path: str, create: bool = False):
+    """Opens the benchmark collection of a backend, importing the backend on first use"""
+    if backend == "numpy":
+        from src.vector_storage.numpy_index import NumpyCollection
+
+        return NumpyCollection(os.path.join(path, COLLECTION_NAME), COLLECTION_NAME)
+    import chromadb
+
+    client = chromadb.PersistentClient(path=path)
+    if create:
+        return client.get_or_create_collection(COLLECTION_NAME)
+    return client.get_collection(COLLECTION_NAME)
+
+
+def _cold_start(backend: str, path: str, queries: list[list[float]], n_results: int) -> dict[str, float]:
+    """Imports, opens and queries a stored collection, runs in a fresh interpreter so nothing is warm"""
+    start = time.perf_counter()
+    collection = _open_collection(backend, path)
+    opened = time.perf_counter()
+    collection.query(query_embeddings=queries, n_results=n_results, include=["documents", "distances"])
+    queried = time.perf_counter()
+    return {"open_seconds": round(opened - start, 4), "first_query_seconds": round(queried - opened, 4)}
+
+
+def _benchmark_backend(
+    backend: str, vectors: np.ndarray, queries: np.ndarray, n_results: int, repeat: int, batch_size: int = 512
+) -> dict[str, Any]:
+    with tempfile.TemporaryDirectory() as path:
+        collection = _open_collection(backend, path, create=True)
+        start = time.perf_counter()
+        for offset in range(0, len(vectors), batch_size):
+            ids = [f"chunk-{i}" for i in range(offset, min(offset + batch_size, len(vectors)))]
+            collection.upsert(
+                ids=ids,
+                embeddings=vectors[offset : offset + batch_size].tolist(),
+                documents=[f"Document {chunk_id}" for chunk_id in ids],
+                metadatas=[{"source_file": f"file-{int(chunk_id.split('-')[1]) % 10}.jsonl"} for chunk_id in ids],
+            )
+        build_seconds = time.perf_counter() - start
+
+        # one multi-query search as ResultRetriever issues it: the user query plus generated variants
+        timings = []
+        for batch in np.array_split(queries, repeat):
+            start = time.perf_counter()
+            collection.query(query_embeddings=batch.tolist(), n_results=n_results, include=["documents", "distances"])
+            timings.append(time.perf_counter() - start)
+        del collection
+
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            cold_start = executor.submit(_cold_start, backend, path, queries[:1].tolist(), n_results).result()
+
+    timings_ms = np.array(timings) * 1000
+    return {
+        "build_seconds": round(build_seconds, 3),
+        "query_ms_p50": round(float(np.percentile(timings_ms, 50)), 3),
+        "query_ms_p95": round(float(np.percentile(timings_ms, 95)), 3),
+        "cold_start": cold_start,
+    }
+
+
+def run_benchmark(
+    chunks: int = 50_000,
+    dimensions: int = 1536,
+    queries_per_search: int = 5,
+    n_results: int = 10,
+    repeat: int = 50,
+    backends: tuple[str, ...] = BACKENDS,
+    save: bool = True,
+) -> dict[str, Any]:
+    """Compares the NumPy brute-force index with Chroma on random unit vectors and returns (and saves) the results"""
+    vectors = _unit_vectors(chunks, dimensions, seed=0)
+    queries = _unit_vectors(queries_per_search * repeat, dimensions, seed=1)
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "chunks": chunks,
+        "dimensions": dimensions,
+        "queries_per_search": queries_per_search,
+        "n_results": n_results,
+        "backends": {},
+    }
+    for backend in backends:
+        if backend == "chroma":
+            try:
+                import chromadb  # noqa: F401
+            except Exception as e:  # a broken install (e.g. a protobuf mismatch) fails with more than ImportError
+                results["backends"][backend] = {"skipped": f"chromadb cannot be imported: {e}"}
+                logger.warning(f"Skipping chroma, chromadb cannot be imported: {e}")
+                continue
+        results["backends"][backend] = measurements = _benchmark_backend(backend, vectors, queries, n_results, repeat)
+        logger.info(
+            f"{backend}: p50 {measurements['query_ms_p50']} ms per {queries_per_search}-query search, "
+            f"cold start {measurements['cold_start']}, built in {measurements['build_seconds']} s"
+        )
+
+    if save:
+        output_filepath = os.path.join(BENCHMARK_DIR, f"vector-index-{datetime.now():%Y%m%d-%H%M%S}.json")
+        with open(output_filepath, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Benchmark results saved to {output_filepath}")
+    return results
+
+
+def main():
+    configure_logging()
+    run_benchmark()
+
+
+if __name__ == "__main__":
+    main()
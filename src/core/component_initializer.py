@@ -2,21 +2,33 @@ from os import listdir
 from os.path import isfile, join
 
 from src.generation.claude_assistant import ClaudeAssistant
-from src.utils.config import PROCESSED_DATA_DIR
+from src.utils.config import MAX_ROUTED_SOURCES, PROCESSED_DATA_DIR, ROUTE_SOURCES, VECTOR_BACKEND
 from src.utils.decorators import base_error_handler
 from src.utils.logger import get_logger
-from src.vector_storage.vector_db import DocumentProcessor, Reranker, ResultRetriever, SummaryManager, VectorDB
+from src.vector_storage.routing import SourceRouter
+from src.vector_storage.vector_db import VECTOR_BACKENDS, DocumentProcessor, Reranker, ResultRetriever, SummaryManager
 
 logger = get_logger()
 
 
 class ComponentInitializer:
 
-    def __init__(self, reset_db: bool = False, load_all_docs: bool = False, files: list[str] | None = None):
+    def __init__(
+        self,
+        reset_db: bool = False,
+        load_all_docs: bool = False,
+        files: list[str] | None = None,
+        vector_backend: str = VECTOR_BACKEND,
+        route_sources: bool = ROUTE_SOURCES,
+    ):
         self.reset_db = reset_db
         self.files_dir = PROCESSED_DATA_DIR
         self.files = files if files is not None else []
         self.load_all = load_all_docs
+        if vector_backend not in VECTOR_BACKENDS:
+            raise ValueError(f"Unknown vector backend {vector_backend}, expected one of {sorted(VECTOR_BACKENDS)}")
+        self.vector_backend = vector_backend  # Vector store implementation, see VECTOR_BACKENDS
+        self.route_sources = route_sources  # Route each search to the doc sets its keywords point at
 
     def load_all_docs(self) -> list[str]:
         """Loads all docs into the system"""
@@ -30,7 +42,7 @@ class ComponentInitializer:
     def init(self):
         logger.info("Initializing components...")
 
-        vector_db = VectorDB()
+        vector_db = VECTOR_BACKENDS[self.vector_backend]()
         reader = DocumentProcessor()
 
         if self.reset_db:
@@ -47,13 +59,13 @@ class ComponentInitializer:
             docs_to_load = self.load_selected_docs()
 
         for file in docs_to_load:
-            documents = reader.load_json(file)
-            vector_db.add_documents(documents, file)
+            vector_db.sync_documents(reader.iter_chunks(file), file)
 
         claude_assistant.update_system_prompt(summary_manager.get_all_summaries())
 
         reranker = Reranker()
-        retriever = ResultRetriever(vector_db=vector_db, reranker=reranker)
+        router = SourceRouter(max_sources=MAX_ROUTED_SOURCES) if self.route_sources else None
+        retriever = ResultRetriever(vector_db=vector_db, reranker=reranker, router=router)
         claude_assistant.retriever = retriever
 
         logger.info("Components initialized successfully.")
@@ -8,6 +8,7 @@ import os
 import re
 import time
 from datetime import datetime
+from itertools import islice
 from typing import Any
 from urllib.parse import urlparse
 from uuid import uuid4
@@ -20,6 +21,7 @@ from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_ex
 
 from src.utils.config import FIRECRAWL_API_KEY, JOB_FILE_DIR, RAW_DATA_DIR, SRC_ROOT
 from src.utils.decorators import base_error_handler
+from src.utils.json_stream import iter_json_array
 from src.utils.logger import configure_logging, get_logger
 
 logger = get_logger()
@@ -354,14 +356,9 @@ class FireCrawler:
         # ensure directory exists
         os.makedirs(os.path.dirname(md_output_filepath), exist_ok=True)
 
-        with open(input_filepath) as f:
-            json_data = json.load(f)
-
         with open(md_output_filepath, "w", encoding="utf-8") as md_file:
-            for index, item in enumerate(json_data["data"]):
-                if index >= pages:
-                    break
-
+            # stream only the first pages instead of loading the whole crawl
+            for index, item in enumerate(islice(iter_json_array(input_filepath, key="data"), pages)):
                 # Markdown file
                 if "markdown" in item:
                     md_file.write(f"# Content for item {index}\n\n")
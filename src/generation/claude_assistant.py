@@ -5,7 +5,6 @@ from collections.abc import Generator
 from typing import Any
 
 import anthropic
-import tiktoken
 import weave
 from anthropic.types import Message
 from anthropic.types.beta.prompt_caching import PromptCachingBetaMessage
@@ -16,7 +15,8 @@ from src.generation.tool_definitions import tool_manager
 from src.utils.config import ANTHROPIC_API_KEY, MAIN_MODEL, WEAVE_PROJECT_NAME
 from src.utils.decorators import anthropic_error_handler, base_error_handler
 from src.utils.logger import get_logger
-from src.vector_storage.vector_db import VectorDB
+from src.utils.tokenizer import get_tokenizer
+from src.vector_storage.vector_db import VectorDBInterface
 
 weave.init(WEAVE_PROJECT_NAME)
 
@@ -43,7 +43,7 @@ class ConversationHistory:
         self.max_tokens = max_tokens  # specifically for Sonnet 3.5
         self.messages: list[ConversationMessage] = []
         self.total_tokens = 0
-        self.tokenizer = tiktoken.get_encoding(tokenizer)
+        self.tokenizer = get_tokenizer(tokenizer)  # shared by every conversation, counts are memoized
 
     def add_message(self, role: str, content: str | list[dict[str, Any]]) -> None:
         message = ConversationMessage(role, content)
@@ -64,12 +64,12 @@ class ConversationHistory:
 
     def _estimate_tokens(self, content: str | list[dict[str, Any]]) -> int:
         if isinstance(content, str):
-            return len(self.tokenizer.encode(content))
+            return self.tokenizer.count(content)
         elif isinstance(content, list):
             return sum(
-                len(self.tokenizer.encode(item["text"]))
-                for item in content
-                if isinstance(item, dict) and "text" in item
+                self.tokenizer.count_batch(
+                    [item["text"] for item in content if isinstance(item, dict) and "text" in item]
+                )
             )
         return 0
 
@@ -126,7 +126,7 @@ class ClaudeAssistant(Model):
     """
 
     client: anthropic.Anthropic | None = None
-    vector_db: VectorDB
+    vector_db: VectorDBInterface
     api_key: str = Field(default=ANTHROPIC_API_KEY)
     model_name: str = Field(default=MAIN_MODEL)
     base_system_prompt: str = Field(default="")
@@ -142,7 +142,7 @@ class ClaudeAssistant(Model):
 
     def __init__(
         self,
-        vector_db: VectorDB,
+        vector_db: VectorDBInterface,
         api_key: str = None,
         model_name: str = None,
     ):
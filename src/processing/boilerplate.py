@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+from collections import Counter
+from collections.abc import Iterable
+from typing import Any
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+# Learned boilerplate is stored next to the raw file it was learned from, as <raw file name><suffix>
+BOILERPLATE_SUFFIX = ".boilerplate.json"
+_CODE_FENCES = ("```", "~~~")
+
+
+def _is_candidate(line: str) -> bool:
+    """Headings and table rows repeat across pages as structure, not chrome, so they are never learned"""
+    return bool(line) and not line.startswith(("#", "|"))
+
+
+def _iter_prose_lines(markdown: str) -> Iterable[tuple[int, str]]:
+    """Yields the index and stripped text of every line outside fenced code blocks"""
+    in_code_block = False
+    for i, line in enumerate(markdown.split("\n")):
+        stripped = line.strip()
+        if stripped.startswith(_CODE_FENCES):
+            in_code_block = not in_code_block
+        elif not in_code_block:
+            yield i, stripped
+
+
+class BoilerplateIndex:
+    """Counts on how many pages of a crawl each line appears.
+
+    Lines in code blocks, headings, table rows and lines longer than `max_line_length` are not indexed, site
+    navigation and footers are short lines of prose that repeat across most pages.
+    """
+
+    def __init__(self, max_line_length: int = 200):
+        self.max_line_length = max_line_length
+        self.pages = 0
+        self.page_counts = Counter()
+
+    def add_page(self, markdown: str) -> None:
+        self.pages += 1
+        self.page_counts.update(
+            {
+                line
+                for _, line in _iter_prose_lines(markdown)
+                if _is_candidate(line) and len(line) <= self.max_line_length
+            }
+        )
+
+    def learn(self, share: float, min_pages: int) -> dict[str, int]:
+        """Returns the lines found on more than `share` of the pages and on at least `min_pages` pages"""
+        threshold = max(min_pages, int(share * self.pages) + 1)
+        return {line: count for line, count in self.page_counts.most_common() if count >= threshold}
+
+
+class LearnedBoilerplate:
+    """Cleaning function that blanks the learned boilerplate lines of a page, leaving code blocks alone"""
+
+    def __init__(self, lines: Iterable[str]):
+        self.lines = frozenset(lines)
+        self.digest = hashlib.sha256("\n".join(sorted(self.lines)).encode("utf-8")).hexdigest()
+
+    def __call__(self, markdown: str) -> str:
+        lines = markdown.split("\n")
+        removed = [i for i, line in _iter_prose_lines(markdown) if line in self.lines]
+        if not removed:
+            return markdown
+        for i in removed:
+            lines[i] = ""
+        return "\n".join(lines)
+
+    def __repr__(self) -> str:
+        # part of the page cache key through CleaningPipeline.to_dict
+        return f"LearnedBoilerplate({len(self.lines)} lines, {self.digest[:16]})"
+
+
+def learn_boilerplate(pages: Iterable[dict[str, Any]], share: float = 0.5, min_pages: int = 5) -> dict[str, int]:
+    """Builds a line frequency index over a crawl's pages and returns the boilerplate lines with their page counts"""
+    if not 0.0 < share < 1.0:
+        raise ValueError(f"share must be in (0, 1), got {share}")
+    index = BoilerplateIndex()
+    for page in pages:
+        index.add_page(page["markdown"])
+    learned = index.learn(share, min_pages)
+    logger.info(f"Learned {len(learned)} boilerplate lines from {index.pages} pages (share > {share})")
+    return learned
+
+
+def _source_signature(source_filepath: str) -> dict[str, int]:
+    stat = os.stat(source_filepath)
+    return {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns}
+
+
+def save_learned_boilerplate(source_filepath: str, lines: dict[str, int], share: float, min_pages: int) -> str:
+    """Stores the lines learned from a raw file next to it, with what is needed to tell whether they are stale"""
+    filepath = source_filepath + BOILERPLATE_SUFFIX
+    learned = {
+        **_source_signature(source_filepath),
+        "share": share,
+        "min_pages": min_pages,
+        "lines": lines,
+    }
+    with open(filepath, "w", encoding="utf-8") as f:
+        json.dump(learned, f, indent=2, ensure_ascii=False)
+    logger.info(f"Learned boilerplate saved to {filepath}")
+    return filepath
+
+
+def load_learned_boilerplate(source_filepath: str, share: float, min_pages: int) -> dict[str, int] | None:
+    """Loads the lines stored next to a raw file, None if there are none or they were learned differently"""
+    filepath = source_filepath + BOILERPLATE_SUFFIX
+    try:
+        with open(filepath, encoding="utf-8") as f:
+            learned = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    expected = {**_source_signature(source_filepath), "share": share, "min_pages": min_pages}
+    if any(learned.get(key) != value for key, value in expected.items()):
+        logger.info(f"Ignoring stale learned boilerplate {filepath}")
+        return None
+    return learned["lines"]
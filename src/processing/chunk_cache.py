@@ -0,0 +1,54 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+
+class ChunkCache:
+    """On-disk cache of the chunks produced for a page, one JSON file per cache key.
+
+    Keys are content hashes, so entries never go stale: a changed page, chunker parameter or chunker version
+    produces a different key. Entries are written atomically, so several worker processes can share a cache.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Hashes JSON-serializable parts into a cache key"""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Returns the cached entry or None on a miss"""
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except json.JSONDecodeError:
+            logger.warning(f"Ignoring corrupted chunk cache entry {key}")
+            return None
+
+    def put(self, key: str, entry: dict[str, Any]) -> None:
+        """Stores an entry, replacing the file atomically"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
@@ -1,18 +1,42 @@
+import hashlib
 import json
 import os
 import re
-import statistics
 import uuid
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
 from typing import Any
 
-import tiktoken
-
-from src.utils.config import PROCESSED_DATA_DIR, RAW_DATA_DIR
+from src.processing.boilerplate import (
+    BOILERPLATE_SUFFIX,
+    LearnedBoilerplate,
+    learn_boilerplate,
+    load_learned_boilerplate,
+    save_learned_boilerplate,
+)
+from src.processing.chunk_cache import ChunkCache
+from src.processing.cleaning import CleaningPipeline, CleaningStage, CleaningStats
+from src.processing.deduplication import NearDuplicateDetector
+from src.processing.token_stats import TokenCountSketch
+from src.processing.tokens import TokenAccumulator, concatenated_token_count, last_tokens
+from src.utils.chunk_io import ChunkWriter
+from src.utils.config import CHUNK_CACHE_DIR, PROCESSED_DATA_DIR, RAW_DATA_DIR
 from src.utils.decorators import base_error_handler
+from src.utils.json_stream import iter_json_array
 from src.utils.logger import configure_logging, get_logger
+from src.utils.tokenizer import get_tokenizer
 
 logger = get_logger()
 
+# Namespace for content-addressed chunk ids, changing it changes every chunk id
+CHUNK_ID_NAMESPACE = uuid.UUID("5d0c8e3a-7f4b-4d1e-9a63-2b8f1c6e0a47")
+
+# Part of the page cache key, bump it whenever a change to the chunking logic changes the produced chunks
+CHUNKER_VERSION = "4"
+
 
 class MarkdownChunker:
     def __init__(
@@ -24,14 +48,35 @@ class MarkdownChunker:
         min_chunk_size: int = 100,
         overlap_percentage: float = 0.05,
         save: bool = False,
+        max_workers: int = 1,
+        page_batch_size: int = 16,
+        cache_dir: str | None = None,
+        near_duplicate_threshold: float | None = None,
+        output_format: str = ".jsonl",
+        estimate_margin: float = 0.25,
+        boilerplate_share: float | None = None,
+        boilerplate_min_pages: int = 5,
     ):
         self.output_dir = output_dir
         self.input_filename = input_filename
-        self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        self.token_service = get_tokenizer("cl100k_base")  # process-wide encoder with memoized counts
+        self.tokenizer = self.token_service.encoding
         self.max_tokens = max_tokens  # Hard limit
         self.soft_token_limit = soft_token_limit  # Soft limit
         self.min_chunk_size = min_chunk_size  # Minimum chunk size in tokens
         self.overlap_percentage = overlap_percentage  # 5% overlap
+        self.max_workers = max_workers  # Processes used to chunk pages, 1 means no process pool
+        self.page_batch_size = page_batch_size  # Pages sent to a worker process at once
+        self.cache = ChunkCache(cache_dir) if cache_dir else None  # Per-page chunk cache, disabled if None
+        self.output_format = output_format  # Extension of the chunk file, one of CHUNK_FORMATS
+        # Token limit checks whose upper bound (the UTF-8 byte count) is further than this fraction below the limit
+        # skip exact encoding,
+        # 0 counts every line exactly
+        self.estimate_margin = estimate_margin
+        # Lines found on more than this share of the crawl's pages are stripped as boilerplate, None disables it
+        self.boilerplate_share = boilerplate_share
+        self.boilerplate_min_pages = boilerplate_min_pages  # Lines on fewer pages are never learned
+        self.learned_boilerplate = None  # LearnedBoilerplate set by learn_boilerplate()
         # Initialize the validator
         self.validator = MarkdownChunkValidator(
             min_chunk_size=self.min_chunk_size,
@@ -39,25 +84,74 @@ class MarkdownChunker:
             output_dir=self.output_dir,
             input_filename=self.input_filename,
             save=save,
+            near_duplicate_threshold=near_duplicate_threshold,
         )
 
         # Precompile regex patterns for performance
-        self.boilerplate_patterns = [
-            r"\[Anthropic home page.*\]\(/.*\)",  # Matches the home page link with images
-            r"^English$",  # Matches the language selection
-            r"^Search\.\.\.$",
-            r"^Ctrl K$",
-            r"^Search$",
-            r"^Navigation$",
-            r"^\[.*\]\(/.*\)$",  # Matches navigation links
-            r"^On this page$",
-            r"^\* \* \*$",  # Matches horizontal rules used as separators
-        ]
-        self.boilerplate_regex = re.compile("|".join(self.boilerplate_patterns), re.MULTILINE)
+        self.boilerplate_patterns = {
+            "home_link": r"\[Anthropic home page.*\]\(/.*\)",  # Matches the home page link with images
+            "language": r"^English$",  # Matches the language selection
+            "search_placeholder": r"^Search\.\.\.$",
+            "search_shortcut": r"^Ctrl K$",
+            "search": r"^Search$",
+            "navigation": r"^Navigation$",
+            "nav_links": r"^\[.*\]\(/.*\)$",  # Matches navigation links
+            "on_this_page": r"^On this page$",
+            "separators": r"^\* \* \*$",  # Matches horizontal rules used as separators
+        }
+        self.cleaning_pipeline = self._build_cleaning_pipeline()
         self.h_pattern = re.compile(r"^\s*(?![-*]{3,})(#{1,3})\s*(.*)$", re.MULTILINE)
         self.code_block_start_pattern = re.compile(r"^(```|~~~)(.*)$")
         self.inline_code_pattern = re.compile(r"`([^`\n]+)`")
 
+    def _build_cleaning_pipeline(self) -> CleaningPipeline:
+        """Page cleaning: boilerplate lines in one fused pass, the blank lines they leave behind, then images"""
+        stages = [
+            CleaningStage(f"boilerplate.{name}", pattern, flags=re.MULTILINE, fuse=True)
+            for name, pattern in self.boilerplate_patterns.items()
+        ]
+        if self.learned_boilerplate is not None:
+            stages.append(CleaningStage("learned_boilerplate", function=self.learned_boilerplate))
+        stages += [
+            CleaningStage("blank_lines", r"\n{2,}", "\n\n"),
+            CleaningStage("strip", function=str.strip),
+            # Remove HTML img tags (in case any slipped through from FireCrawl)
+            CleaningStage("images.html", r"<img[^>]+>"),
+            # Remove Markdown image syntax
+            CleaningStage("images.markdown", r"!\[.*?\]\(.*?\)"),
+            # Remove reference-style images
+            CleaningStage("images.reference", r"^\[.*?\]:\s*http.*$", flags=re.MULTILINE),
+            # Remove base64 encoded images
+            CleaningStage("images.base64", r"!\[.*?\]\(data:image/[^;]+;base64,[^\)]+\)"),
+            # Remove any remaining image links that might not have been caught
+            CleaningStage(
+                "images.links",
+                r"\[.*?\]:\s*\S*\.(png|jpg|jpeg|gif|svg|webp)",
+                flags=re.MULTILINE | re.IGNORECASE,
+            ),
+        ]
+        return CleaningPipeline(stages)
+
+    @base_error_handler
+    def learn_boilerplate(self, pages: Iterable[dict[str, Any]] | None = None) -> None:
+        """Learns the lines repeated across the crawl's pages and strips them from every page from now on.
+
+        Without `pages` the raw file is streamed once; the learned lines are stored next to it and reused by later
+        runs until the raw file or the learning settings change.
+        """
+        if self.boilerplate_share is None:
+            raise ValueError("boilerplate_share must be set to learn boilerplate")
+        if pages is None:
+            input_filepath = os.path.join(RAW_DATA_DIR, self.input_filename)
+            lines = load_learned_boilerplate(input_filepath, self.boilerplate_share, self.boilerplate_min_pages)
+            if lines is None:
+                lines = learn_boilerplate(self.iter_pages(), self.boilerplate_share, self.boilerplate_min_pages)
+                save_learned_boilerplate(input_filepath, lines, self.boilerplate_share, self.boilerplate_min_pages)
+        else:
+            lines = learn_boilerplate(pages, self.boilerplate_share, self.boilerplate_min_pages)
+        self.learned_boilerplate = LearnedBoilerplate(lines)
+        self.cleaning_pipeline = self._build_cleaning_pipeline()
+
     @base_error_handler
     def load_data(self) -> dict[str, Any]:
         """Loads markdown from JSON and prepares for chunking"""
@@ -75,64 +169,140 @@ class MarkdownChunker:
             logger.error(f"Invalid JSON in file: {input_filepath}")
             raise
 
+    def iter_pages(self) -> Iterator[dict[str, Any]]:
+        """Streams pages from the raw JSON file one at a time instead of loading the whole crawl"""
+        input_filepath = os.path.join(RAW_DATA_DIR, self.input_filename)
+
+        try:
+            yield from iter_json_array(input_filepath, key="data")
+            logger.info(f"{self.input_filename} streamed")
+        except FileNotFoundError:
+            logger.error(f"File not found: {input_filepath}")
+            raise
+        except json.JSONDecodeError:
+            logger.error(f"Invalid JSON in file: {input_filepath}")
+            raise
+
     @base_error_handler
-    def remove_images(self, content: str) -> str:
-        """Removes all types of images from the content."""
-        # Remove HTML img tags (in case any slipped through from FireCrawl)
-        content = re.sub(r"<img[^>]+>", "", content)
+    def clean_markdown(self, content: str) -> str:
+        """Removes boilerplate, extra blank lines and all types of images from the content"""
+        return self.cleaning_pipeline.clean(content, self.validator.cleaning_stats)
 
-        # Remove Markdown image syntax
-        content = re.sub(r"!\[.*?\]\(.*?\)", "", content)
+    @base_error_handler
+    def process_pages(self, json_input: dict[str, Any] | Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Iterates through each page in the loaded data or in a stream of pages"""
+        pages = json_input["data"] if isinstance(json_input, dict) else json_input
+        return list(self.iter_validated_chunks(pages))
+
+    def iter_validated_chunks(self, pages: Iterable[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+        """Yields unique chunks while validating them, logs the validation summary once the pages are exhausted"""
+        for chunk in self.iter_chunks(pages):
+            if self.validator.validate_chunk(chunk):
+                yield chunk
+        self.validator.finish()
+
+    def iter_chunks(self, pages: Iterable[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+        """Yields chunks page by page as they are produced, in page order"""
+        if self.max_workers > 1:
+            yield from self._iter_chunks_parallel(pages)
+        else:
+            for page in pages:
+                yield from self.process_page(page)
 
-        # Remove reference-style images
-        content = re.sub(r"^\[.*?\]:\s*http.*$", "", content, flags=re.MULTILINE)
+    @base_error_handler
+    def process_page(self, page: dict[str, Any]) -> list[dict[str, Any]]:
+        """Returns the chunks of a single page, served from the page cache when it is enabled"""
+        if self.cache is None:
+            return self._chunk_page(page)
+
+        cache_key = self._page_cache_key(page)
+        entry = self.cache.get(cache_key)
+        if entry is None:
+            self.validator.cache_misses += 1
+            # Collect the page's statistics separately so they can be replayed on a cache hit
+            main_validator = self.validator
+            self.validator = main_validator.spawn()
+            try:
+                chunks = self._chunk_page(page)
+                entry = {"chunks": chunks, "stats": self.validator.to_dict()}
+            finally:
+                main_validator.cleaning_stats.merge(self.validator.cleaning_stats)
+                self.validator = main_validator
+            self.cache.put(cache_key, entry)
+        else:
+            self.validator.cache_hits += 1
 
-        # Remove base64 encoded images
-        content = re.sub(r"!\[.*?\]\(data:image/[^;]+;base64,[^\)]+\)", "", content)
+        self.validator.merge_stats(entry["stats"])
+        return entry["chunks"]
 
-        # Remove any remaining image links that might not have been caught
-        content = re.sub(
-            r"\[.*?\]:\s*\S*\.(png|jpg|jpeg|gif|svg|webp)", "", content, flags=re.MULTILINE | re.IGNORECASE
+    @base_error_handler
+    def _page_cache_key(self, page: dict[str, Any]) -> str:
+        """Hashes everything that determines a page's chunks"""
+        page_metadata = page["metadata"]
+        params = {
+            "max_tokens": self.max_tokens,
+            "soft_token_limit": self.soft_token_limit,
+            "min_chunk_size": self.min_chunk_size,
+            "overlap_percentage": self.overlap_percentage,
+            "cleaning_stages": self.cleaning_pipeline.to_dict(),
+            "estimate_margin": self.estimate_margin,
+        }
+        return ChunkCache.make_key(
+            CHUNKER_VERSION,
+            params,
+            page["markdown"],
+            page_metadata.get("sourceURL", ""),
+            page_metadata.get("title"),
         )
 
-        return content
-
     @base_error_handler
-    def process_pages(self, json_input: dict[str, Any]) -> list[dict[str, Any]]:
-        """Iterates through each page in the loaded data"""
-        all_chunks = []
-        for _index, page in enumerate(json_input["data"]):
-            page_content = page["markdown"]
-            page_content = self.remove_boilerplate(page_content)
-            page_content = self.remove_images(page_content)  # Add this line
-            page_metadata = page["metadata"]
-
-            sections = self.identify_sections(page_content, page_metadata)
-            chunks = self.create_chunks(sections, page_metadata)
-
-            # Post-processing: Ensure headers fallback to page title if missing
-            page_title = page_metadata.get("title", "Untitled")
-            for chunk in chunks:
-                if not chunk["data"]["headers"].get("h1"):
-                    chunk["data"]["headers"]["h1"] = page_title
-                    # Increment total headings for H1 when setting from page title
-                    if page_title.strip() not in self.validator.total_headings["h1"]:
-                        self.validator.increment_total_headings("h1", page_title)
+    def _chunk_page(self, page: dict[str, Any]) -> list[dict[str, Any]]:
+        """Cleans a single page and splits it into chunks"""
+        page_content = page["markdown"]
+        page_content = self.clean_markdown(page_content)
+        page_metadata = page["metadata"]
 
-            all_chunks.extend(chunks)
+        sections = self.identify_sections(page_content, page_metadata)
+        chunks = self.create_chunks(sections, page_metadata)
 
-        # After processing all pages, perform validation
-        self.validator.validate(all_chunks)
-        return all_chunks
+        # Post-processing: Ensure headers fallback to page title if missing
+        page_title = page_metadata.get("title", "Untitled")
+        for chunk in chunks:
+            if not chunk["data"]["headers"].get("h1"):
+                chunk["data"]["headers"]["h1"] = page_title
+                # Increment total headings for H1 when setting from page title
+                if page_title.strip() not in self.validator.total_headings["h1"]:
+                    self.validator.increment_total_headings("h1", page_title)
 
-    @base_error_handler
-    def remove_boilerplate(self, content: str) -> str:
-        """Removes navigation and boilerplate content from markdown."""
-        # Use precompiled regex
-        cleaned_content = self.boilerplate_regex.sub("", content)
-        # Remove any extra newlines left after removing boilerplate
-        cleaned_content = re.sub(r"\n{2,}", "\n\n", cleaned_content)
-        return cleaned_content.strip()
+        return chunks
+
+    def _iter_chunks_parallel(self, pages: Iterable[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+        """Chunks batches of pages in a process pool and yields the results in page order.
+
+        Only a bounded number of batches is in flight, so pages can be streamed from disk. Each worker collects
+        statistics in its own validator; merging them in batch order keeps the chunk order and the validation
+        summary identical to a serial run.
+        """
+        page_iterator = iter(pages)
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                while len(pending) < 2 * self.max_workers:
+                    batch = list(islice(page_iterator, self.page_batch_size))
+                    if not batch:
+                        break
+                    pending.append(executor.submit(_chunk_page_batch, self, batch))
+                if not pending:
+                    break
+                chunks, validator = pending.popleft().result()
+                self.validator.merge(validator)
+                yield from chunks
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Copies sent to worker processes start with an empty validator instead of the statistics collected so far
+        state = self.__dict__.copy()
+        state["validator"] = self.validator.spawn()
+        return state
 
     @base_error_handler
     def clean_header_text(self, header_text: str) -> str:
@@ -234,12 +404,11 @@ class MarkdownChunker:
 
         final_chunks = []
         for chunk in adjusted_chunks:
-            chunk_id = str(self._generate_chunk_id())
-            token_count = self._calculate_tokens(chunk["content"])
+            token_count = chunk["token_count"]
             self.validator.add_chunk(token_count)
             metadata = self._create_metadata(page_metadata, token_count)
             new_chunk = {
-                "chunk_id": chunk_id,
+                "chunk_id": "",  # assigned once the final text is known
                 "metadata": metadata,
                 "data": {"headers": chunk["headers"], "text": chunk["content"]},
             }
@@ -255,6 +424,12 @@ class MarkdownChunker:
 
         # Add overlap as the final step
         self._add_overlap(final_chunks)
+
+        # Derive ids from the final content so re-chunking unchanged pages reproduces the same ids
+        for chunk in final_chunks:
+            chunk["chunk_id"] = str(
+                self._generate_chunk_id(chunk["metadata"], chunk["data"]["headers"], chunk["data"]["text"])
+            )
         return final_chunks
 
     @base_error_handler
@@ -262,7 +437,8 @@ class MarkdownChunker:
         # TODO: refactor this method to reduce complexity
         # Current complexity is necessary for accurate content splitting
         chunks = []
-        current_chunk = {"headers": headers.copy(), "content": ""}
+        current_chunk = {"headers": headers.copy(), "content": "", "token_count": 0}
+        current_tokens = TokenAccumulator(self.tokenizer)
         lines = content.split("\n")
         in_code_block = False
         code_fence = ""
@@ -296,24 +472,34 @@ class MarkdownChunker:
                                 continue
                             # Wrap code chunk with code fence
                             code_chunk_content = f"{code_fence}\n{code_chunk}\n{code_fence}\n"
-                            potential_chunk_content = current_chunk["content"] + code_chunk_content
-                            token_count = self._calculate_tokens(potential_chunk_content)
+                            token_count = current_tokens.count_with(code_chunk_content)
                             if token_count <= 2 * self.max_tokens:
-                                current_chunk["content"] = potential_chunk_content
+                                current_chunk["content"] += code_chunk_content
+                                current_chunk["token_count"] = current_tokens.append(code_chunk_content)
                             else:
                                 if current_chunk["content"].strip():
+                                    current_chunk["token_count"] = current_tokens.token_count
                                     chunks.append(current_chunk.copy())
-                                current_chunk = {"headers": headers.copy(), "content": code_chunk_content}
+                                current_chunk = {
+                                    "headers": headers.copy(),
+                                    "content": code_chunk_content,
+                                    "token_count": current_tokens.reset(code_chunk_content),
+                                }
                     else:
                         # Decide whether to add to current chunk or start a new one
-                        potential_chunk_content = current_chunk["content"] + code_block_content
-                        token_count = self._calculate_tokens(potential_chunk_content)
+                        token_count = current_tokens.count_with(code_block_content, code_block_tokens)
                         if token_count <= 2 * self.max_tokens:
-                            current_chunk["content"] = potential_chunk_content
+                            current_chunk["content"] += code_block_content
+                            current_chunk["token_count"] = current_tokens.append(code_block_content)
                         else:
                             if current_chunk["content"].strip():
+                                current_chunk["token_count"] = current_tokens.token_count
                                 chunks.append(current_chunk.copy())
-                            current_chunk = {"headers": headers.copy(), "content": code_block_content}
+                            current_chunk = {
+                                "headers": headers.copy(),
+                                "content": code_block_content,
+                                "token_count": current_tokens.reset(code_block_content),
+                            }
                     code_block_content = ""
                 else:
                     # Inside code block
@@ -328,25 +514,35 @@ class MarkdownChunker:
 
             # Handle regular lines
             line = self.inline_code_pattern.sub(r"<code>\1</code>", line)
-            potential_chunk_content = current_chunk["content"] + line + "\n"
-            token_count = self._calculate_tokens(potential_chunk_content)
+            line_content = line + "\n"
 
-            if token_count <= self.soft_token_limit:
-                current_chunk["content"] = potential_chunk_content
+            if current_tokens.fits(line_content, self.soft_token_limit, self.estimate_margin):
+                current_chunk["content"] += line_content
+                current_tokens.push(line_content)
             else:
                 if current_chunk["content"].strip():
+                    current_chunk["token_count"] = current_tokens.token_count
                     chunks.append(current_chunk.copy())
                 # Check if the line itself exceeds 2 * max_tokens
-                line_token_count = self._calculate_tokens(line + "\n")
+                line_token_count = current_tokens.reset(line_content)
                 if line_token_count > 2 * self.max_tokens:
                     # Split the line into smaller chunks
                     split_lines = self._split_long_line(line)
-                    for split_line in split_lines:
-                        current_chunk = {"headers": headers.copy(), "content": split_line + "\n"}
+                    for split_line, split_line_tokens in split_lines:
+                        current_chunk = {
+                            "headers": headers.copy(),
+                            "content": split_line + "\n",
+                            # the piece is a slice of the line's tokens, the newline encodes to at most one more
+                            "token_count": split_line_tokens + 1,
+                        }
                         chunks.append(current_chunk.copy())
-                    current_chunk = {"headers": headers.copy(), "content": ""}
+                    current_chunk = {"headers": headers.copy(), "content": "", "token_count": current_tokens.reset()}
                 else:
-                    current_chunk = {"headers": headers.copy(), "content": line + "\n"}
+                    current_chunk = {
+                        "headers": headers.copy(),
+                        "content": line_content,
+                        "token_count": line_token_count,
+                    }
             i += 1
 
         # After processing all lines, check for any unclosed code block
@@ -354,8 +550,10 @@ class MarkdownChunker:
             self.validator.add_validation_error("Unclosed code block detected.")
             # Add remaining code block content to current_chunk
             current_chunk["content"] += code_block_content
+            current_chunk["token_count"] = current_tokens.append(code_block_content)
 
         if current_chunk["content"].strip():
+            current_chunk["token_count"] = current_tokens.token_count
             chunks.append(current_chunk.copy())
 
         return chunks
@@ -366,10 +564,13 @@ class MarkdownChunker:
         lines = code_block_content.strip().split("\n")
         chunks = []
         current_chunk_lines = []
+        # The closing fence starts a new line, so its tokens never merge with the code before it
+        opening_fence = f"{code_fence}\n"
+        closing_fence_tokens = self._calculate_tokens(opening_fence)
+        current_tokens = TokenAccumulator(self.tokenizer, opening_fence)
         for line in lines:
             current_chunk_lines.append(line)
-            current_chunk = "\n".join(current_chunk_lines)
-            token_count = self._calculate_tokens(f"{code_fence}\n{current_chunk}\n{code_fence}\n")
+            token_count = current_tokens.append(line + "\n") + closing_fence_tokens
             if token_count >= 2 * self.max_tokens:
                 # Attempt to find a logical split point
                 split_index = len(current_chunk_lines) - 1
@@ -387,6 +588,9 @@ class MarkdownChunker:
                 chunks.append(chunk_content.strip())
                 # Start new chunk with remaining lines
                 current_chunk_lines = current_chunk_lines[split_index + 1 :]
+                current_tokens.reset(opening_fence)
+                for remaining_line in current_chunk_lines:
+                    current_tokens.append(remaining_line + "\n")
         # Add any remaining lines as the last chunk
         if current_chunk_lines:
             chunk_content = "\n".join(current_chunk_lines)
@@ -401,7 +605,7 @@ class MarkdownChunker:
         i = 0
         while i < len(chunks):
             current_chunk = chunks[i]
-            current_tokens = self._calculate_tokens(current_chunk["content"])
+            current_tokens = current_chunk["token_count"]
             # If the chunk is too small, try to merge with adjacent chunks
             if current_tokens < self.min_chunk_size:
                 merged = False
@@ -409,12 +613,19 @@ class MarkdownChunker:
                 if i + 1 < len(chunks):
                     next_chunk = chunks[i + 1]
                     combined_content = current_chunk["content"] + next_chunk["content"]
-                    combined_tokens = self._calculate_tokens(combined_content)
+                    combined_tokens = concatenated_token_count(
+                        self.tokenizer,
+                        current_chunk["content"],
+                        current_tokens,
+                        next_chunk["content"],
+                        next_chunk["token_count"],
+                    )
                     if combined_tokens <= 2 * self.max_tokens:
                         # Merge current and next chunk
                         merged_chunk = {
                             "headers": self._merge_headers(current_chunk["headers"], next_chunk["headers"]),
                             "content": combined_content,
+                            "token_count": combined_tokens,
                         }
                         # Replace next chunk with merged chunk
                         chunks[i + 1] = merged_chunk
@@ -424,12 +635,19 @@ class MarkdownChunker:
                     # Try merging with the previous chunk
                     prev_chunk = adjusted_chunks[-1]
                     combined_content = prev_chunk["content"] + current_chunk["content"]
-                    combined_tokens = self._calculate_tokens(combined_content)
+                    combined_tokens = concatenated_token_count(
+                        self.tokenizer,
+                        prev_chunk["content"],
+                        prev_chunk["token_count"],
+                        current_chunk["content"],
+                        current_tokens,
+                    )
                     if combined_tokens <= 2 * self.max_tokens:
                         # Merge previous and current chunk
                         merged_chunk = {
                             "headers": self._merge_headers(prev_chunk["headers"], current_chunk["headers"]),
                             "content": combined_content,
+                            "token_count": combined_tokens,
                         }
                         adjusted_chunks[-1] = merged_chunk
                         i += 1
@@ -446,8 +664,7 @@ class MarkdownChunker:
         # Now, split any chunks that exceed 2x max_tokens
         final_chunks = []
         for chunk in adjusted_chunks:
-            token_count = self._calculate_tokens(chunk["content"])
-            if token_count > 2 * self.max_tokens:
+            if chunk["token_count"] > 2 * self.max_tokens:
                 split_chunks = self._split_large_chunk(chunk)
                 final_chunks.extend(split_chunks)
             else:
@@ -463,23 +680,32 @@ class MarkdownChunker:
 
         chunks = []
         current_chunk_content = ""
+        current_tokens = TokenAccumulator(self.tokenizer)
         for line in lines:
-            potential_chunk_content = current_chunk_content + line + "\n"
-            token_count = self._calculate_tokens(potential_chunk_content)
-            if token_count <= 2 * self.max_tokens:
-                current_chunk_content = potential_chunk_content
+            line_content = line + "\n"
+            if current_tokens.fits(line_content, 2 * self.max_tokens, self.estimate_margin):
+                current_chunk_content += line_content
+                current_tokens.push(line_content)
             else:
                 if current_chunk_content.strip():
-                    new_chunk = {"headers": headers.copy(), "content": current_chunk_content.strip()}
-                    chunks.append(new_chunk)
-                current_chunk_content = line + "\n"
+                    chunks.append(self._stripped_chunk(headers, current_chunk_content))
+                current_chunk_content = line_content
+                current_tokens.reset(line_content)
 
         if current_chunk_content.strip():
-            new_chunk = {"headers": headers.copy(), "content": current_chunk_content.strip()}
-            chunks.append(new_chunk)
+            chunks.append(self._stripped_chunk(headers, current_chunk_content))
 
         return chunks
 
+    def _stripped_chunk(self, headers: dict[str, str], content: str) -> dict[str, Any]:
+        """Builds a chunk from stripped content; stripping can change the tokenization, so it is re-counted."""
+        stripped_content = content.strip()
+        return {
+            "headers": headers.copy(),
+            "content": stripped_content,
+            "token_count": self._calculate_tokens(stripped_content),
+        }
+
     @base_error_handler
     def _merge_headers(self, headers1: dict[str, str], headers2: dict[str, str]) -> dict[str, str]:
         merged = {}
@@ -498,69 +724,78 @@ class MarkdownChunker:
     def _add_overlap(
         self, chunks: list[dict[str, Any]], min_overlap_tokens: int = 50, max_overlap_tokens: int = 100
     ) -> None:
+        # Token count of the previous chunk's final text, derived from the counts of its overlap and original text
+        prev_chunk_tokens = chunks[0]["metadata"]["token_count"] if chunks else 0
         for i in range(1, len(chunks)):
             prev_chunk = chunks[i - 1]
             curr_chunk = chunks[i]
             prev_chunk_text = prev_chunk["data"]["text"]
+            current_chunk_token_count = curr_chunk["metadata"]["token_count"]
 
             # Calculate overlap tokens
-            overlap_token_count = max(
-                int(self._calculate_tokens(prev_chunk_text) * self.overlap_percentage), min_overlap_tokens
-            )
+            overlap_token_count = max(int(prev_chunk_tokens * self.overlap_percentage), min_overlap_tokens)
             overlap_token_count = min(overlap_token_count, max_overlap_tokens)
 
             # Ensure that adding overlap does not exceed max_tokens
-            current_chunk_token_count = curr_chunk["metadata"]["token_count"]
             available_space = self.max_tokens - current_chunk_token_count
             allowed_overlap_tokens = min(overlap_token_count, available_space)
             if allowed_overlap_tokens <= 0:
                 # Cannot add overlap without exceeding max_tokens
                 self.validator.add_validation_error(
-                    f"Cannot add overlap to chunk {curr_chunk['chunk_id']} without exceeding max_tokens"
+                    f"Cannot add overlap to chunk {i} of {curr_chunk['metadata']['source_url']} without exceeding "
+                    f"max_tokens"
                 )
+                prev_chunk_tokens = current_chunk_token_count
                 continue
 
             overlap_text = self._get_last_n_tokens(prev_chunk_text, allowed_overlap_tokens)
             additional_tokens = self._calculate_tokens(overlap_text)
+            prev_chunk_tokens = concatenated_token_count(
+                self.tokenizer, overlap_text, additional_tokens, curr_chunk["data"]["text"], current_chunk_token_count
+            )
             curr_chunk["data"]["text"] = overlap_text + curr_chunk["data"]["text"]
             curr_chunk["metadata"]["token_count"] += additional_tokens
 
-    def _split_long_line(self, line: str) -> list[str]:
-        """Splits a long line into smaller chunks not exceeding 2 * max_tokens."""
+    def _split_long_line(self, line: str) -> list[tuple[str, int]]:
+        """Splits a long line into smaller chunks not exceeding 2 * max_tokens.
+
+        Returns each piece with its token count, taken from the slice of the line's tokens it was decoded from.
+        """
         tokens = self.tokenizer.encode(line)
         max_tokens_per_chunk = 2 * self.max_tokens
         chunks = []
         for i in range(0, len(tokens), max_tokens_per_chunk):
             chunk_tokens = tokens[i : i + max_tokens_per_chunk]
             chunk_text = self.tokenizer.decode(chunk_tokens)
-            chunks.append(chunk_text)
+            chunks.append((chunk_text, len(chunk_tokens)))
         return chunks
 
     def _get_last_n_tokens(self, text: str, n: int) -> str:
-        tokens = self.tokenizer.encode(text)
-        last_n_tokens = tokens[-n:]
-        return self.tokenizer.decode(last_n_tokens)
+        return self.tokenizer.decode(last_tokens(self.tokenizer, text, n))
 
     @base_error_handler
-    def save_chunks(self, chunks: list[dict[str, Any]]):
-        """Saves chunks to output dir"""
+    def save_chunks(self, chunks: Iterable[dict[str, Any]]) -> str:
+        """Saves chunks to output dir, writing each chunk as soon as it is produced"""
         input_name = os.path.splitext(self.input_filename)[0]  # Remove the extension
-        output_filename = f"{input_name}-chunked.json"
+        output_filename = f"{input_name}-chunked{self.output_format}"
         output_filepath = os.path.join(self.output_dir, output_filename)
-        with open(output_filepath, "w", encoding="utf-8") as f:
-            json.dump(chunks, f, indent=2)
-        logger.info(f"Chunks saved to {output_filepath}")
+        with ChunkWriter(output_filepath) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+        logger.info(f"{writer.count} chunks saved to {output_filepath}")
+        return output_filepath
 
     @base_error_handler
-    def _generate_chunk_id(self) -> uuid.UUID:
-        """Generates chunk's uuidv4"""
-        return uuid.uuid4()
+    def _generate_chunk_id(self, metadata: dict[str, Any], headers: dict[str, str], text: str) -> uuid.UUID:
+        """Generates a content-addressed uuidv5 from the chunk's source URL, header path and text"""
+        header_path = [metadata.get("page_title", "")] + [headers.get(level, "") for level in ["h1", "h2", "h3"]]
+        key = "\x1f".join([metadata.get("source_url", ""), *header_path, text])
+        return uuid.uuid5(CHUNK_ID_NAMESPACE, key)
 
     @base_error_handler
     def _calculate_tokens(self, text: str) -> int:
-        """Calculates the number of tokens in a given text using tiktoken"""
-        token_count = len(self.tokenizer.encode(text))
-        return token_count
+        """Calculates the number of tokens in a given text using the shared tokenizer service"""
+        return self.token_service.count(text)
 
     @base_error_handler
     def _create_metadata(self, page_metadata: dict[str, Any], token_count: int) -> dict[str, Any]:
@@ -574,21 +809,45 @@ class MarkdownChunker:
 
 
 class MarkdownChunkValidator:
-    def __init__(self, min_chunk_size, max_tokens, output_dir, input_filename, save: bool = False):
+    def __init__(
+        self,
+        min_chunk_size,
+        max_tokens,
+        output_dir,
+        input_filename,
+        save: bool = False,
+        near_duplicate_threshold: float | None = None,
+    ):
         self.min_chunk_size = min_chunk_size
         self.max_tokens = max_tokens
         self.output_dir = output_dir
         self.input_filename = input_filename
         self.save = save
+        # Chunks at least this similar to an earlier chunk are dropped, None disables near-duplicate detection
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.near_duplicates = (
+            NearDuplicateDetector(threshold=near_duplicate_threshold) if near_duplicate_threshold else None
+        )
         # Validation-related attributes
         self.validation_errors = []
         self.total_chunks = 0
         self.total_tokens = 0
-        self.chunk_token_counts = []
+        self.chunk_token_counts = TokenCountSketch()
         self.headings_preserved = {"h1": set(), "h2": set(), "h3": set()}
         self.total_headings = {"h1": set(), "h2": set(), "h3": set()}
         self.incorrect_counts = {"too_small": 0, "too_large": 0}
         self.duplicates_removed = 0
+        self.near_duplicates_removed = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Cleaning time and bytes removed, for pages that were cleaned in this run (not replayed from the cache)
+        self.cleaning_stats = CleaningStats()
+        # Streaming validation state: digests of the chunk texts seen so far and the incorrect chunks file
+        self.seen_digests = set()
+        self.incorrect_file = None
+        self.incorrect_filepath = os.path.join(
+            self.output_dir, f"{os.path.splitext(self.input_filename)[0]}-incorrect-chunks.jsonl"
+        )
 
     def increment_total_headings(self, level, heading_text):
         self.total_headings[level].add(heading_text.strip())
@@ -599,34 +858,107 @@ class MarkdownChunkValidator:
     def add_chunk(self, token_count):
         self.total_chunks += 1
         self.total_tokens += token_count
-        self.chunk_token_counts.append(token_count)
+        self.chunk_token_counts.add(token_count)
 
     def add_validation_error(self, error_message):
         self.validation_errors.append(error_message)
 
-    def validate(self, chunks):
-        self.validate_duplicates(chunks)
-        self.find_incorrect_chunks(chunks, save=self.save)
-        self.log_summary()
+    def spawn(self) -> "MarkdownChunkValidator":
+        """Creates an empty validator with the same settings, used to collect statistics in worker processes"""
+        return MarkdownChunkValidator(
+            min_chunk_size=self.min_chunk_size,
+            max_tokens=self.max_tokens,
+            output_dir=self.output_dir,
+            input_filename=self.input_filename,
+            save=self.save,
+            near_duplicate_threshold=self.near_duplicate_threshold,
+        )
 
-    def validate_duplicates(self, chunks: list[dict[str, Any]]) -> None:
-        """Removes duplicate chunks and updates counts."""
-        unique_chunks = {}
-        cleaned_chunks = []
-        for chunk in chunks:
-            text = chunk["data"]["text"]
-            if text in unique_chunks:
-                self.duplicates_removed += 1
-                # Log the duplicate chunk removal
-                continue
-            else:
-                unique_chunks[text] = True
-                cleaned_chunks.append(chunk)
+    def merge(self, other: "MarkdownChunkValidator") -> None:
+        """Adds the statistics collected by another validator to this one"""
+        self.merge_stats(other.to_dict())
+        self.duplicates_removed += other.duplicates_removed
+        self.near_duplicates_removed += other.near_duplicates_removed
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        self.cleaning_stats.merge(other.cleaning_stats)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Returns the statistics collected while chunking in a JSON-serializable form"""
+        return {
+            "validation_errors": self.validation_errors,
+            "total_chunks": self.total_chunks,
+            "total_tokens": self.total_tokens,
+            "chunk_token_counts": self.chunk_token_counts.to_dict(),
+            "headings_preserved": {level: sorted(headings) for level, headings in self.headings_preserved.items()},
+            "total_headings": {level: sorted(headings) for level, headings in self.total_headings.items()},
+        }
+
+    def merge_stats(self, stats: dict[str, Any]) -> None:
+        """Adds statistics produced by to_dict, e.g. replayed from the page cache"""
+        self.validation_errors.extend(stats["validation_errors"])
+        self.total_chunks += stats["total_chunks"]
+        self.total_tokens += stats["total_tokens"]
+        self.chunk_token_counts.merge(TokenCountSketch.from_dict(stats["chunk_token_counts"]))
+        for level in ["h1", "h2", "h3"]:
+            self.headings_preserved[level].update(stats["headings_preserved"][level])
+            self.total_headings[level].update(stats["total_headings"][level])
+
+    def validate(self, chunks: list[dict[str, Any]]) -> None:
+        """Validates a list of chunks in place, removing duplicates, and logs the summary"""
+        chunks[:] = [chunk for chunk in chunks if self.validate_chunk(chunk)]
+        self.finish()
+
+    def validate_chunk(self, chunk: dict[str, Any]) -> bool:
+        """Validates a single chunk as it is produced, returns False if it duplicates an earlier chunk.
+
+        Only a fixed-size digest of each chunk's text is kept and incorrect chunks are written out immediately,
+        so validating a stream of chunks needs no per-chunk text in memory.
+        """
+        digest = _text_digest(chunk["data"]["text"])
+        if digest in self.seen_digests:
+            self.duplicates_removed += 1
+            self.total_chunks -= 1
+            return False
+        self.seen_digests.add(digest)
+
+        if self.near_duplicates is not None and self.near_duplicates.is_duplicate(chunk["data"]["text"]):
+            self.near_duplicates_removed += 1
+            self.total_chunks -= 1
+            return False
+
+        token_count = chunk["metadata"]["token_count"]
+        if token_count < self.min_chunk_size:
+            self._add_incorrect_chunk("too_small", chunk)
+        elif token_count > 2 * self.max_tokens:
+            self._add_incorrect_chunk("too_large", chunk)
+        return True
+
+    def finish(self) -> None:
+        """Closes the incorrect chunks file and logs the summary, called after the last chunk was validated"""
+        if self.incorrect_file is not None:
+            self.incorrect_file.close()
+            self.incorrect_file = None
+            logger.info(f"Incorrect chunks saved to {self.incorrect_filepath}")
+        elif not any(self.incorrect_counts.values()):
+            logger.info("No incorrect chunks found.")
+        self.log_summary()
 
-        # Update the chunks list to the cleaned_chunks without duplicates
-        chunks.clear()
-        chunks.extend(cleaned_chunks)
-        self.total_chunks = len(chunks)
+    def _add_incorrect_chunk(self, issue: str, chunk: dict[str, Any]) -> None:
+        """Counts a chunk below min_chunk_size or above 2x max_tokens and appends it to the incorrect chunks file"""
+        self.incorrect_counts[issue] += 1
+        if not self.save:
+            return
+        if self.incorrect_file is None:
+            self.incorrect_file = open(self.incorrect_filepath, "w", encoding="utf-8")
+        record = {
+            "issue": issue,
+            "id": chunk["chunk_id"],
+            "size": chunk["metadata"]["token_count"],
+            "headers": chunk["data"]["headers"],
+            "text": chunk["data"]["text"],
+        }
+        self.incorrect_file.write(json.dumps(record, ensure_ascii=False) + "\n")
 
     def log_summary(self):
         """Logs a concise summary of the chunking process"""
@@ -635,14 +967,26 @@ class MarkdownChunkValidator:
 
         # Duplicate chunks removed
         logger.warning(f"Duplicate chunks removed: {self.duplicates_removed}")
+        if self.near_duplicates is not None:
+            logger.warning(
+                f"Near-duplicate chunks removed: {self.near_duplicates_removed} "
+                f"(similarity >= {self.near_duplicate_threshold})"
+            )
+
+        # Page cache usage
+        if self.cache_hits or self.cache_misses:
+            logger.info(f"Page cache - Hits: {self.cache_hits}, Misses: {self.cache_misses}")
+
+        # Cleaning cost per pass and bytes removed per stage
+        if self.cleaning_stats.pages:
+            logger.info(f"Cleaning ({self.cleaning_stats.pages} pages) - {self.cleaning_stats.summary()}")
 
         # Chunk statistics
         if self.chunk_token_counts:
-            median_tokens = statistics.median(self.chunk_token_counts)
-            min_tokens = min(self.chunk_token_counts)
-            max_tokens = max(self.chunk_token_counts)
-            p25 = statistics.quantiles(self.chunk_token_counts, n=4)[0]
-            p75 = statistics.quantiles(self.chunk_token_counts, n=4)[2]
+            median_tokens = self.chunk_token_counts.median()
+            min_tokens = self.chunk_token_counts.min()
+            max_tokens = self.chunk_token_counts.max()
+            p25, _, p75 = self.chunk_token_counts.quantiles(n=4)
             logger.info(
                 f"Chunk token statistics - Median: {median_tokens}, Min: {min_tokens}, "
                 f"Max: {max_tokens}, 25th percentile: {p25}, 75th percentile: {p75}"
@@ -676,66 +1020,103 @@ class MarkdownChunkValidator:
         )
         logger.info(incorrect_chunks_info)
 
-    def find_incorrect_chunks(self, chunks: list[dict[str, Any]], save: bool = False) -> None:
-        """Finds chunks below min_chunk_size or above 2x max_tokens and saves to JSON."""
-        incorrect = {
-            "too_small": [
-                {
-                    "id": c["chunk_id"],
-                    "size": c["metadata"]["token_count"],
-                    "headers": c["data"]["headers"],
-                    "text": c["data"]["text"],
-                }
-                for c in chunks
-                if c["metadata"]["token_count"] < self.min_chunk_size
-            ],
-            "too_large": [
-                {
-                    "id": c["chunk_id"],
-                    "size": c["metadata"]["token_count"],
-                    "headers": c["data"]["headers"],
-                    "text": c["data"]["text"],
-                }
-                for c in chunks
-                if c["metadata"]["token_count"] > 2 * self.max_tokens
-            ],
-        }
-
-        # Store counts for logging summary
-        self.incorrect_counts = {"too_small": len(incorrect["too_small"]), "too_large": len(incorrect["too_large"])}
 
-        if any(incorrect.values()):
-
-            if save:
-                base_name = os.path.splitext(self.input_filename)[0]
-                output_filename = f"{base_name}-incorrect-chunks.json"
-                output_filepath = os.path.join(self.output_dir, output_filename)
-                with open(output_filepath, "w", encoding="utf-8") as f:
-                    json.dump(incorrect, f, indent=2, ensure_ascii=False)
-                logger.info(f"Incorrect chunks saved to {output_filepath}")
-            else:
-                pass
-        else:
-            logger.info("No incorrect chunks found.")
+def _text_digest(text: str) -> bytes:
+    """Fixed-size digest used to detect duplicate chunks without keeping their text"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def _chunk_page_batch(
+    chunker: MarkdownChunker, pages: list[dict[str, Any]]
+) -> tuple[list[dict[str, Any]], MarkdownChunkValidator]:
+    """Process pool worker: chunks a batch of pages and returns the chunks with the worker's validator"""
+    chunks = []
+    for page in pages:
+        chunks.extend(chunker.process_page(page))
+    return chunks, chunker.validator
+
+
+def chunk_file(
+    filename: str,
+    save: bool = False,
+    max_workers: int = 1,
+    cache_dir: str | None = None,
+    near_duplicate_threshold: float | None = None,
+    boilerplate_share: float | None = None,
+) -> None:
+    """Loads, chunks and saves a single raw file"""
+    markdown_chunker = MarkdownChunker(
+        input_filename=filename,
+        save=save,
+        max_workers=max_workers,
+        cache_dir=cache_dir,
+        near_duplicate_threshold=near_duplicate_threshold,
+        boilerplate_share=boilerplate_share,
+    )
+    if boilerplate_share is not None:
+        markdown_chunker.learn_boilerplate()
+    # chunks are validated and written page by page, the file's chunks are never held in memory at once
+    markdown_chunker.save_chunks(markdown_chunker.iter_validated_chunks(markdown_chunker.iter_pages()))
+    logger.info("Chunking job for " + filename + " complete!")
+
+
+def chunk_files(
+    filenames: list[str],
+    save: bool = False,
+    max_workers: int = 1,
+    cache_dir: str | None = None,
+    near_duplicate_threshold: float | None = None,
+    boilerplate_share: float | None = None,
+) -> None:
+    """Chunks raw files, spreading whole files over a process pool when there are enough of them.
+
+    With fewer files than workers the files are chunked one after another and the workers are used for the
+    pages of each file instead.
+    """
+    if max_workers > 1 and len(filenames) >= max_workers:
+        logger.info(f"Chunking {len(filenames)} files with {max_workers} workers")
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            chunk_one = partial(
+                chunk_file,
+                save=save,
+                cache_dir=cache_dir,
+                near_duplicate_threshold=near_duplicate_threshold,
+                boilerplate_share=boilerplate_share,
+            )
+            # consume the results to surface worker exceptions
+            list(executor.map(chunk_one, filenames))
+    else:
+        for filename in filenames:
+            chunk_file(
+                filename,
+                save=save,
+                max_workers=max_workers,
+                cache_dir=cache_dir,
+                near_duplicate_threshold=near_duplicate_threshold,
+                boilerplate_share=boilerplate_share,
+            )
 
 
 # Test usage
-def main():
+def main(max_workers: int = 1):
     configure_logging(debug=True)
 
     files_to_chunk = []
     chunks_dir = RAW_DATA_DIR
     for filename in os.listdir(chunks_dir):
-        if os.path.isfile(os.path.join(chunks_dir, filename)):
+        if os.path.isfile(os.path.join(chunks_dir, filename)) and not filename.endswith(BOILERPLATE_SUFFIX):
             files_to_chunk.append(filename)
 
-    for file in files_to_chunk:
-        markdown_chunker = MarkdownChunker(input_filename=file, save=False)  # save incorrect chunks or not
-        result = markdown_chunker.load_data()
-        chunks = markdown_chunker.process_pages(result)
-        markdown_chunker.save_chunks(chunks)
-        logger.info("Chunking job for " + file + " complete!")
+    # save incorrect chunks or not
+    chunk_files(
+        sorted(files_to_chunk),
+        save=False,
+        max_workers=max_workers,
+        cache_dir=CHUNK_CACHE_DIR,
+        near_duplicate_threshold=0.9,
+        boilerplate_share=0.5,
+    )
 
 
 if __name__ == "__main__":
-    main()
+    main(max_workers=os.cpu_count() or 1)
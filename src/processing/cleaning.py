@@ -0,0 +1,247 @@
+import re
+import time
+from collections.abc import Callable, Sequence
+from typing import Any
+
+# The first-character prefilter reads parsed patterns through re's undocumented parser; without it, or if its
+# internals change, fused patterns are compiled unfiltered
+try:
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:
+    sre_constants = sre_parse = None
+
+# Inline flag letters for the flags a stage can scope to its own pattern inside a fused regex
+_INLINE_FLAGS = {re.IGNORECASE: "i", re.MULTILINE: "m", re.DOTALL: "s", re.VERBOSE: "x"}
+
+
+class CleaningStage:
+    """One cleaning step applied to page markdown: a regex substitution or a plain str -> str function.
+
+    A regex stage with `fuse` set runs in the same pass as the regex stage before it, the patterns are tried as one
+    alternation. That matches like running them one after another as long as no stage creates or destroys a match
+    of another, so only fuse stages that look at unrelated text. Names are dotted, the part before the first dot
+    names a fused pass.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        pattern: str | None = None,
+        replacement: str = "",
+        flags: int = 0,
+        fuse: bool = False,
+        function: Callable[[str], str] | None = None,
+    ):
+        if (pattern is None) == (function is None):
+            raise ValueError(f"Stage '{name}' needs either a pattern or a function")
+        unsupported = flags & ~sum(_INLINE_FLAGS)
+        if unsupported:
+            raise ValueError(f"Stage '{name}' uses flags that cannot be scoped to a fused pattern: {unsupported}")
+        if "\\" in replacement:
+            raise ValueError(f"Stage '{name}' replacement must be literal text, got {replacement!r}")
+        self.name = name
+        self.pattern = pattern
+        self.replacement = replacement
+        self.flags = flags
+        self.fuse = fuse and function is None
+        self.function = function
+
+    def scoped_pattern(self) -> str:
+        """The pattern with its flags applied inline, so it keeps them inside an alternation"""
+        letters = "".join(letter for flag, letter in _INLINE_FLAGS.items() if self.flags & flag)
+        return f"(?{letters}:{self.pattern})" if letters else self.pattern
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "pattern": self.pattern if self.function is None else self._function_name(),
+            "replacement": self.replacement,
+            "flags": self.flags,
+            "fuse": self.fuse,
+        }
+
+    def _function_name(self) -> str:
+        # callable objects describe themselves in their repr, functions by name (their repr has an address)
+        return getattr(self.function, "__qualname__", None) or repr(self.function)
+
+
+class CleaningStats:
+    """Time spent in each cleaning pass, and matches and UTF-8 bytes removed by each stage"""
+
+    def __init__(self):
+        self.pages = 0
+        self.passes: dict[str, float] = {}  # pass name -> seconds
+        self.stages: dict[str, dict[str, Any]] = {}  # stage name -> pass, matches, bytes_removed
+
+    def add_stage(self, pass_name: str, name: str, matches: int, bytes_removed: int) -> None:
+        stage = self.stages.setdefault(name, {"pass": pass_name, "matches": 0, "bytes_removed": 0})
+        stage["matches"] += matches
+        stage["bytes_removed"] += bytes_removed
+
+    def merge(self, other: "CleaningStats") -> None:
+        """Adds the statistics collected by another run, e.g. in a worker process"""
+        self.pages += other.pages
+        for name, seconds in other.passes.items():
+            self.passes[name] = self.passes.get(name, 0.0) + seconds
+        for name, stage in other.stages.items():
+            self.add_stage(stage["pass"], name, stage["matches"], stage["bytes_removed"])
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "pages": self.pages,
+            "passes": dict(self.passes),
+            "stages": {name: dict(stage) for name, stage in self.stages.items()},
+        }
+
+    def summary(self) -> str:
+        """The passes, most expensive first, with the bytes removed by each of their stages"""
+        parts = []
+        for pass_name, seconds in sorted(self.passes.items(), key=lambda item: -item[1]):
+            removed = ", ".join(
+                f"{name}: {stage['bytes_removed']} bytes"
+                for name, stage in self.stages.items()
+                if stage["pass"] == pass_name and stage["bytes_removed"]
+            )
+            parts.append(f"{pass_name} {seconds * 1000:.1f} ms" + (f" ({removed})" if removed else ""))
+        return ", ".join(parts)
+
+
+def _utf8_length(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode("utf-8", "surrogatepass"))
+
+
+def _first_char_items(items: Sequence, ignore_case: bool) -> set[str] | None:
+    """Character class items matching every character a parsed pattern can start with, None if unknown"""
+    categories = {
+        sre_constants.CATEGORY_SPACE: r"\s",
+        sre_constants.CATEGORY_DIGIT: r"\d",
+        sre_constants.CATEGORY_WORD: r"\w",
+    }
+    for op, av in items:
+        if op is sre_constants.AT:
+            continue  # anchors are zero-width
+        if op is sre_constants.LITERAL:
+            char = chr(av)
+            return {re.escape(char.lower()), re.escape(char.upper())} if ignore_case else {re.escape(char)}
+        if op is sre_constants.IN:
+            class_items = set()
+            for class_op, class_av in av:
+                if class_op is sre_constants.LITERAL and not ignore_case:
+                    class_items.add(re.escape(chr(class_av)))
+                elif class_op is sre_constants.CATEGORY and class_av in categories:
+                    class_items.add(categories[class_av])
+                else:
+                    return None
+            return class_items
+        if op is sre_constants.SUBPATTERN:
+            _, add_flags, _, subpattern = av
+            return _first_char_items(subpattern, ignore_case or bool(add_flags & re.IGNORECASE))
+        if op is sre_constants.BRANCH:
+            class_items = set()
+            for branch in av[1]:
+                branch_items = _first_char_items(branch, ignore_case)
+                if branch_items is None:
+                    return None
+                class_items |= branch_items
+            return class_items
+        if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] > 0:
+            return _first_char_items(av[2], ignore_case)
+        return None
+    return None
+
+
+def _prefilter(pattern: str) -> str:
+    """Prefixes a fused `pattern` with a lookahead for its possible first characters.
+
+    re only scans ahead quickly for a pattern's literal prefix, an alternation is tried in full at every position.
+    The lookahead rejects most positions with a single character test. Single patterns are left alone, a
+    lookahead would hide their literal prefix. Left unfiltered when re's parser is unavailable or not understood.
+    """
+    if sre_parse is None:
+        return pattern
+    try:
+        class_items = _first_char_items(sre_parse.parse(pattern).data, ignore_case=False)
+    except (AttributeError, IndexError, TypeError, ValueError):  # internals of another Python version
+        return pattern
+    if not class_items:
+        return pattern
+    return f"(?=[{''.join(sorted(class_items))}])(?:{pattern})"
+
+
+class _CleaningPass:
+    """Consecutive fused regex stages compiled into one regex, or a single function stage"""
+
+    def __init__(self, stages: Sequence[CleaningStage]):
+        self.stages = list(stages)
+        self.name = self.stages[0].name.split(".")[0] if len(self.stages) > 1 else self.stages[0].name
+        self.function = self.stages[0].function
+        self.regex = None
+        if self.function is None and len(self.stages) == 1:
+            self.regex = re.compile(self.stages[0].pattern, self.stages[0].flags)
+        elif self.function is None:
+            # each stage is a named alternative, so every match can be attributed to its stage
+            pattern = "|".join(f"(?P<s{i}>{stage.scoped_pattern()})" for i, stage in enumerate(self.stages))
+            self.regex = re.compile(_prefilter(pattern))
+        self._stage_by_group = {f"s{i}": stage for i, stage in enumerate(self.stages)}
+
+    def run(self, text: str, stats: CleaningStats | None) -> str:
+        if stats is None:
+            return self._apply(text)
+
+        start = time.perf_counter()
+        if self.function is not None:
+            cleaned = self.function(text)
+            stats.add_stage(self.name, self.name, int(cleaned != text), _utf8_length(text) - _utf8_length(cleaned))
+        else:
+            matches = {stage.name: 0 for stage in self.stages}
+            removed = dict(matches)
+
+            def replace(match: re.Match) -> str:
+                stage = self._stage_by_group[match.lastgroup] if len(self.stages) > 1 else self.stages[0]
+                matches[stage.name] += 1
+                removed[stage.name] += _utf8_length(match.group()) - _utf8_length(stage.replacement)
+                return stage.replacement
+
+            cleaned = self.regex.sub(replace, text)
+            for name in matches:
+                stats.add_stage(self.name, name, matches[name], removed[name])
+        stats.passes[self.name] = stats.passes.get(self.name, 0.0) + time.perf_counter() - start
+        return cleaned
+
+    def _apply(self, text: str) -> str:
+        if self.function is not None:
+            return self.function(text)
+        if len(self.stages) == 1:
+            return self.regex.sub(self.stages[0].replacement, text)
+        return self.regex.sub(lambda match: self._stage_by_group[match.lastgroup].replacement, text)
+
+
+class CleaningPipeline:
+    """Cleaning stages compiled once when the pipeline is created and run in as few passes as they allow"""
+
+    def __init__(self, stages: Sequence[CleaningStage]):
+        names = [stage.name for stage in stages]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"Duplicate cleaning stage names: {duplicates}")
+        self.stages = list(stages)
+        groups = []
+        for stage in self.stages:
+            if groups and stage.fuse and groups[-1][-1].function is None:
+                groups[-1].append(stage)
+            else:
+                groups.append([stage])
+        self.passes = [_CleaningPass(group) for group in groups]
+
+    def clean(self, text: str, stats: CleaningStats | None = None) -> str:
+        """Runs every pass over `text`, adding timings and bytes removed to `stats` when it is given"""
+        for cleaning_pass in self.passes:
+            text = cleaning_pass.run(text, stats)
+        if stats is not None:
+            stats.pages += 1
+        return text
+
+    def to_dict(self) -> list[dict[str, Any]]:
+        """JSON-serializable description of the stages, e.g. for cache keys"""
+        return [stage.to_dict() for stage in self.stages]
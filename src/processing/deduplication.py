@@ -0,0 +1,93 @@
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+# Largest Mersenne prime below 2**64, the modulus of the universal hash functions used as permutations
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_SHINGLE_MULTIPLIER = np.uint64(0x9E3779B1)
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def _lsh_bands(threshold: float, num_perm: int) -> tuple[int, int]:
+    """Picks the number of bands and rows per band whose LSH S-curve best separates pairs around `threshold`.
+
+    Minimizes the sum of the false positive area below the threshold and the false negative area above it.
+    """
+    similarities = np.linspace(0.0, 1.0, 1001)
+    below, above = similarities < threshold, similarities >= threshold
+    best, best_error = (1, num_perm), float("inf")
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        candidate_probability = 1 - (1 - similarities**rows) ** bands
+        error = candidate_probability[below].sum() + (1 - candidate_probability[above]).sum()
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class NearDuplicateDetector:
+    """Detects near-duplicate texts with MinHash signatures and locality-sensitive hashing.
+
+    Texts are compared as sets of word shingles. Each new text is looked up in the LSH band buckets of the texts seen
+    so far; candidates whose estimated Jaccard similarity reaches `threshold` make it a near-duplicate, otherwise it
+    is remembered. Memory grows by one fixed-size signature per unique text.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError(f"threshold must be in (0, 1], got {threshold}")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.bands, self.rows = _lsh_bands(threshold, num_perm)
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._buckets = [defaultdict(list) for _ in range(self.bands)]
+        self._signatures = []
+
+    def signature(self, text: str) -> np.ndarray:
+        """Returns the MinHash signature of the text's word shingles"""
+        words = _WORD_PATTERN.findall(text.lower()) or [""]
+        word_hashes = np.array([zlib.crc32(word.encode("utf-8")) for word in words], dtype=np.uint64)
+
+        # Hash every run of `shingle_size` consecutive words at once by folding the shifted word hash arrays
+        size = min(self.shingle_size, len(words))
+        n_shingles = len(words) - size + 1
+        hashes = word_hashes[:n_shingles].copy()
+        for offset in range(1, size):
+            hashes = (hashes * _SHINGLE_MULTIPLIER + word_hashes[offset : offset + n_shingles]) & _MAX_HASH
+        hashes = np.unique(hashes)
+
+        # (a * x + b) mod p for every permutation and shingle, both factors stay below 2**32 so nothing overflows
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def similarity(self, first: np.ndarray, second: np.ndarray) -> float:
+        """Estimates the Jaccard similarity of two signatures"""
+        return float(np.mean(first == second))
+
+    def is_duplicate(self, text: str) -> bool:
+        """Checks `text` against the texts seen so far and remembers it if it is not a near-duplicate"""
+        signature = self.signature(text)
+        band_keys = [signature[i * self.rows : (i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+        checked = set()
+        for bucket, key in zip(self._buckets, band_keys):
+            for index in bucket.get(key, ()):
+                if index in checked:
+                    continue
+                checked.add(index)
+                if self.similarity(signature, self._signatures[index]) >= self.threshold:
+                    return True
+
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for bucket, key in zip(self._buckets, band_keys):
+            bucket[key].append(index)
+        return False
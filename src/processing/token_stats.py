@@ -0,0 +1,84 @@
+from collections import Counter
+from collections.abc import Iterable
+from statistics import StatisticsError
+
+
+class TokenCountSketch:
+    """Fixed-memory summary of chunk token counts.
+
+    Token counts are kept as a histogram of distinct values, so memory is bounded by the size of the largest chunk
+    instead of the number of chunks, while min, max, median and quantiles stay exact.
+    """
+
+    def __init__(self, values: Iterable[int] = ()):
+        self.histogram = Counter()
+        self.count = 0
+        self.update(values)
+
+    def add(self, value: int, occurrences: int = 1) -> None:
+        self.histogram[value] += occurrences
+        self.count += occurrences
+
+    def update(self, values: Iterable[int]) -> None:
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "TokenCountSketch") -> None:
+        """Adds the values summarized by another sketch to this one"""
+        self.histogram.update(other.histogram)
+        self.count += other.count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, TokenCountSketch):
+            return NotImplemented
+        return self.histogram == other.histogram
+
+    def min(self) -> int:
+        return min(self.histogram)
+
+    def max(self) -> int:
+        return max(self.histogram)
+
+    def median(self) -> float:
+        """Same result as statistics.median over the summarized values"""
+        if not self.count:
+            raise StatisticsError("no median for empty data")
+        middle = self.count // 2
+        if self.count % 2:
+            return self._value_at(middle)
+        return (self._value_at(middle - 1) + self._value_at(middle)) / 2
+
+    def quantiles(self, n: int = 4) -> list[float]:
+        """Same result as statistics.quantiles(values, n=n) with the default exclusive method"""
+        if self.count < 2:
+            raise StatisticsError("must have at least two data points")
+        m = self.count + 1
+        result = []
+        for i in range(1, n):
+            j = min(max(i * m // n, 1), self.count - 1)
+            delta = i * m - j * n
+            result.append((self._value_at(j - 1) * (n - delta) + self._value_at(j) * delta) / n)
+        return result
+
+    def _value_at(self, index: int) -> int:
+        """Returns the value at `index` in the sorted list of summarized values"""
+        seen = 0
+        for value in sorted(self.histogram):
+            seen += self.histogram[value]
+            if index < seen:
+                return value
+        raise IndexError(index)
+
+    def to_dict(self) -> dict[str, int]:
+        """JSON-serializable form, histogram keys become strings"""
+        return {str(value): occurrences for value, occurrences in self.histogram.items()}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, int]) -> "TokenCountSketch":
+        sketch = cls()
+        for value, occurrences in data.items():
+            sketch.add(int(value), occurrences)
+        return sketch
@@ -0,0 +1,220 @@
+import re
+
+import tiktoken
+
+# A split between text ending in "\n" and a line that starts with optional spaces/tabs followed by a
+# non-whitespace character is always a boundary between cl100k_base pre-tokenizer pieces, so both sides encode
+# independently: len(encode(left + right)) == len(encode(left)) + len(encode(right)).
+_LINE_START_PATTERN = re.compile(r"[ \t]*\S")
+
+# Tails shorter than this are re-encoded as a whole instead of searching them for a new split point
+_REBASE_THRESHOLD = 256
+
+
+def estimate_tokens(text: str) -> int:
+    """Upper bound of the cl100k_base token count of `text`, without encoding it.
+
+    Byte-level BPE splits the UTF-8 bytes of a text into tokens of at least one byte each, so the byte count is never
+    below the token count, whatever the text: digits, emoji and CJK included.
+    """
+    return len(text) if text.isascii() else len(text.encode("utf-8", "surrogatepass"))
+
+
+def is_token_boundary(left: str, right: str) -> bool:
+    """Checks whether `left` and `right` can be tokenized independently without changing the token count."""
+    if not left or not right:
+        return True
+    return left[-1] == "\n" and _LINE_START_PATTERN.match(right) is not None
+
+
+def last_token_boundary(text: str, end: int | None = None) -> int:
+    """Returns the last safe boundary in `text` at or before `end`, or 0 if there is none."""
+    end = len(text) if end is None else end
+    newline = text.rfind("\n", 0, end)
+    while newline >= 0:
+        if _LINE_START_PATTERN.match(text, newline + 1):
+            return newline + 1
+        newline = text.rfind("\n", 0, newline)
+    return 0
+
+
+def first_token_boundary(text: str) -> int:
+    """Returns the first safe boundary in `text` after its start, or len(text) if there is none."""
+    newline = text.find("\n")
+    while newline >= 0:
+        if _LINE_START_PATTERN.match(text, newline + 1):
+            return newline + 1
+        newline = text.find("\n", newline + 1)
+    return len(text)
+
+
+def concatenated_token_count(
+    tokenizer: tiktoken.Encoding, left: str, left_tokens: int, right: str, right_tokens: int
+) -> int:
+    """Returns the token count of `left + right` from the known counts of both sides.
+
+    Only the text between the last safe boundary of `left` and the first safe boundary of `right` is re-encoded.
+    """
+    if is_token_boundary(left, right):
+        return left_tokens + right_tokens
+
+    left_split = last_token_boundary(left)
+    right_split = first_token_boundary(right)
+    if left_split == 0 and right_split == len(right):
+        return len(tokenizer.encode(left + right))
+
+    left_tail, right_head = left[left_split:], right[:right_split]
+    left_tail_tokens = len(tokenizer.encode(left_tail)) if left_split else left_tokens
+    right_head_tokens = len(tokenizer.encode(right_head)) if right_split < len(right) else right_tokens
+    joined_tokens = len(tokenizer.encode(left_tail + right_head))
+    return left_tokens - left_tail_tokens + joined_tokens + right_tokens - right_head_tokens
+
+
+def last_tokens(tokenizer: tiktoken.Encoding, text: str, n: int) -> list[int]:
+    """Returns the last `n` tokens of `text`, encoding only a suffix that starts at a safe boundary."""
+    if n <= 0:
+        return []
+    window = 8 * n  # characters, a token rarely spans more than a few
+    while True:
+        start = last_token_boundary(text, max(len(text) - window, 0))
+        tokens = tokenizer.encode(text[start:])
+        if start == 0 or len(tokens) >= n:
+            return tokens[-n:]
+        window = 2 * (len(text) - start)
+
+
+class TokenAccumulator:
+    """Keeps an exact running token count for text that grows by appending.
+
+    The text is split into a stable prefix, whose token count is final, and a tail after the last safe boundary.
+    Appending only re-encodes the tail, so building a chunk line by line costs O(line) tokenizer work
+    instead of re-encoding the whole chunk for every line.
+    """
+
+    def __init__(self, tokenizer: tiktoken.Encoding, text: str = ""):
+        self.tokenizer = tokenizer
+        self._stable_tokens = 0
+        self._tail = ""
+        self._tail_tokens = 0
+        self._scanned = 0  # tail offset below which the tail has no safe boundary
+        self._probe = None  # (addition, anchored, stable_tokens, tail, tail_tokens) of the last count_with call
+        self._pending = ""  # text appended by push() and not encoded yet
+        self._pending_estimate = 0
+        self._estimated_probe = None  # (addition, estimate) of the last fits() call decided from the estimate
+        if text:
+            self.append(text)
+
+    @property
+    def token_count(self) -> int:
+        self._flush()
+        return self._stable_tokens + self._tail_tokens
+
+    def count_with(self, addition: str, addition_tokens: int | None = None) -> int:
+        """Returns the token count the text would have after appending `addition`, without appending it.
+
+        `addition_tokens` is the token count of `addition` on its own, if the caller already knows it.
+        """
+        self._flush()
+        self._probe = self._extend(addition, addition_tokens)
+        return self._probe[2] + self._probe[4]
+
+    def fits(self, addition: str, limit: int, margin: float = 0.0) -> bool:
+        """Checks whether the text stays within `limit` tokens after appending `addition`.
+
+        With a `margin`, an upper bound that lands more than `margin * limit` below the limit is trusted, and a
+        following push() of `addition` defers encoding it. Bounds within the margin are counted exactly.
+        """
+        if margin > 0:
+            addition_estimate = estimate_tokens(addition)
+            # the tail's exact count only adds up with the text after it across a safe boundary
+            tail_tokens = (
+                self._tail_tokens
+                if is_token_boundary(self._tail, self._pending or addition)
+                else estimate_tokens(self._tail)
+            )
+            estimate = self._stable_tokens + tail_tokens + self._pending_estimate + addition_estimate
+            if estimate <= limit * (1 - margin):
+                self._estimated_probe = (addition, addition_estimate)
+                return True
+        return self.count_with(addition) <= limit
+
+    def push(self, addition: str) -> None:
+        """Appends `addition` like append(), deferring its encoding if fits() decided it from the estimate."""
+        probe = self._estimated_probe
+        self._estimated_probe = None
+        if probe is not None and probe[0] == addition:
+            self._pending += addition
+            self._pending_estimate += probe[1]
+        else:
+            self.append(addition)
+
+    def append(self, addition: str, addition_tokens: int | None = None) -> int:
+        """Appends `addition` and returns the new token count."""
+        self._flush()
+        probe = self._probe
+        if probe is None or probe[0] != addition:
+            probe = self._extend(addition, addition_tokens)
+        _, anchored, self._stable_tokens, self._tail, self._tail_tokens = probe
+        if anchored:
+            self._scanned = 0
+        self._probe = None
+        return self.token_count
+
+    def reset(self, text: str = "") -> int:
+        """Replaces the accumulated text with `text` and returns its token count."""
+        probe = self._probe
+        if probe is not None and probe[1] and probe[0] == text:
+            tokens = probe[4]
+        else:
+            tokens = len(self.tokenizer.encode(text)) if text else 0
+        self._stable_tokens = 0
+        self._tail = text
+        self._tail_tokens = tokens
+        self._scanned = 0
+        self._probe = None
+        self._pending = ""
+        self._pending_estimate = 0
+        self._estimated_probe = None
+        return tokens
+
+    def _flush(self) -> None:
+        """Encodes the text deferred by push() in one go."""
+        if self._pending:
+            pending = self._pending
+            self._pending = ""
+            self._pending_estimate = 0
+            self._probe = None
+            self.append(pending)
+
+    def _extend(self, addition: str, addition_tokens: int | None) -> tuple[str, bool, int, str, int]:
+        if not addition:
+            return addition, False, self._stable_tokens, self._tail, self._tail_tokens
+
+        if is_token_boundary(self._tail, addition):
+            if addition_tokens is None:
+                addition_tokens = len(self.tokenizer.encode(addition))
+            return addition, True, self.token_count, addition, addition_tokens
+
+        if len(self._tail) > _REBASE_THRESHOLD:
+            self._rebase()
+        tail = self._tail + addition
+        return addition, False, self._stable_tokens, tail, len(self.tokenizer.encode(tail))
+
+    def _rebase(self) -> None:
+        """Moves the stable prefix forward to the last safe boundary inside the tail."""
+        tail = self._tail
+        end = last = len(tail) - 1
+        while end > self._scanned:
+            newline = tail.rfind("\n", self._scanned, end)
+            if newline < 0:
+                break
+            split = newline + 1
+            if _LINE_START_PATTERN.match(tail, split):
+                rest_tokens = len(self.tokenizer.encode(tail[split:]))
+                self._stable_tokens += self._tail_tokens - rest_tokens
+                self._tail = tail[split:]
+                self._tail_tokens = rest_tokens
+                self._scanned = 0
+                return
+            end = newline
+        self._scanned = max(self._scanned, last)
@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+from collections.abc import Iterator
+from typing import Any
+
+from src.utils.json_stream import iter_json_list
+
+# Chunk file formats by extension: JSON Lines and msgpack are written and read one chunk at a time, .json is the
+# original single pretty-printed array, still readable lazily and writable for tools that expect it
+CHUNK_FORMATS = (".jsonl", ".msgpack", ".json")
+
+
+def _chunk_format(filepath: str) -> str:
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension not in CHUNK_FORMATS:
+        raise ValueError(f"Unsupported chunk file format '{extension}', expected one of {CHUNK_FORMATS}")
+    return extension
+
+
+def _import_msgpack():
+    try:
+        import msgpack
+    except ImportError as e:
+        raise ImportError("msgpack chunk files need the msgpack package: pip install msgpack") from e
+    return msgpack
+
+
+class ChunkWriter:
+    """Writes chunks to a file one at a time as they are produced.
+
+    The format follows the file extension. For .json the chunks are streamed into an array formatted exactly like
+    json.dump(chunks, f, indent=2).
+    Chunks go to a temporary file next to `filepath` that replaces it on close(), so a run that fails halfway never
+    leaves a truncated chunk file behind (sync_documents deletes the stored chunks missing from a file).
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.format = _chunk_format(filepath)
+        self.count = 0
+        self._packer = _import_msgpack().Packer() if self.format == ".msgpack" else None
+        fd, self._tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(filepath) or ".", prefix=os.path.basename(filepath) + ".", suffix=".tmp"
+        )
+        if self.format == ".msgpack":
+            self._file = os.fdopen(fd, "wb")
+        else:
+            self._file = os.fdopen(fd, "w", encoding="utf-8")
+
+    def write(self, chunk: dict[str, Any]) -> None:
+        if self.format == ".jsonl":
+            self._file.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+        elif self.format == ".msgpack":
+            self._file.write(self._packer.pack(chunk))
+        else:
+            self._file.write(",\n  " if self.count else "[\n  ")
+            self._file.write(json.dumps(chunk, indent=2).replace("\n", "\n  "))
+        self.count += 1
+
+    def close(self) -> None:
+        """Completes the file and moves it into place"""
+        if self._file.closed:
+            return
+        try:
+            if self.format == ".json":
+                self._file.write("\n]" if self.count else "[]")
+            self._file.close()
+            os.replace(self._tmp_path, self.filepath)
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self) -> None:
+        """Discards the chunks written so far, an existing file at `filepath` is left as it was"""
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self) -> "ChunkWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def iter_chunk_file(filepath: str) -> Iterator[dict[str, Any]]:
+    """Yields the chunks stored in a chunk file one at a time, in any of the CHUNK_FORMATS"""
+    chunk_format = _chunk_format(filepath)
+    if chunk_format == ".json":
+        yield from iter_json_list(filepath)
+    elif chunk_format == ".msgpack":
+        with open(filepath, "rb") as f:
+            yield from _import_msgpack().Unpacker(f, raw=False)
+    else:
+        with open(filepath, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
@@ -34,8 +34,13 @@ EVAL_DIR = os.path.join(BASE_DIR, "src", "evaluation")
 JOB_FILE_DIR = os.path.join(BASE_DIR, "src", "crawling")
 RAW_DATA_DIR = os.path.join(BASE_DIR, "src", "data", "raw")
 PROCESSED_DATA_DIR = os.path.join(BASE_DIR, "src", "data", "chunks")
+CHUNK_CACHE_DIR = os.path.join(BASE_DIR, "src", "data", "cache", "chunks")
+EMBEDDING_CACHE_DIR = os.path.join(BASE_DIR, "src", "data", "cache", "embeddings")
 CHROMA_DB_DIR = os.path.join(SRC_ROOT, "vector_storage", "chroma")
+BM25_INDEX_DIR = os.path.join(SRC_ROOT, "vector_storage", "bm25")
+NUMPY_INDEX_DIR = os.path.join(SRC_ROOT, "vector_storage", "numpy")
 VECTOR_STORAGE_DIR = os.path.join(SRC_ROOT, "vector_storage")
+BENCHMARK_DIR = os.path.join(SRC_ROOT, "benchmarks", "results")
 
 # LLM config
 MAIN_MODEL = "claude-3-5-sonnet-20240620"
@@ -44,11 +49,40 @@ MAIN_MODEL = "claude-3-5-sonnet-20240620"
 EVALUATOR_MODEL_NAME = "gpt-4o-mini"
 EMBEDDING_MODEL = "text-embedding-3-small"
 
+# Embedding provider: "openai", or "hashing" for offline deterministic embeddings
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+
+# Vector store backend: "chroma", or "numpy" for the in-process brute-force index
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+
+# Embedding ingest config
+EMBEDDING_MAX_WORKERS = 4
+EMBEDDING_TOKENS_PER_MINUTE = 1_000_000
+EMBEDDING_CACHE_MAX_BYTES = 2 * 1024**3  # per embedding model and dimension count
+
+# Query embedding cache config
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_TTL_SECONDS = 3600
+
+# Document sync config
+SYNC_MAX_DELETE_SHARE = 0.5  # a sync deleting more of a file's stored chunks is refused as a truncated file
+
+# Retrieval config
+RRF_K = 60
+MAX_RERANK_CANDIDATES = 30
+ROUTE_SOURCES = False  # search only the doc sets whose summary keywords match the query
+MAX_ROUTED_SOURCES = 3
+
 
 # Ensure directories exist
 os.makedirs(JOB_FILE_DIR, exist_ok=True)
 os.makedirs(RAW_DATA_DIR, exist_ok=True)
 os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
+os.makedirs(CHUNK_CACHE_DIR, exist_ok=True)
+os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
 os.makedirs(CHROMA_DB_DIR, exist_ok=True)
+os.makedirs(BM25_INDEX_DIR, exist_ok=True)
+os.makedirs(NUMPY_INDEX_DIR, exist_ok=True)
 os.makedirs(VECTOR_STORAGE_DIR, exist_ok=True)
+os.makedirs(BENCHMARK_DIR, exist_ok=True)
 os.makedirs(LOG_DIR, exist_ok=True)
@@ -1,4 +1,5 @@
 import functools
+import logging
 import sys
 import time
 from collections.abc import Callable
@@ -20,12 +21,16 @@ from anthropic import (
 from src.utils.logger import get_logger
 
 
+def _function_logger(func: Callable) -> logging.Logger:
+    # Resolved once when decorating, so a successful call costs the wrapper and nothing else
+    return get_logger(getattr(func, "__module__", None) or "omni-claude")
+
+
 def base_error_handler(func: Callable) -> Callable:
+    logger = _function_logger(func)
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs) -> Any:
-        # Access the logger
-        logger = get_logger()
-
         try:
             return func(*args, **kwargs)
         except Exception as e:
@@ -36,11 +41,10 @@ def base_error_handler(func: Callable) -> Callable:
 
 
 def application_level_handler(func: Callable) -> Callable:
+    logger = _function_logger(func)
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs) -> Any:
-        # Access the logger
-        logger = get_logger()
-
         try:
             return func(*args, **kwargs)
         except KeyboardInterrupt:
@@ -57,11 +61,10 @@ def application_level_handler(func: Callable) -> Callable:
 
 
 def anthropic_error_handler(func: Callable) -> Callable:
+    logger = _function_logger(func)
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs) -> Any:
-        # Access the logger
-        logger = get_logger()
-
         try:
             return func(*args, **kwargs)
         except AuthenticationError as e:
@@ -102,14 +105,15 @@ def anthropic_error_handler(func: Callable) -> Callable:
 
 
 def performance_logger(func: Callable) -> Callable:
+    logger = _function_logger(func)
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs) -> Any:
-        # Access the logger
-        logger = get_logger()
-
-        start_time = time.time()
+        if not logger.isEnabledFor(logging.DEBUG):
+            return func(*args, **kwargs)
+        start_time = time.perf_counter()
         result = func(*args, **kwargs)
-        end_time = time.time()
+        end_time = time.perf_counter()
         logger.debug(f"{func.__name__} took {end_time - start_time:.2f} seconds to execute")
         return result
 
@@ -0,0 +1,110 @@
+import json
+from collections.abc import Iterator
+from typing import IO, Any
+
+_WHITESPACE = " \t\n\r"
+_VALUE_END = _WHITESPACE + ",]}"
+
+
+class _JSONStreamReader:
+    """Decodes JSON values one at a time from a file, keeping only the undecoded remainder in memory"""
+
+    def __init__(self, file: IO[str], buffer_size: int):
+        self.file = file
+        self.buffer_size = buffer_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self) -> bool:
+        """Reads more data into the buffer, returns False at the end of the file"""
+        if self.eof:
+            return False
+        # read at least as much as is still buffered so values larger than the buffer are retried O(log n) times
+        data = self.file.read(max(self.buffer_size, len(self.buffer) - self.pos))
+        self.buffer = self.buffer[self.pos :] + data
+        self.pos = 0
+        if not data:
+            self.eof = True
+        return bool(data)
+
+    def peek(self) -> str:
+        """Returns the next non-whitespace character without consuming it, or an empty string at the end"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, allowed: str) -> str:
+        """Consumes the next non-whitespace character, which must be one of `allowed`"""
+        char = self.peek()
+        if not char or char not in allowed:
+            raise json.JSONDecodeError(f"Expecting one of {allowed!r}", self.buffer, self.pos)
+        self.pos += 1
+        return char
+
+    def decode_value(self) -> Any:
+        """Decodes the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # a number is only complete once the character after it is buffered, "1" may be the start of "1.5e3"
+            if (
+                isinstance(value, int | float)
+                and not isinstance(value, bool)
+                and (end == len(self.buffer) or self.buffer[end] not in _VALUE_END)
+                and self.fill()
+            ):
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_array_items(reader: _JSONStreamReader) -> Iterator[Any]:
+    """Yields the items of the array starting at the reader's position"""
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield reader.decode_value()
+        if reader.expect(",]") == "]":
+            return
+
+
+def iter_json_list(filepath: str, buffer_size: int = 1 << 20) -> Iterator[Any]:
+    """Yields the items of a file holding a top-level JSON array one at a time"""
+    with open(filepath, encoding="utf-8") as f:
+        yield from _iter_array_items(_JSONStreamReader(f, buffer_size))
+
+
+def iter_json_array(filepath: str, key: str = "data", buffer_size: int = 1 << 20) -> Iterator[Any]:
+    """Yields the items of the array stored under `key` of a top-level JSON object one at a time.
+
+    Only the item being decoded is held in memory, so peak memory scales with the largest item instead of the
+    whole file. Keys after `key` are not read.
+    """
+    with open(filepath, encoding="utf-8") as f:
+        reader = _JSONStreamReader(f, buffer_size)
+        reader.expect("{")
+        if reader.peek() == "}":
+            raise KeyError(key)
+
+        while True:
+            name = reader.decode_value()
+            reader.expect(":")
+            if name == key:
+                yield from _iter_array_items(reader)
+                return
+            reader.decode_value()  # skip values of other keys
+            if reader.expect(",}") == "}":
+                raise KeyError(key)
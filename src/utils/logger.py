@@ -77,10 +77,13 @@ def configure_logging(debug=False, log_file="app.log"):
     app_logger.propagate = False
 
 
-def get_logger():
+def get_logger(module_name: str | None = None):
     """
-    Retrieves a logger with the 'omni-claude' prefix based on the caller's module.
+    Retrieves a logger with the 'omni-claude' prefix based on the caller's module, or on `module_name` if given.
     """
+    if module_name is not None:
+        return logging.getLogger(f"omni-claude.{module_name}")
+
     import inspect
 
     frame = inspect.currentframe()
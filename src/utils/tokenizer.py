@@ -0,0 +1,100 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+
+import tiktoken
+
+DEFAULT_ENCODING = "cl100k_base"
+
+_services: dict[str, "TokenizerService"] = {}
+_services_lock = threading.Lock()
+
+
+def get_tokenizer(encoding_name: str = DEFAULT_ENCODING) -> "TokenizerService":
+    """Returns the process-wide tokenizer service for an encoding, creating it on first use"""
+    service = _services.get(encoding_name)
+    if service is None:
+        with _services_lock:
+            service = _services.get(encoding_name)
+            if service is None:
+                service = _services[encoding_name] = TokenizerService(encoding_name)
+    return service
+
+
+class TokenizerService:
+    """One tiktoken encoder shared by the whole process, with a bounded LRU of token counts.
+
+    Counts are keyed by a 16-byte digest of the text, so the cache holds no text and repeated strings such as tool
+    results, code fences or long user messages are encoded once. Use get_tokenizer() instead of creating instances.
+    """
+
+    def __init__(self, encoding_name: str = DEFAULT_ENCODING, cache_size: int = 65536, num_threads: int = 8):
+        self.encoding_name = encoding_name
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self.cache_size = cache_size
+        self.num_threads = num_threads
+        self.hits = 0
+        self.misses = 0
+        self._counts: OrderedDict[bytes, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # Pickled references (e.g. in objects sent to worker processes) resolve to that process's own service
+        return get_tokenizer, (self.encoding_name,)
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def _lookup(self, key: bytes) -> int | None:
+        with self._lock:
+            count = self._counts.get(key)
+            if count is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._counts.move_to_end(key)
+            return count
+
+    def _store(self, key: bytes, count: int) -> None:
+        with self._lock:
+            self._counts[key] = count
+            self._counts.move_to_end(key)
+            while len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+
+    def encode(self, text: str) -> list[int]:
+        return self.encoding.encode(text)
+
+    def decode(self, tokens: Sequence[int]) -> str:
+        return self.encoding.decode(tokens)
+
+    def count(self, text: str) -> int:
+        """Returns the token count of `text`, encoding it only if the count is not cached"""
+        key = self._key(text)
+        count = self._lookup(key)
+        if count is None:
+            count = len(self.encoding.encode(text))
+            self._store(key, count)
+        return count
+
+    def count_batch(self, texts: Sequence[str]) -> list[int]:
+        """Returns the token counts of many texts, encoding the uncached ones in parallel threads"""
+        keys = [self._key(text) for text in texts]
+        counts = [self._lookup(key) for key in keys]
+        missing = [i for i, count in enumerate(counts) if count is None]
+        if missing:
+            encoded = self.encoding.encode_batch([texts[i] for i in missing], num_threads=self.num_threads)
+            for i, tokens in zip(missing, encoded):
+                counts[i] = len(tokens)
+                self._store(keys[i], counts[i])
+        return counts
+
+    def cache_info(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._counts), "max_size": self.cache_size}
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self.hits = self.misses = 0
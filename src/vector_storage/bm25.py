@@ -0,0 +1,256 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+from collections.abc import Collection, Iterable, Sequence
+
+import numpy as np
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+SEGMENT_SUFFIX = ".bm25.npz"
+
+TOKEN_PATTERN = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word tokens without stopwords; snake_case identifiers are kept whole and also split into parts"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if "_" in token.strip("_"):
+            tokens.extend(part for part in token.split("_") if part and part not in STOPWORDS)
+    return tokens
+
+
+def fingerprint(ids: Sequence[str], documents: Sequence[str]) -> str:
+    """Identifies the content of a segment, a segment is only rebuilt when this changes"""
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk_id, document in zip(ids, documents):
+        digest.update(chunk_id.encode("utf-8"))
+        digest.update(hashlib.blake2b(document.encode("utf-8"), digest_size=16).digest())
+    return digest.hexdigest()
+
+
+class BM25Segment:
+    """Inverted index of the chunks of one chunk file in CSR layout.
+
+    Postings of term i are doc_ids[indptr[i]:indptr[i + 1]] (int32 positions into chunk_ids) with their term
+    frequencies in tfs (uint16), sorted by term and then by document.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        chunk_ids: list[str],
+        terms: list[str],
+        indptr: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+        content_fingerprint: str,
+    ):
+        self.name = name
+        self.chunk_ids = chunk_ids
+        self.terms = {term: row for row, term in enumerate(terms)}
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.fingerprint = content_fingerprint
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    @classmethod
+    def build(cls, name: str, ids: Sequence[str], documents: Sequence[str]) -> "BM25Segment":
+        vocabulary: dict[str, int] = {}
+        term_ids, doc_ids, tfs = [], [], []
+        doc_lengths = np.zeros(len(ids), dtype=np.int32)
+        for doc_id, document in enumerate(documents):
+            counts = Counter(tokenize(document))
+            doc_lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        order = np.argsort(term_ids, kind="stable")  # stable keeps each term's postings in document order
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=indptr[1:])
+        return cls(
+            name,
+            list(ids),
+            list(vocabulary),
+            indptr,
+            np.asarray(doc_ids, dtype=np.int32)[order],
+            np.minimum(np.asarray(tfs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16)[order],
+            doc_lengths,
+            fingerprint(ids, documents),
+        )
+
+    def document_frequency(self, term: str) -> int:
+        row = self.terms.get(term)
+        return 0 if row is None else int(self.indptr[row + 1] - self.indptr[row])
+
+    def postings(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+        row = self.terms.get(term)
+        if row is None:
+            return self.doc_ids[:0], self.tfs[:0]
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    def save(self, path: str) -> None:
+        """Writes the segment atomically"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    name=np.array(self.name),
+                    chunk_ids=np.array("\n".join(self.chunk_ids)),
+                    terms=np.array("\n".join(self.terms)),
+                    indptr=self.indptr,
+                    doc_ids=self.doc_ids,
+                    tfs=self.tfs,
+                    doc_lengths=self.doc_lengths,
+                    fingerprint=np.array(self.fingerprint),
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Segment":
+        with np.load(path) as data:
+            chunk_ids, terms = str(data["chunk_ids"]), str(data["terms"])
+            return cls(
+                str(data["name"]),
+                chunk_ids.split("\n") if chunk_ids else [],
+                terms.split("\n") if terms else [],
+                data["indptr"],
+                data["doc_ids"],
+                data["tfs"],
+                data["doc_lengths"],
+                str(data["fingerprint"]),
+            )
+
+
+class BM25Index:
+    """BM25 index over chunk files, one segment per file, persisted as `<file>.bm25.npz` in `index_dir`.
+
+    Statistics (document count, average length, document frequencies) are combined across segments at query time,
+    so replacing one file's segment keeps the scores of the others exact.
+    """
+
+    def __init__(self, index_dir: str, k1: float = 1.2, b: float = 0.75):
+        self.index_dir = index_dir
+        self.k1 = k1
+        self.b = b
+        self.segments: dict[str, BM25Segment] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._load()
+
+    def __len__(self) -> int:
+        return sum(len(segment) for segment in self.segments.values())
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, re.sub(r"[^\w.-]+", "_", name) + SEGMENT_SUFFIX)
+
+    def _load(self) -> None:
+        for filename in sorted(os.listdir(self.index_dir)):
+            if filename.endswith(SEGMENT_SUFFIX):
+                try:
+                    segment = BM25Segment.load(os.path.join(self.index_dir, filename))
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"Ignoring unreadable BM25 segment {filename}: {e}")
+                    continue
+                self.segments[segment.name] = segment
+        if self.segments:
+            logger.info(f"Loaded BM25 index of {len(self)} chunks in {len(self.segments)} segments")
+
+    def update(self, name: str, ids: Sequence[str], documents: Sequence[str]) -> bool:
+        """Replaces the segment of a chunk file unless its content is unchanged, returns whether it was rebuilt"""
+        if name in self.segments and self.segments[name].fingerprint == fingerprint(ids, documents):
+            return False
+        segment = BM25Segment.build(name, ids, documents)
+        segment.save(self._path(name))
+        with self._lock:
+            self.segments[name] = segment
+        logger.info(f"Indexed {len(segment)} chunks of {name} for BM25 ({len(segment.terms)} terms)")
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            for name in self.segments:
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+            self.segments = {}
+
+    def search(self, query: str, n_results: int = 10) -> list[tuple[str, float]]:
+        """Returns the (chunk id, score) pairs of the best matching chunks, best first"""
+        return self.search_many([query], n_results)[0]
+
+    def search_many(
+        self, queries: Iterable[str], n_results: int = 10, names: Collection[str] | None = None
+    ) -> list[list[tuple[str, float]]]:
+        """One ranked list per query, sharing the collection statistics.
+
+        names: the segments (chunk files) to search, None for all; statistics then come from those segments only
+        """
+        queries = list(queries)
+        segments = [segment for name, segment in self.segments.items() if names is None or name in names]
+        n_documents = sum(len(segment) for segment in segments)
+        if not n_documents:
+            return [[] for _ in queries]
+        average_length = max(sum(int(segment.doc_lengths.sum()) for segment in segments) / n_documents, 1.0)
+        return [self._search(segments, query, n_results, n_documents, average_length) for query in queries]
+
+    def _search(
+        self,
+        segments: list[BM25Segment],
+        query: str,
+        n_results: int,
+        n_documents: int,
+        average_length: float,
+    ) -> list[tuple[str, float]]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        idfs = {}
+        for term in terms:
+            df = sum(segment.document_frequency(term) for segment in segments)
+            if df:
+                idfs[term] = np.log(1 + (n_documents - df + 0.5) / (df + 0.5))
+
+        candidates = []
+        for segment in segments:
+            scores = None
+            for term, idf in idfs.items():
+                doc_ids, tfs = segment.postings(term)
+                if not len(doc_ids):
+                    continue
+                if scores is None:
+                    scores = np.zeros(len(segment), dtype=np.float32)
+                    norms = self.k1 * (1 - self.b + self.b * segment.doc_lengths / average_length)
+                tfs = tfs.astype(np.float32)
+                scores[doc_ids] += idf * tfs * (self.k1 + 1) / (tfs + norms[doc_ids])
+            if scores is None:
+                continue
+            top = np.flatnonzero(scores)
+            if len(top) > n_results:
+                top = top[np.argpartition(scores[top], -n_results)[-n_results:]]
+            candidates.extend((segment.chunk_ids[doc_id], float(scores[doc_id])) for doc_id in top)
+
+        candidates.sort(key=lambda item: item[1], reverse=True)
+        return candidates[:n_results]
@@ -0,0 +1,348 @@
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+
+import numpy as np
+
+from src.utils.logger import get_logger
+from src.vector_storage.sync import content_hash
+
+logger = get_logger()
+
+VECTORS_FILE = "vectors.f32"
+JOURNAL_FILE = "index.log"
+CURRENT_FILE = "CURRENT"  # names the vectors file and journal in use, replaced atomically when they change
+TOMBSTONE = "-"  # journal row of an evicted hash
+
+
+def cache_namespace(model_name: str, dimensions: int) -> str:
+    """Directory name of the vectors of one embedding model and dimension count"""
+    return f"{re.sub(r'[^A-Za-z0-9._-]+', '_', model_name)}-{dimensions}d"
+
+
+def _write_file(path: str, content: str) -> None:
+    """Writes a small text file atomically and durably"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="ascii") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _current_files(directory: str) -> tuple[int, str, str]:
+    """(generation, vectors file, journal file) in use in a cache directory, the unversioned names before the
+    first compaction"""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), encoding="ascii") as f:
+            generation, vectors_file, journal_file = f.read().split()
+        return int(generation), vectors_file, journal_file
+    except (OSError, ValueError):
+        return 0, VECTORS_FILE, JOURNAL_FILE
+
+
+class EmbeddingCache:
+    """Disk-backed store of the embeddings of one (model, dimensions) pair, keyed by content hash of the text.
+
+    Vectors are float32 rows of a memory-mapped file that grows up to `max_bytes`; beyond that the rows of the least
+    recently used hashes are reused. Row assignments are appended to a journal (`<hash> <row>` per line, `<hash> -`
+    for an eviction) that is replayed on open, last line winning. A row is only written once the journal no longer
+    maps any hash to it and is flushed before its own journal line, so an interrupted write never maps a hash to
+    another text's vector.
+    Recency is kept in memory and written to disk by compaction and close(); compaction writes a new generation of
+    vectors file and journal and switches to it by replacing the CURRENT file, so a crash leaves either generation
+    intact.
+    Thread-safe within a process; one process at a time may write a cache directory.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, dimensions: int, max_bytes: int = 2 * 1024**3):
+        self.model_name = model_name
+        self.dimensions = dimensions
+        self.directory = os.path.join(cache_dir, cache_namespace(model_name, dimensions))
+        self.row_bytes = dimensions * np.dtype(np.float32).itemsize
+        self.max_entries = max(1, max_bytes // self.row_bytes)  # Rows kept before the least recently used are evicted
+        self.evictions = 0
+
+        self._rows: OrderedDict[str, int] = OrderedDict()  # hash -> row, least recently used first
+        self._free: list[int] = []  # unused rows below capacity, popped from the end
+        self._capacity = 0
+        self._vectors: np.memmap | None = None
+        self._journal_lines = 0
+        self._recency_changed = False  # whether hits reordered _rows since the journal was last rewritten
+        self._lock = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._generation, self._vectors_file, self._journal_file = _current_files(self.directory)
+        self._load()
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.directory, self._vectors_file)
+
+    @property
+    def journal_path(self) -> str:
+        return os.path.join(self.directory, self._journal_file)
+
+    @property
+    def nbytes(self) -> int:
+        return self._capacity * self.row_bytes
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows
+
+    def get(self, keys: list[str]) -> dict[str, np.ndarray]:
+        """Returns copies of the cached vectors of `keys` that are present and marks them as recently used"""
+        with self._lock:
+            found = {}
+            for key in dict.fromkeys(keys):
+                row = self._rows.get(key)
+                if row is not None:
+                    self._rows.move_to_end(key)
+                    found[key] = np.array(self._vectors[row])
+            self._recency_changed = self._recency_changed or bool(found)
+            return found
+
+    def put(self, vectors: dict[str, np.ndarray]) -> None:
+        """Stores vectors by key, evicting the least recently used rows once the cache is full"""
+        with self._lock:
+            written, evicted = [], []
+            for key, vector in vectors.items():
+                vector = np.asarray(vector, dtype=np.float32)
+                if vector.shape != (self.dimensions,):
+                    raise ValueError(f"Expected a vector of {self.dimensions} dimensions, got shape {vector.shape}")
+                row = self._rows.get(key)
+                if row is None:
+                    row = self._allocate_row(evicted)
+                self._rows[key] = row
+                self._rows.move_to_end(key)
+                written.append((key, row, vector))
+            # unmap the evicted hashes on disk before their rows are overwritten
+            self._append_journal([(key, TOMBSTONE) for key in evicted], sync=True)
+            for _, row, vector in written:
+                self._vectors[row] = vector
+            if written:
+                self._vectors.flush()
+                self._append_journal([(key, row) for key, row, _ in written])
+            if self._journal_lines > 4 * len(self._rows) + 1024:
+                self._compact()
+
+    def close(self) -> None:
+        """Flushes the vectors and writes the current recency order to disk"""
+        with self._lock:
+            if self._vectors is None:
+                return
+            self._vectors.flush()
+            if self._recency_changed:
+                self._rewrite_journal()
+            self._vectors = None
+
+    def _allocate_row(self, evicted: list[str]) -> int:
+        if not self._free and self._capacity < self.max_entries:
+            self._grow(min(self.max_entries, max(1024, 2 * self._capacity)))
+        if self._free:
+            return self._free.pop()
+        key, row = self._rows.popitem(last=False)
+        evicted.append(key)
+        self.evictions += 1
+        return row
+
+    def _grow(self, capacity: int) -> None:
+        """Extends the vectors file to `capacity` rows and remaps it"""
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(capacity * self.row_bytes)
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimensions))
+        self._free.extend(reversed(range(self._capacity, capacity)))
+        self._capacity = capacity
+
+    def _append_journal(self, entries: list[tuple[str, int | str]], sync: bool = False) -> None:
+        if not entries:
+            return
+        with open(self.journal_path, "a", encoding="ascii") as f:
+            f.writelines(f"{key} {row}\n" for key, row in entries)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        self._journal_lines += len(entries)
+
+    def _load(self) -> None:
+        # files of other generations are left over from a compaction that crashed before or after switching
+        in_use = {CURRENT_FILE, self._vectors_file, self._journal_file}
+        for name in os.listdir(self.directory):
+            if name not in in_use and (name.startswith(("vectors.", "index.")) or name.endswith(".tmp")):
+                os.remove(os.path.join(self.directory, name))
+
+        capacity = os.path.getsize(self.vectors_path) // self.row_bytes if os.path.exists(self.vectors_path) else 0
+        owners: dict[int, str] = {}  # a reused row belongs to the hash written to it last
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding="ascii") as f:
+                for line in f:
+                    self._journal_lines += 1
+                    try:
+                        key, row = line.split()
+                        if row == TOMBSTONE:
+                            owners.pop(self._rows.pop(key, -1), None)
+                            continue
+                        row = int(row)
+                    except ValueError:
+                        continue  # a line cut short by an interrupted write
+                    if row >= capacity:
+                        continue
+                    previous_owner = owners.get(row)
+                    if previous_owner is not None and previous_owner != key:
+                        self._rows.pop(previous_owner, None)
+                    previous_row = self._rows.pop(key, None)
+                    if previous_row is not None and previous_row != row:
+                        owners.pop(previous_row, None)
+                    owners[row] = key
+                    self._rows[key] = row
+
+        if capacity:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimensions))
+            self._capacity = capacity
+            self._free = [row for row in reversed(range(capacity)) if row not in owners]
+        if capacity > self.max_entries or self._journal_lines > 4 * len(self._rows) + 1024:
+            self._compact()
+        logger.debug(f"Loaded {len(self._rows)} cached embeddings from {self.directory}")
+
+    def _switch(self, vectors_file: str, journal_file: str) -> None:
+        """Makes a new vectors file and journal current in one atomic step and removes the ones they replace"""
+        previous = {self._vectors_file, self._journal_file} - {vectors_file, journal_file}
+        self._generation += 1
+        _write_file(os.path.join(self.directory, CURRENT_FILE), f"{self._generation} {vectors_file} {journal_file}\n")
+        self._vectors_file, self._journal_file = vectors_file, journal_file
+        for name in previous:
+            if os.path.exists(os.path.join(self.directory, name)):
+                os.remove(os.path.join(self.directory, name))
+
+    def _write_journal(self, journal_file: str, entries: list[tuple[str, int]]) -> None:
+        with open(os.path.join(self.directory, journal_file), "w", encoding="ascii") as f:
+            f.writelines(f"{key} {row}\n" for key, row in entries)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite_journal(self) -> None:
+        """Replaces the journal by one line per hash in recency order"""
+        journal_file = f"index.{self._generation + 1}.log"
+        self._write_journal(journal_file, list(self._rows.items()))
+        self._switch(self._vectors_file, journal_file)
+        self._journal_lines = len(self._rows)
+        self._recency_changed = False
+
+    def _compact(self) -> None:
+        """Rewrites vectors and journal with the most recently used max_entries rows, in use order"""
+        keep = list(self._rows.items())[-self.max_entries :]
+        capacity = min(self.max_entries, max(len(keep), 1024))
+        vectors_file, journal_file = f"vectors.{self._generation + 1}.f32", f"index.{self._generation + 1}.log"
+        vectors = np.memmap(
+            os.path.join(self.directory, vectors_file), dtype=np.float32, mode="w+", shape=(capacity, self.dimensions)
+        )
+        for new_row, (_, row) in enumerate(keep):
+            vectors[new_row] = self._vectors[row]
+        vectors.flush()
+        del vectors
+        self._write_journal(journal_file, [(key, new_row) for new_row, (key, _) in enumerate(keep)])
+
+        self._vectors = None
+        self._switch(vectors_file, journal_file)
+        self.evictions += len(self._rows) - len(keep)
+        self._rows = OrderedDict((key, new_row) for new_row, (key, _) in enumerate(keep))
+        self._journal_lines = len(keep)
+        self._recency_changed = False
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimensions))
+        self._free = list(reversed(range(len(keep), capacity)))
+        self._capacity = capacity
+
+
+class CachedEmbeddingFunction:
+    """Embedding function that serves texts embedded before from an EmbeddingCache and embeds only the rest.
+
+    Follows the Chroma EmbeddingFunction call convention, so it can stand in for the wrapped function anywhere. The
+    dimension count is taken from the first embeddings returned unless given; before that the cache of the model
+    used most recently is read.
+    """
+
+    def __init__(
+        self,
+        embedding_function: Callable[[list[str]], list[list[float]]],
+        model_name: str,
+        cache_dir: str,
+        dimensions: int | None = None,
+        max_bytes: int = 2 * 1024**3,
+    ):
+        self.embedding_function = embedding_function
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes  # Disk budget of the cache of one model and dimension count
+        self.hits = 0
+        self.misses = 0
+        self._caches: dict[int, EmbeddingCache] = {}
+        self._dimensions = dimensions or self._latest_dimensions()
+        self._lock = threading.Lock()
+
+    def __call__(self, input: list[str]) -> list[list[float]]:
+        keys = [content_hash(text) for text in input]
+        cache = self._cache(self._dimensions) if self._dimensions else None
+        vectors = cache.get(keys) if cache else {}
+
+        missing = {key: text for key, text in zip(keys, input) if key not in vectors}
+        if missing:
+            embedded = np.asarray(self.embedding_function(list(missing.values())), dtype=np.float32)
+            if embedded.ndim != 2 or len(embedded) != len(missing):
+                raise ValueError(f"Expected {len(missing)} embeddings, got an array of shape {embedded.shape}")
+            stale = bool(vectors) and embedded.shape[1] != self._dimensions
+            self._dimensions = embedded.shape[1]
+            new_vectors = dict(zip(missing, embedded))
+            self._cache(self._dimensions).put(new_vectors)
+            if stale:
+                # the hits came from the cache of another dimension count, serve all texts from this one
+                return self(input)
+            vectors.update(new_vectors)
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+        # plain floats, Chroma rejects NumPy scalars; hits and misses both come back float32-rounded
+        return [vectors[key].tolist() for key in keys]
+
+    def cached(self, texts: list[str]) -> list[bool]:
+        """Which texts would be served from the cache, without marking them as used"""
+        cache = self._cache(self._dimensions) if self._dimensions else None
+        return [cache is not None and content_hash(text) in cache for text in texts]
+
+    def close(self) -> None:
+        """Closes the caches, writing their recency order to disk"""
+        with self._lock:
+            for cache in self._caches.values():
+                cache.close()
+            self._caches = {}
+
+    def _cache(self, dimensions: int) -> EmbeddingCache:
+        with self._lock:
+            if dimensions not in self._caches:
+                self._caches[dimensions] = EmbeddingCache(self.cache_dir, self.model_name, dimensions, self.max_bytes)
+            return self._caches[dimensions]
+
+    def _latest_dimensions(self) -> int | None:
+        """Dimension count of the most recently written cache of the model, if any"""
+        prefix = cache_namespace(self.model_name, 0)[:-2]
+        candidates = []
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                match = re.fullmatch(re.escape(prefix) + r"(\d+)d", name)
+                journal_path = os.path.join(self.cache_dir, name, _current_files(os.path.join(self.cache_dir, name))[2])
+                if match and os.path.exists(journal_path):
+                    candidates.append((os.path.getmtime(journal_path), int(match.group(1))))
+        return max(candidates)[1] if candidates else None
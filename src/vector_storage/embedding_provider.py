@@ -0,0 +1,147 @@
+import hashlib
+from abc import ABC, abstractmethod
+from typing import Any
+
+import numpy as np
+
+from src.utils.logger import get_logger
+from src.vector_storage.bm25 import tokenize
+
+logger = get_logger()
+
+# Collection metadata keys recording what a vector store was embedded with
+PROVIDER_KEY = "embedding_provider"
+MODEL_KEY = "embedding_model"
+DIMENSIONS_KEY = "embedding_dimensions"
+
+OPENAI_EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+
+class EmbeddingProvider(ABC):
+    """Embeds texts for the vector store, following the Chroma EmbeddingFunction call convention"""
+
+    name: str = ""
+    remote: bool = False  # Whether embedding costs a network call, only remote embeddings are cached and rate limited
+
+    def __init__(self, model_name: str, dimensions: int):
+        self.model_name = model_name
+        self.dimensions = dimensions
+
+    @abstractmethod
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        pass
+
+    def __call__(self, input: list[str]) -> list[list[float]]:
+        return self.embed(list(input))
+
+    @property
+    def identity(self) -> dict[str, Any]:
+        """Recorded in the collection metadata, a store only accepts embeddings with the same identity"""
+        return {PROVIDER_KEY: self.name, MODEL_KEY: self.model_name, DIMENSIONS_KEY: self.dimensions}
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI embeddings through Chroma's OpenAIEmbeddingFunction"""
+
+    name = "openai"
+    remote = True
+
+    def __init__(self, model_name: str = "text-embedding-3-small", api_key: str | None = None):
+        if model_name not in OPENAI_EMBEDDING_DIMENSIONS:
+            raise ValueError(
+                f"Unknown OpenAI embedding model {model_name}, expected one of {OPENAI_EMBEDDING_DIMENSIONS}"
+            )
+        super().__init__(model_name, OPENAI_EMBEDDING_DIMENSIONS[model_name])
+        import chromadb.utils.embedding_functions as embedding_functions
+
+        self.embedding_function = embedding_functions.OpenAIEmbeddingFunction(api_key=api_key, model_name=model_name)
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        return self.embedding_function(texts)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Offline, deterministic embeddings by feature hashing of word unigrams and bigrams.
+
+    Every feature is hashed with blake2b to a dimension and a sign, counts are damped with log1p and vectors are
+    L2-normalized, so cosine and L2 distances rank texts by shared vocabulary. No model, no network, the same text
+    always gets the same vector on every machine.
+    """
+
+    name = "hashing"
+
+    def __init__(self, model_name: str = "hashing-v1", dimensions: int = 384):
+        super().__init__(model_name, dimensions)
+        self._features: dict[str, tuple[int, float]] = {}  # feature -> (dimension, sign), hashing dominates otherwise
+
+    def _feature(self, feature: str) -> tuple[int, float]:
+        hashed = self._features.get(feature)
+        if hashed is None:
+            value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            hashed = self._features[feature] = (value % self.dimensions, 1.0 if value >> 63 else -1.0)
+        return hashed
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+            if not features:
+                continue
+            dimensions, signs = zip(*(self._feature(feature) for feature in features))
+            counts = np.bincount(dimensions, weights=signs, minlength=self.dimensions)
+            vectors[row] = np.sign(counts) * np.log1p(np.abs(counts))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors.tolist()
+
+
+EMBEDDING_PROVIDERS: dict[str, type[EmbeddingProvider]] = {
+    OpenAIEmbeddingProvider.name: OpenAIEmbeddingProvider,
+    HashingEmbeddingProvider.name: HashingEmbeddingProvider,
+}
+
+
+def get_embedding_provider(name: str, model_name: str | None = None, **options: Any) -> EmbeddingProvider:
+    """Creates the embedding provider registered under `name`, with its default model unless `model_name` is given"""
+    if name not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Unknown embedding provider {name}, expected one of {sorted(EMBEDDING_PROVIDERS)}")
+    if model_name is not None:
+        options["model_name"] = model_name
+    return EMBEDDING_PROVIDERS[name](**options)
+
+
+def check_store_identity(
+    stored: dict[str, Any] | None, provider: EmbeddingProvider, stored_dimensions: int | None = None
+) -> dict[str, Any] | None:
+    """Compares the identity recorded in a collection's metadata with the provider about to use it.
+
+    Returns the identity to record when the collection has none yet, None when it matches. A collection that holds
+    vectors but no identity is accepted if `stored_dimensions` fits. Raises ValueError on a mismatch.
+    """
+    stored = stored or {}
+    recorded = {key: stored[key] for key in (PROVIDER_KEY, MODEL_KEY, DIMENSIONS_KEY) if key in stored}
+    if not recorded:
+        if stored_dimensions is not None and stored_dimensions != provider.dimensions:
+            raise ValueError(
+                f"The vector store holds {stored_dimensions}-dimensional vectors, {provider.name} embeddings "
+                f"({provider.model_name}) have {provider.dimensions}. Reset the database or choose another collection."
+            )
+        return provider.identity
+    if recorded != provider.identity:
+        raise ValueError(
+            f"The vector store was built with {recorded}, not {provider.identity}. "
+            f"Reset the database or choose another collection."
+        )
+    return None
+
+
+def check_query_dimensions(embeddings: list[list[float]], dimensions: int) -> None:
+    """Refuses query embeddings that cannot be compared with the stored vectors"""
+    for embedding in embeddings:
+        if len(embedding) != dimensions:
+            raise ValueError(f"Query embedding has {len(embedding)} dimensions, the vector store {dimensions}")
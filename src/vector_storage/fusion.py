@@ -0,0 +1,68 @@
+from collections.abc import Sequence
+from typing import Any
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[Sequence[str]],
+    k: int = 60,
+    weights: Sequence[float] | None = None,
+    limit: int | None = None,
+) -> list[tuple[str, float]]:
+    """Merges ranked id lists into one ranking by reciprocal-rank fusion.
+
+    An id scores sum(weight / (k + rank)) over the lists it appears in, rank starting at 1; an id repeated within one
+    list only counts at its best rank. Ties keep the order in which ids were first seen. Returns (id, score) pairs,
+    best first, at most `limit` of them.
+    """
+    if weights is not None and len(weights) != len(ranked_lists):
+        raise ValueError(f"Expected {len(ranked_lists)} weights, got {len(weights)}")
+    scores: dict[str, float] = {}
+    for list_index, ranked_ids in enumerate(ranked_lists):
+        weight = 1.0 if weights is None else weights[list_index]
+        seen = set()
+        for rank, chunk_id in enumerate(ranked_ids, start=1):
+            if chunk_id in seen:
+                continue
+            seen.add(chunk_id)
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + weight / (k + rank)
+    # sorted is stable, so equal scores stay in first-seen order
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return fused if limit is None else fused[:limit]
+
+
+def fuse_query_results(
+    search_results: dict[str, Any],
+    k: int = 60,
+    weights: Sequence[float] | None = None,
+    max_candidates: int | None = None,
+) -> dict[str, dict[str, Any]]:
+    """Fuses the per-query result lists of a multi-query search into unique chunks, best first.
+
+    Returns {chunk_id: {"text", "distance", "score"}}, where distance is the chunk's smallest distance to any of the
+    queries and score its fused score.
+    """
+    documents: dict[str, str] = {}
+    distances: dict[str, float] = {}
+    query_distances = search_results.get("distances") or [None] * len(search_results["ids"])
+    for ids, texts, query_distance in zip(search_results["ids"], search_results["documents"], query_distances):
+        for position, (chunk_id, text) in enumerate(zip(ids, texts)):
+            documents.setdefault(chunk_id, text)
+            if query_distance is not None:
+                distance = float(query_distance[position])
+                distances[chunk_id] = min(distance, distances.get(chunk_id, distance))
+
+    fused = reciprocal_rank_fusion(search_results["ids"], k=k, weights=weights, limit=max_candidates)
+    return {
+        chunk_id: {"text": documents[chunk_id], "distance": distances.get(chunk_id), "score": score}
+        for chunk_id, score in fused
+    }
+
+
+def concat_results(*search_results: dict[str, Any]) -> dict[str, Any]:
+    """Joins the per-query result lists of several searches, lists without distances get None"""
+    joined = {"ids": [], "documents": [], "distances": []}
+    for results in search_results:
+        joined["ids"].extend(results["ids"])
+        joined["documents"].extend(results["documents"])
+        joined["distances"].extend(results.get("distances") or [None] * len(results["ids"]))
+    return joined
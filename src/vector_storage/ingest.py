@@ -0,0 +1,219 @@
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Any
+
+from tenacity import Retrying, stop_after_attempt, wait_exponential
+
+from src.utils.logger import get_logger
+from src.utils.tokenizer import get_tokenizer
+
+logger = get_logger()
+
+# (id, document, metadata) of one chunk to embed and store
+Record = tuple[str, str, dict[str, Any]]
+
+
+def _unique_records(records: Iterable[Record]) -> Iterator[Record]:
+    """Drops records whose id was already seen, a vector store rejects duplicate ids within one upsert"""
+    seen = set()
+    for record in records:
+        if record[0] not in seen:
+            seen.add(record[0])
+            yield record
+
+
+class TokenRateLimiter:
+    """Token bucket shared by the embedding threads, refilled at `tokens_per_minute`.
+
+    The bucket starts full, so a burst up to one minute's budget goes out at once. A batch larger than the whole
+    budget waits for a full bucket and overdraws it.
+    """
+
+    def __init__(
+        self,
+        tokens_per_minute: int | None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.tokens_per_minute = tokens_per_minute
+        self._clock = clock
+        self._sleep = sleep
+        self._available = float(tokens_per_minute or 0)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> float:
+        """Blocks until `tokens` fit in the budget, returns the seconds waited"""
+        if not self.tokens_per_minute:
+            return 0.0
+        needed = min(tokens, self.tokens_per_minute)
+        waited = 0.0
+        # waiting while holding the lock serves the threads in turn instead of letting small batches starve big ones
+        with self._lock:
+            while True:
+                now = self._clock()
+                refill = (now - self._updated) * self.tokens_per_minute / 60
+                self._available = min(float(self.tokens_per_minute), self._available + refill)
+                self._updated = now
+                if self._available >= needed:
+                    self._available -= tokens
+                    return waited
+                delay = (needed - self._available) * 60 / self.tokens_per_minute
+                self._sleep(delay)
+                waited += delay
+
+
+class EmbeddingBatch:
+    """Chunks embedded in one request"""
+
+    def __init__(self, records: list[Record], token_counts: list[int]):
+        self.ids = [record[0] for record in records]
+        self.documents = [record[1] for record in records]
+        self.metadatas = [record[2] for record in records]
+        self.token_counts = token_counts
+        self.tokens = sum(token_counts)
+        self.attempts = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class IngestReport:
+    """What an ingest run embedded and stored"""
+
+    def __init__(self):
+        self.documents = 0
+        self.batches = 0
+        self.tokens = 0
+        self.retries = 0
+        self.failed_ids: list[str] = []
+        self.seconds = 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "documents": self.documents,
+            "batches": self.batches,
+            "tokens": self.tokens,
+            "retries": self.retries,
+            "failed_ids": self.failed_ids,
+            "seconds": round(self.seconds, 3),
+        }
+
+
+class EmbeddingIngestor:
+    """Embeds chunks in token-bounded batches on a thread pool and upserts every batch as soon as it is embedded.
+
+    `embedding_function` follows the Chroma EmbeddingFunction call convention, a list of texts in and one vector per
+    text out. `upsert` receives ids, embeddings, documents and metadatas of a finished batch and is only called from
+    the calling thread. Failed batches are retried on their own with exponential backoff; batches that still fail
+    are reported in IngestReport.failed_ids instead of stopping the run. Texts the embedding function has cached (see
+    CachedEmbeddingFunction) do not count against the rate limit.
+    """
+
+    def __init__(
+        self,
+        embedding_function: Callable[[list[str]], list[list[float]]],
+        upsert: Callable[..., None],
+        max_workers: int = 4,
+        tokens_per_minute: int | None = 1_000_000,
+        max_batch_tokens: int = 50_000,
+        max_batch_size: int = 512,
+        max_retries: int = 3,
+        retry_backoff: float = 1.0,
+        encoding_name: str = "cl100k_base",
+    ):
+        self.embedding_function = embedding_function
+        self.upsert = upsert
+        self.max_workers = max_workers
+        self.rate_limiter = TokenRateLimiter(tokens_per_minute)
+        self.max_batch_tokens = max_batch_tokens  # Token budget of one embedding request
+        self.max_batch_size = max_batch_size  # Texts in one embedding request
+        self.max_retries = max_retries  # Retries of a failed batch, on top of the first attempt
+        self.retry_backoff = retry_backoff  # Seconds before the first retry, doubled for every further retry
+        self.token_service = get_tokenizer(encoding_name)
+
+    def iter_batches(self, records: Iterable[Record]) -> Iterator[EmbeddingBatch]:
+        """Groups records into batches of at most max_batch_size texts and max_batch_tokens tokens, in order"""
+        record_iterator = iter(records)
+        batch, token_counts, batch_tokens = [], [], 0
+        while group := list(islice(record_iterator, self.max_batch_size)):
+            for record, tokens in zip(group, self.token_service.count_batch([record[1] for record in group])):
+                if batch and (len(batch) == self.max_batch_size or batch_tokens + tokens > self.max_batch_tokens):
+                    yield EmbeddingBatch(batch, token_counts)
+                    batch, token_counts, batch_tokens = [], [], 0
+                batch.append(record)
+                token_counts.append(tokens)
+                batch_tokens += tokens
+        if batch:
+            yield EmbeddingBatch(batch, token_counts)
+
+    def ingest(self, records: Iterable[Record], total: int | None = None) -> IngestReport:
+        """Embeds and upserts the records, consuming them lazily; `total` only feeds the progress log"""
+        report = IngestReport()
+        start = time.perf_counter()
+        batches = self.iter_batches(_unique_records(records))
+        pending: dict[Future, EmbeddingBatch] = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="embed") as executor:
+            while True:
+                # keep a bounded number of batches in flight so records are read as they are needed
+                for batch in islice(batches, 2 * self.max_workers - len(pending)):
+                    pending[executor.submit(self._embed, batch)] = batch
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = pending.pop(future)
+                    report.retries += batch.attempts - 1
+                    try:
+                        embeddings = future.result()
+                    except Exception as e:
+                        logger.error(
+                            f"Embedding batch of {len(batch)} chunks failed after {batch.attempts} attempts: {e}"
+                        )
+                        report.failed_ids.extend(batch.ids)
+                        continue
+                    self.upsert(
+                        ids=batch.ids, embeddings=embeddings, documents=batch.documents, metadatas=batch.metadatas
+                    )
+                    report.documents += len(batch)
+                    report.batches += 1
+                    report.tokens += batch.tokens
+                    logger.info(
+                        f"Embedded {report.documents}{f'/{total}' if total else ''} chunks "
+                        f"({report.tokens} tokens, {report.batches} batches)"
+                    )
+
+        report.seconds = time.perf_counter() - start
+        return report
+
+    def _embed(self, batch: EmbeddingBatch) -> list[list[float]]:
+        """Embeds one batch within the token budget, retrying it with exponential backoff"""
+        retrying = Retrying(
+            stop=stop_after_attempt(self.max_retries + 1),
+            wait=wait_exponential(multiplier=self.retry_backoff, max=60),
+            reraise=True,
+            before_sleep=lambda retry_state: logger.warning(
+                f"Embedding batch of {len(batch)} chunks failed ({retry_state.outcome.exception()}), "
+                f"retrying in {retry_state.next_action.sleep:.1f} seconds..."
+            ),
+        )
+        for attempt in retrying:
+            with attempt:
+                batch.attempts += 1
+                self.rate_limiter.acquire(self._billed_tokens(batch))
+                embeddings = self.embedding_function(batch.documents)
+                if len(embeddings) != len(batch):
+                    raise ValueError(f"Expected {len(batch)} embeddings, got {len(embeddings)}")
+                return embeddings
+
+    def _billed_tokens(self, batch: EmbeddingBatch) -> int:
+        """Tokens the request is billed for: texts an embedding function with a `cached` method has cached are free"""
+        cached = getattr(self.embedding_function, "cached", None)
+        if cached is None:
+            return batch.tokens
+        return sum(tokens for tokens, hit in zip(batch.token_counts, cached(batch.documents)) if not hit)
@@ -0,0 +1,455 @@
+import json
+import os
+import tempfile
+import threading
+from collections.abc import Sequence
+from typing import Any
+
+import numpy as np
+
+from src.utils.logger import get_logger
+
+logger = get_logger()
+
+COLLECTION_FILE = "collection.json"
+VECTORS_FILE = "vectors.f32"
+JOURNAL_FILE = "records.jsonl"
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scales rows to unit length in place, zero rows stay zero"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+class NumpyCollection:
+    """In-process vector collection answering queries by brute force, with the part of the Chroma Collection API that
+    VectorDB uses (upsert, update, delete, get, query, count, peek, modify).
+
+    Vectors are normalized float32 rows of a memory-mapped matrix, so a batch of queries is one matrix multiply
+    followed by argpartition; distances are squared L2 distances of the normalized vectors (2 - 2 cosine), which is
+    what Chroma's default "l2" space returns for normalized embeddings. Ids, documents and metadata live in memory and
+    are persisted as a JSON Lines journal of operations, replayed on open and compacted once it holds far more lines
+    than records. Rows are flushed before their journal line is written, and a re-upserted record moves to a fresh row,
+    so a crash before the journal line leaves the previous vector in place. Compaction writes a new generation of
+    vectors file and journal and switches to it by atomically replacing collection.json, which names the files in use,
+    so a crash leaves either generation intact.
+    """
+
+    def __init__(self, directory: str, name: str = "local-collection", metadata: dict[str, Any] | None = None):
+        self.directory = directory
+        self.name = name
+        self.metadata: dict[str, Any] = dict(metadata or {})  # Only used when the collection is created
+        self.dimensions: int | None = None
+
+        self._ids: list[str | None] = []  # row -> id, None for free rows
+        self._documents: list[str | None] = []
+        self._metadatas: list[dict[str, Any] | None] = []
+        self._rows: dict[str, int] = {}  # id -> row
+        self._free: list[int] = []
+        self._valid = np.zeros(0, dtype=bool)
+        self._vectors: np.memmap | None = None
+        self._columns: dict[str, np.ndarray] = {}  # metadata key -> value per row, dropped on every change
+        self._journal_lines = 0
+        self._generation = 0  # Bumped by every compaction, generation 0 uses the unversioned file names
+        self._vectors_file = VECTORS_FILE
+        self._journal_file = JOURNAL_FILE
+        self._lock = threading.RLock()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def count(self) -> int:
+        return len(self._rows)
+
+    def modify(self, name: str | None = None, metadata: dict[str, Any] | None = None) -> None:
+        with self._lock:
+            if name is not None:
+                self.name = name
+            if metadata is not None:
+                self.metadata = dict(metadata)
+            self._save_collection_file()
+
+    def upsert(
+        self,
+        ids: list[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: list[str] | None = None,
+        metadatas: list[dict[str, Any]] | None = None,
+    ) -> None:
+        vectors = normalize(np.array(embeddings, dtype=np.float32, ndmin=2))
+        documents = documents if documents is not None else [None] * len(ids)
+        metadatas = metadatas if metadatas is not None else [None] * len(ids)
+        if not len(ids) == len(vectors) == len(documents) == len(metadatas):
+            raise ValueError("ids, embeddings, documents and metadatas must have the same length")
+        with self._lock:
+            if self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+                self._save_collection_file()
+            elif vectors.shape[1] != self.dimensions:
+                raise ValueError(f"Expected embeddings of {self.dimensions} dimensions, got {vectors.shape[1]}")
+
+            operations, replaced = [], []
+            for chunk_id, vector, document, metadata in zip(ids, vectors, documents, metadatas):
+                # an existing record gets a fresh row, so its journaled row keeps the vector it was journaled with
+                previous_row = self._rows.get(chunk_id)
+                row = self._allocate_row()
+                self._vectors[row] = vector
+                self._set_row(row, chunk_id, document, metadata)
+                if previous_row is not None:
+                    self._ids[previous_row] = self._documents[previous_row] = self._metadatas[previous_row] = None
+                    self._valid[previous_row] = False
+                    replaced.append(previous_row)
+                operations.append(
+                    {"op": "upsert", "id": chunk_id, "row": row, "document": document, "metadata": metadata}
+                )
+            self._vectors.flush()
+            # replaced rows are reused only after the journal names the new rows
+            self._free.extend(replaced)
+            self._append_journal(operations)
+
+    def update(
+        self,
+        ids: list[str],
+        embeddings: Sequence[Sequence[float]] | None = None,
+        documents: list[str] | None = None,
+        metadatas: list[dict[str, Any]] | None = None,
+    ) -> None:
+        with self._lock:
+            missing = [chunk_id for chunk_id in ids if chunk_id not in self._rows]
+            if missing:
+                logger.warning(f"Ignoring update of {len(missing)} ids not in the collection")
+            existing = [position for position, chunk_id in enumerate(ids) if chunk_id in self._rows]
+            if embeddings is not None:
+                # a new vector means a full upsert of the record
+                self.upsert(
+                    [ids[i] for i in existing],
+                    [embeddings[i] for i in existing],
+                    [documents[i] if documents else self._documents[self._rows[ids[i]]] for i in existing],
+                    [metadatas[i] if metadatas else self._metadatas[self._rows[ids[i]]] for i in existing],
+                )
+                return
+            operations = []
+            for i in existing:
+                row = self._rows[ids[i]]
+                document = documents[i] if documents is not None else self._documents[row]
+                metadata = metadatas[i] if metadatas is not None else self._metadatas[row]
+                self._set_row(row, ids[i], document, metadata)
+                operations.append({"op": "update", "id": ids[i], "document": document, "metadata": metadata})
+            self._append_journal(operations)
+
+    def delete(self, ids: list[str] | None = None, where: dict[str, Any] | None = None) -> None:
+        with self._lock:
+            rows = self._select_rows(ids, where)
+            for row in rows:
+                chunk_id = self._ids[row]
+                del self._rows[chunk_id]
+                self._ids[row] = self._documents[row] = self._metadatas[row] = None
+                self._valid[row] = False
+                self._free.append(row)
+            self._columns = {}
+            self._append_journal([{"op": "delete", "row": row} for row in rows])
+
+    def get(
+        self,
+        ids: list[str] | None = None,
+        where: dict[str, Any] | None = None,
+        limit: int | None = None,
+        offset: int | None = None,
+        include: Sequence[str] = ("documents", "metadatas"),
+    ) -> dict[str, Any]:
+        with self._lock:
+            rows = self._select_rows(ids, where)
+            rows = rows[offset or 0 :]
+            if limit is not None:
+                rows = rows[:limit]
+            return self._records(rows, include)
+
+    def peek(self, limit: int = 10) -> dict[str, Any]:
+        return self.get(limit=limit, include=("documents", "metadatas", "embeddings"))
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        where: dict[str, Any] | None = None,
+        include: Sequence[str] = ("documents", "metadatas", "distances"),
+    ) -> dict[str, Any]:
+        """Top n_results rows per query embedding by cosine similarity, in one matrix multiply for all queries"""
+        queries = normalize(np.array(query_embeddings, dtype=np.float32, ndmin=2))
+        with self._lock:
+            if self.dimensions is not None and queries.shape[1] != self.dimensions:
+                raise ValueError(f"Expected query embeddings of {self.dimensions} dimensions, got {queries.shape[1]}")
+            size = len(self._ids)
+            mask = self._valid[:size] if where is None else self._valid[:size] & self._where_mask(where)
+            k = min(n_results, int(mask.sum()))
+            if k:
+                scores = queries @ self._vectors[:size].T
+                scores[:, ~mask] = -np.inf
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                top_scores = np.take_along_axis(scores, top, axis=1)
+                order = np.argsort(-top_scores, axis=1, kind="stable")
+                top, top_scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+            else:
+                top, top_scores = np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0))
+
+            results = {key: [] for key in ("ids", "documents", "metadatas", "distances", "embeddings")}
+            for rows, row_scores in zip(top, top_scores):
+                records = self._records(rows.tolist(), include)
+                for key in ("ids", "documents", "metadatas", "embeddings"):
+                    results[key].append(records[key])
+                results["distances"].append((2 - 2 * row_scores).clip(min=0).tolist())
+            return {key: value if key == "ids" or key in include else None for key, value in results.items()}
+
+    def _records(self, rows: list[int], include: Sequence[str]) -> dict[str, Any]:
+        return {
+            "ids": [self._ids[row] for row in rows],
+            "documents": [self._documents[row] for row in rows] if "documents" in include else None,
+            "metadatas": [self._metadatas[row] for row in rows] if "metadatas" in include else None,
+            "embeddings": self._embeddings(rows) if "embeddings" in include else None,
+        }
+
+    def _embeddings(self, rows: list[int]) -> np.ndarray:
+        if not rows:
+            return np.zeros((0, self.dimensions or 0), dtype=np.float32)
+        return np.array(self._vectors[rows])
+
+    def _select_rows(self, ids: list[str] | None, where: dict[str, Any] | None) -> list[int]:
+        if ids is not None:
+            rows = [self._rows[chunk_id] for chunk_id in dict.fromkeys(ids) if chunk_id in self._rows]
+            if where is not None:
+                matches = self._where_mask(where)
+                rows = [row for row in rows if matches[row]]
+            return rows
+        mask = self._valid[: len(self._ids)]
+        if where is not None:
+            mask = mask & self._where_mask(where)
+        return np.flatnonzero(mask).tolist()
+
+    def _where_mask(self, where: dict[str, Any]) -> np.ndarray:
+        """Rows whose metadata match a Chroma `where` filter: equality, $eq, $ne, $in, $nin, $and and $or"""
+        size = len(self._ids)
+        mask = np.ones(size, dtype=bool)
+        for key, condition in where.items():
+            if key in ("$and", "$or"):
+                masks = [self._where_mask(clause) for clause in condition]
+                if masks:
+                    mask &= np.logical_and.reduce(masks) if key == "$and" else np.logical_or.reduce(masks)
+                continue
+            column = self._column(key)
+            operator, value = next(iter(condition.items())) if isinstance(condition, dict) else ("$eq", condition)
+            if operator == "$eq":
+                mask &= column == value
+            elif operator == "$ne":
+                mask &= column != value
+            elif operator in ("$in", "$nin"):
+                values = set(value)
+                matches = np.fromiter((item in values for item in column), dtype=bool, count=size)
+                mask &= matches if operator == "$in" else ~matches
+            else:
+                raise ValueError(f"Unsupported where operator {operator}")
+        return mask
+
+    def _column(self, key: str) -> np.ndarray:
+        column = self._columns.get(key)
+        if column is None:
+            column = np.empty(len(self._ids), dtype=object)
+            column[:] = [metadata.get(key) if metadata else None for metadata in self._metadatas]
+            self._columns[key] = column
+        return column
+
+    def _set_row(self, row: int, chunk_id: str, document: str | None, metadata: dict[str, Any] | None) -> None:
+        self._ids[row] = chunk_id
+        self._documents[row] = document
+        self._metadatas[row] = metadata
+        self._rows[chunk_id] = row
+        self._valid[row] = True
+        self._columns = {}
+
+    def _allocate_row(self) -> int:
+        if self._free:
+            return self._free.pop()
+        row = len(self._ids)
+        capacity = len(self._valid)
+        if row >= capacity:
+            self._grow(max(1024, 2 * capacity))
+        self._ids.append(None)
+        self._documents.append(None)
+        self._metadatas.append(None)
+        return row
+
+    def _grow(self, capacity: int) -> None:
+        """Extends the vectors file to `capacity` rows and remaps it"""
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._path(self._vectors_file), "ab") as f:
+            f.truncate(capacity * self.dimensions * np.dtype(np.float32).itemsize)
+        self._vectors = np.memmap(
+            self._path(self._vectors_file), dtype=np.float32, mode="r+", shape=(capacity, self.dimensions)
+        )
+        valid = np.zeros(capacity, dtype=bool)
+        valid[: len(self._valid)] = self._valid
+        self._valid = valid
+
+    def _append_journal(self, operations: list[dict[str, Any]]) -> None:
+        if not operations:
+            return
+        with open(self._path(self._journal_file), "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(operation, ensure_ascii=False) + "\n" for operation in operations)
+        self._journal_lines += len(operations)
+        if self._journal_lines > 2 * len(self._rows) + 1024:
+            self._compact()
+
+    def _save_collection_file(self) -> None:
+        stored = {
+            "name": self.name,
+            "metadata": self.metadata,
+            "dimensions": self.dimensions,
+            "generation": self._generation,
+            "vectors_file": self._vectors_file,
+            "journal_file": self._journal_file,
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(stored, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path(COLLECTION_FILE))
+
+    def _load(self) -> None:
+        if not os.path.exists(self._path(COLLECTION_FILE)):
+            self._save_collection_file()
+            return
+        with open(self._path(COLLECTION_FILE), encoding="utf-8") as f:
+            stored = json.load(f)
+        self.name, self.metadata, self.dimensions = stored["name"], stored["metadata"], stored["dimensions"]
+        self._generation = stored.get("generation", 0)
+        self._vectors_file = stored.get("vectors_file", VECTORS_FILE)
+        self._journal_file = stored.get("journal_file", JOURNAL_FILE)
+        # files of other generations are left over from a compaction that crashed before or after switching
+        in_use = {COLLECTION_FILE, self._vectors_file, self._journal_file}
+        for filename in os.listdir(self.directory):
+            if filename not in in_use and (filename.startswith(("vectors.", "records.")) or filename.endswith(".tmp")):
+                os.remove(self._path(filename))
+        if self.dimensions is None:
+            return
+
+        row_bytes = self.dimensions * np.dtype(np.float32).itemsize
+        vectors_path = self._path(self._vectors_file)
+        capacity = os.path.getsize(vectors_path) // row_bytes if os.path.exists(vectors_path) else 0
+        self._valid = np.zeros(capacity, dtype=bool)
+        if os.path.exists(self._path(self._journal_file)):
+            with open(self._path(self._journal_file), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        operation = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut short by an interrupted write
+                    self._journal_lines += 1
+                    self._replay(operation, capacity)
+        self._free = [row for row in reversed(range(len(self._ids))) if self._ids[row] is None]
+        if capacity:
+            self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimensions))
+        if self._journal_lines > 2 * len(self._rows) + 1024:
+            self._compact()
+        logger.info(f"Loaded {len(self._rows)} vectors of collection {self.name} from {self.directory}")
+
+    def _replay(self, operation: dict[str, Any], capacity: int) -> None:
+        if operation["op"] == "delete":
+            row = operation["row"]
+            if row < len(self._ids) and self._ids[row] is not None:
+                del self._rows[self._ids[row]]
+                self._ids[row] = self._documents[row] = self._metadatas[row] = None
+                self._valid[row] = False
+            return
+        if operation["op"] == "update":
+            if operation["id"] in self._rows:
+                row = self._rows[operation["id"]]
+                self._documents[row], self._metadatas[row] = operation["document"], operation["metadata"]
+            return
+        row = operation["row"]
+        if row >= capacity:
+            return  # the vector never reached the file
+        while len(self._ids) <= row:
+            self._ids.append(None)
+            self._documents.append(None)
+            self._metadatas.append(None)
+        previous_row = self._rows.get(operation["id"])
+        if previous_row is not None and previous_row != row:
+            self._ids[previous_row] = self._documents[previous_row] = self._metadatas[previous_row] = None
+            self._valid[previous_row] = False
+        if self._ids[row] is not None and self._ids[row] != operation["id"]:
+            del self._rows[self._ids[row]]
+        self._ids[row], self._documents[row], self._metadatas[row] = (
+            operation["id"],
+            operation["document"],
+            operation["metadata"],
+        )
+        self._rows[operation["id"]] = row
+        self._valid[row] = True
+
+    def _compact(self) -> None:
+        """Rewrites vectors and journal with the live records in dense rows, as the next generation of files"""
+        rows = np.flatnonzero(self._valid[: len(self._ids)]).tolist()
+        capacity = max(1024, len(rows))
+        vectors_file, journal_file = f"vectors.{self._generation + 1}.f32", f"records.{self._generation + 1}.jsonl"
+        vectors = np.memmap(self._path(vectors_file), dtype=np.float32, mode="w+", shape=(capacity, self.dimensions))
+        if rows:
+            vectors[: len(rows)] = self._vectors[rows]
+        vectors.flush()
+        del vectors
+
+        with open(self._path(journal_file), "w", encoding="utf-8") as f:
+            for new_row, row in enumerate(rows):
+                operation = {
+                    "op": "upsert",
+                    "id": self._ids[row],
+                    "row": new_row,
+                    "document": self._documents[row],
+                    "metadata": self._metadatas[row],
+                }
+                f.write(json.dumps(operation, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        # replacing collection.json switches both files at once, then the previous generation is removed
+        self._vectors = None
+        previous = (self._vectors_file, self._journal_file)
+        self._generation += 1
+        self._vectors_file, self._journal_file = vectors_file, journal_file
+        self._save_collection_file()
+        for filename in previous:
+            if os.path.exists(self._path(filename)):
+                os.remove(self._path(filename))
+        self._ids = [self._ids[row] for row in rows]
+        self._documents = [self._documents[row] for row in rows]
+        self._metadatas = [self._metadatas[row] for row in rows]
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+        self._free = []
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._valid[: len(rows)] = True
+        self._columns = {}
+        self._journal_lines = len(rows)
+        self._vectors = np.memmap(
+            self._path(self._vectors_file), dtype=np.float32, mode="r+", shape=(capacity, self.dimensions)
+        )
+
+    def clear(self, metadata: dict[str, Any] | None = None) -> None:
+        """Deletes all records and starts over with new collection metadata"""
+        with self._lock:
+            self._vectors = None
+            for filename in (self._vectors_file, self._journal_file):
+                if os.path.exists(self._path(filename)):
+                    os.remove(self._path(filename))
+            self.metadata = dict(metadata or {})
+            self.dimensions = None
+            self._ids, self._documents, self._metadatas, self._rows, self._free = [], [], [], {}, []
+            self._valid = np.zeros(0, dtype=bool)
+            self._columns = {}
+            self._journal_lines = 0
+            self._save_collection_file()
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+
+class QueryEmbeddingCache:
+    """In-process LRU cache of query embeddings whose entries expire `ttl_seconds` after they were embedded.
+
+    Queries are keyed by their exact text. Only the queries missing from the cache are sent to `embedding_function`,
+    in one call, so a repeated question skips the embedding round-trip entirely.
+    """
+
+    def __init__(
+        self,
+        embedding_function: Callable[[list[str]], list[list[float]]],
+        max_size: int = 1024,
+        ttl_seconds: float | None = 3600,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.embedding_function = embedding_function
+        self.max_size = max_size  # Queries kept before the least recently used are evicted
+        self.ttl_seconds = ttl_seconds  # Age after which an embedding is fetched again, None to keep it until evicted
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()  # query -> (embedded at, vector)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def embed(self, queries: list[str]) -> list[list[float]]:
+        """Returns one embedding per query, embedding only the queries that are not cached"""
+        embeddings = self._lookup(queries)
+        missing = list(dict.fromkeys(query for query in queries if query not in embeddings))
+        if missing:
+            embedded = self.embedding_function(missing)
+            if len(embedded) != len(missing):
+                raise ValueError(f"Expected {len(missing)} embeddings, got {len(embedded)}")
+            embeddings.update(zip(missing, embedded))
+            self._store(dict(zip(missing, embedded)))
+        return [embeddings[query] for query in queries]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+    def _lookup(self, queries: list[str]) -> dict[str, list[float]]:
+        now = self._clock()
+        found = {}
+        with self._lock:
+            for query in dict.fromkeys(queries):
+                entry = self._entries.get(query)
+                if entry is not None and self.ttl_seconds is not None and now - entry[0] > self.ttl_seconds:
+                    del self._entries[query]
+                    self.expired += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(query)
+                found[query] = entry[1]
+                self.hits += 1
+        return found
+
+    def _store(self, embeddings: dict[str, list[float]]) -> None:
+        now = self._clock()
+        with self._lock:
+            for query, embedding in embeddings.items():
+                self._entries[query] = (now, embedding)
+                self._entries.move_to_end(query)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
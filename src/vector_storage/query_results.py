@@ -0,0 +1,36 @@
+from collections.abc import Sequence
+from typing import Any
+
+import numpy as np
+
+# Fields a query can return besides the ids, which are always returned
+QUERY_FIELDS = ("documents", "metadatas", "distances", "embeddings")
+
+# Named projections: "ids" returns ids only, "metadatas" ids and metadata only
+QUERY_PROJECTIONS = {
+    "ids": (),
+    "metadatas": ("metadatas",),
+    "documents": ("documents", "distances"),
+    "full": QUERY_FIELDS,
+}
+
+
+def resolve_include(include: str | Sequence[str]) -> list[str]:
+    """Turns a named projection or a sequence of field names into the `include` list of a query"""
+    if isinstance(include, str):
+        if include not in QUERY_PROJECTIONS:
+            raise ValueError(f"Unknown query projection {include!r}, expected one of {sorted(QUERY_PROJECTIONS)}")
+        return list(QUERY_PROJECTIONS[include])
+    unknown = [field for field in include if field not in QUERY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown query fields {unknown}, expected some of {list(QUERY_FIELDS)}")
+    return list(dict.fromkeys(include))
+
+
+def as_arrays(results: dict[str, Any]) -> dict[str, Any]:
+    """Replaces the per-query distance lists with float arrays and the per-query embeddings with 2-D float32 arrays"""
+    if results.get("distances") is not None:
+        results["distances"] = [np.asarray(distances, dtype=np.float64) for distances in results["distances"]]
+    if results.get("embeddings") is not None:
+        results["embeddings"] = [np.asarray(embeddings, dtype=np.float32) for embeddings in results["embeddings"]]
+    return results
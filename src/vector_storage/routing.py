@@ -0,0 +1,109 @@
+import math
+import os
+import re
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+from src.vector_storage.bm25 import tokenize
+from src.vector_storage.sync import SOURCE_FILE_KEY
+
+# Metadata key written by prepare_documents next to source_file: the doc set (crawled site) a chunk file belongs to
+DOC_SET_KEY = "doc_set"
+
+# crawl timestamp (_YYYYMMDD_HHMMSS), the chunker's -chunked suffix and the file extension
+_CHUNK_FILE_SUFFIX = re.compile(r"(_\d{8}_\d{6})?(-chunked)?(\.\w+)?$")
+
+
+def doc_set_name(file_name: str) -> str:
+    """Name of the doc set of a chunk file, the file name without crawl timestamp and suffixes, so that recrawls of
+    the same site share one doc set"""
+    base_name = os.path.basename(file_name)
+    return _CHUNK_FILE_SUFFIX.sub("", base_name) or base_name
+
+
+def source_filter(doc_sets: Sequence[str]) -> dict[str, Any] | None:
+    """`where` filter restricting a search to the given doc sets, None (search everything) for none"""
+    if not doc_sets:
+        return None
+    if len(doc_sets) == 1:
+        return {DOC_SET_KEY: doc_sets[0]}
+    return {DOC_SET_KEY: {"$in": list(doc_sets)}}
+
+
+def filter_sources(where: dict[str, Any] | None, sources: Iterable[str]) -> set[str] | None:
+    """The chunk files among `sources` that a `where` filter can match, None when it does not restrict chunk files.
+
+    Understands equality and $in on source_file and doc_set, and $and of those; anything else is left to the
+    vector store.
+    """
+    if not where:
+        return None
+    sources = set(sources)
+    matching = None
+    for key, value in where.items():
+        if key == "$and":
+            restrictions = [filter_sources(condition, sources) for condition in value]
+            restrictions = [restriction for restriction in restrictions if restriction is not None]
+            if not restrictions:
+                continue
+            restricted = set.intersection(*restrictions)
+        elif key in (SOURCE_FILE_KEY, DOC_SET_KEY):
+            if isinstance(value, dict):
+                if set(value) == {"$eq"}:
+                    values = {value["$eq"]}
+                elif set(value) == {"$in"}:
+                    values = set(value["$in"])
+                else:
+                    continue
+            else:
+                values = {value}
+            restricted = {
+                source for source in sources if (source if key == SOURCE_FILE_KEY else doc_set_name(source)) in values
+            }
+        else:
+            continue
+        matching = restricted if matching is None else matching & restricted
+    return matching
+
+
+class SourceRouter:
+    """Picks the doc sets a query is about by matching it against the keywords of the document summaries.
+
+    A keyword matches when all of its words occur in the query and weighs log(1 + doc sets / doc sets having it), so
+    keywords shared by every doc set, like "API", do not route. Doc sets scoring at least `min_share` of the best score
+    are searched, at most `max_sources` of them.
+    """
+
+    def __init__(self, max_sources: int = 3, min_share: float = 0.5):
+        self.max_sources = max_sources
+        self.min_share = min_share  # Fraction of the best doc set's score another doc set needs to be searched too
+
+    def route(self, query: str, summaries: dict[str, dict[str, Any]]) -> list[str]:
+        """Doc sets to search for `query`, best first; empty when no keyword matches or every doc set would be searched.
+
+        summaries: SummaryManager.summaries, {chunk file name: {"summary", "keywords", ...}}
+        """
+        keywords: dict[tuple[str, ...], set[str]] = {}  # keyword words -> doc sets having the keyword
+        for file_name, summary in summaries.items():
+            for keyword in summary.get("keywords") or []:
+                words = tuple(dict.fromkeys(tokenize(keyword)))
+                if words:
+                    keywords.setdefault(words, set()).add(doc_set_name(file_name))
+        doc_sets = {doc_set_name(file_name) for file_name in summaries}
+        if len(doc_sets) < 2:
+            return []
+
+        query_words = set(tokenize(query))
+        scores: dict[str, float] = {}
+        for words, keyword_doc_sets in keywords.items():
+            if query_words.issuperset(words):
+                weight = math.log(1 + len(doc_sets) / len(keyword_doc_sets))
+                for doc_set in keyword_doc_sets:
+                    scores[doc_set] = scores.get(doc_set, 0.0) + weight
+        if not scores:
+            return []
+
+        best = max(scores.values())
+        ranked = sorted(scores, key=lambda doc_set: (-scores[doc_set], doc_set))
+        routed = [doc_set for doc_set in ranked if scores[doc_set] >= self.min_share * best][: self.max_sources]
+        return [] if len(routed) == len(doc_sets) else routed
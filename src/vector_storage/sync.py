@@ -0,0 +1,185 @@
+import hashlib
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+from src.utils.logger import get_logger
+from src.vector_storage.ingest import EmbeddingIngestor, Record
+
+logger = get_logger()
+
+# Metadata keys written by prepare_documents: the chunk file a chunk came from and a hash of its document text
+SOURCE_FILE_KEY = "source_file"
+CONTENT_HASH_KEY = "content_hash"
+SOURCE_URL_KEY = "source_url"
+
+
+def content_hash(document: str) -> str:
+    """Hash of a document's text, stored with the chunk so unchanged chunks are recognized without comparing text"""
+    return hashlib.blake2b(document.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class SyncPlan:
+    """The changes that bring a collection's chunks of one chunk file in line with the file"""
+
+    def __init__(self):
+        self.to_embed: list[Record] = []  # new chunks and chunks whose text changed
+        self.to_update: list[Record] = []  # same text, only the metadata changed, no embedding needed
+        self.to_delete: list[str] = []  # chunks of the file that are no longer in it
+        self.held_back: list[str] = []  # deletions refused because they would remove most of the file's chunks
+        self.superseded: list[str] = []  # chunks stored without source_file for the file's pages, under other ids
+        self.unchanged = 0
+
+    def to_dict(self) -> dict[str, int]:
+        return {
+            "embed": len(self.to_embed),
+            "update": len(self.to_update),
+            "delete": len(self.to_delete),
+            "superseded": len(self.superseded),
+            "unchanged": self.unchanged,
+        }
+
+
+def plan_sync(
+    records: Iterable[Record],
+    existing: dict[str, dict[str, Any]],
+    existing_documents: dict[str, str] | None = None,
+    max_delete_share: float | None = None,
+) -> SyncPlan:
+    """Diffs the records of a chunk file against the chunks already stored for it.
+
+    `existing` maps stored chunk ids to their metadata: the chunks stored for the file and any stored chunks sharing
+    an id with the file's chunks. Chunks stored before content hashes were recorded are compared by their text in
+    `existing_documents` instead.
+    Every lookup is a dict or set lookup, so planning is linear in the number of chunks.
+    Deletions of more than `max_delete_share` of the stored chunks, as an empty or truncated file would cause, are
+    moved to `held_back` instead of `to_delete`; None allows any deletion.
+    """
+    existing_documents = existing_documents or {}
+    plan = SyncPlan()
+    seen = set()
+    for record in records:
+        chunk_id, document, metadata = record
+        if chunk_id in seen:
+            continue
+        seen.add(chunk_id)
+
+        stored = existing.get(chunk_id)
+        if stored is None:
+            plan.to_embed.append(record)
+            continue
+        stored_hash = stored.get(CONTENT_HASH_KEY)
+        if stored_hash is None and chunk_id in existing_documents:
+            stored_hash = content_hash(existing_documents[chunk_id])
+
+        if stored_hash != metadata[CONTENT_HASH_KEY]:
+            plan.to_embed.append(record)
+        elif stored != metadata:
+            plan.to_update.append(record)
+        else:
+            plan.unchanged += 1
+
+    plan.to_delete = [chunk_id for chunk_id in existing if chunk_id not in seen]
+    if max_delete_share is not None and len(plan.to_delete) > max_delete_share * len(existing):
+        plan.held_back, plan.to_delete = plan.to_delete, []
+    return plan
+
+
+def get_metadatas(
+    collection,
+    ids: list[str] | None = None,
+    where: dict[str, Any] | None = None,
+    include_documents: bool = False,
+    page_size: int = 5000,
+) -> dict[str, Any]:
+    """Fetches stored chunks page by page, as {id: metadata} or {id: (metadata, document)}"""
+    include = ["metadatas", "documents"] if include_documents else ["metadatas"]
+    stored = {}
+    if ids is not None:
+        pages = (
+            collection.get(ids=ids[start : start + page_size], include=include)
+            for start in range(0, len(ids), page_size)
+        )
+    else:
+        pages = _iter_where_pages(collection, where, include, page_size)
+    for page in pages:
+        documents = page["documents"] if include_documents else [None] * len(page["ids"])
+        for chunk_id, metadata, document in zip(page["ids"], page["metadatas"], documents):
+            stored[chunk_id] = (metadata, document) if include_documents else metadata
+    return stored
+
+
+def _iter_where_pages(
+    collection, where: dict[str, Any], include: list[str], page_size: int
+) -> Iterator[dict[str, Any]]:
+    offset = 0
+    while True:
+        page = collection.get(where=where, include=include, limit=page_size, offset=offset)
+        if not page["ids"]:
+            return
+        yield page
+        offset += len(page["ids"])
+
+
+def find_superseded(collection, records: list[Record], page_size: int = 500) -> list[str]:
+    """Ids of chunks stored before source_file was recorded for the pages of `records`, under ids not among them.
+
+    Chunks of old chunker versions have random ids that re-chunking never reproduces, so they are only found by
+    their page's source_url. A page with chunks in the file was re-chunked, not dropped, so these can all go.
+    """
+    ids = {chunk_id for chunk_id, _, _ in records}
+    urls = list(dict.fromkeys(metadata[SOURCE_URL_KEY] for _, _, metadata in records if SOURCE_URL_KEY in metadata))
+    superseded = []
+    for start in range(0, len(urls), page_size):
+        stored = get_metadatas(collection, where={SOURCE_URL_KEY: {"$in": urls[start : start + page_size]}})
+        superseded.extend(
+            chunk_id
+            for chunk_id, metadata in stored.items()
+            if chunk_id not in ids and SOURCE_FILE_KEY not in (metadata or {})
+        )
+    return superseded
+
+
+def sync_collection(
+    collection,
+    ingestor: EmbeddingIngestor,
+    records: list[Record],
+    file_name: str,
+    max_delete_share: float | None = None,
+) -> SyncPlan:
+    """Plans and applies the sync of a chunk file's records to a Chroma (or Chroma-compatible) collection.
+
+    The ingestor embeds new and changed chunks and upserts them into the collection. Chunks stored by old chunker
+    versions for the file's pages are deleted too (see find_superseded), regardless of `max_delete_share`.
+    """
+    existing = get_metadatas(collection, where={SOURCE_FILE_KEY: file_name})
+    # chunks stored before source_file was recorded are only found by id
+    legacy_ids = [chunk_id for chunk_id, _, _ in records if chunk_id not in existing]
+    legacy = get_metadatas(collection, ids=legacy_ids, include_documents=True) if legacy_ids else {}
+    existing.update({chunk_id: metadata for chunk_id, (metadata, _) in legacy.items()})
+    existing_documents = {chunk_id: document for chunk_id, (_, document) in legacy.items()}
+
+    plan = plan_sync(records, existing, existing_documents, max_delete_share)
+    plan.superseded = find_superseded(collection, records)
+    logger.info(f"Sync plan for {file_name}: {plan.to_dict()}")
+    if plan.held_back:
+        logger.error(
+            f"Not deleting {len(plan.held_back)} of the {len(existing)} stored chunks of {file_name}, the file looks "
+            f"empty or truncated. Sync it with max_delete_share=None to delete them."
+        )
+
+    if plan.superseded:
+        logger.info(f"Deleting {len(plan.superseded)} chunks of {file_name} stored by an older chunker version")
+    if plan.to_delete or plan.superseded:
+        collection.delete(ids=plan.to_delete + plan.superseded)
+    if plan.to_update:
+        collection.update(
+            ids=[record[0] for record in plan.to_update], metadatas=[record[2] for record in plan.to_update]
+        )
+    if plan.to_embed:
+        report = ingestor.ingest(plan.to_embed, total=len(plan.to_embed))
+        if report.failed_ids:
+            logger.error(
+                f"{len(report.failed_ids)} documents from {file_name} could not be embedded, "
+                f"they are retried on the next sync."
+            )
+    return plan
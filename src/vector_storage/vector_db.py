@@ -1,21 +1,56 @@
 from __future__ import annotations
 
+import atexit
 import json
 import os
 import time
 from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator, Sequence
 from typing import Any
 
 import chromadb
-import chromadb.utils.embedding_functions as embedding_functions
 import cohere
+import numpy as np
 import weave
 from cohere import RerankResponse
 
 from src.generation.summary_manager import SummaryManager
-from src.utils.config import CHROMA_DB_DIR, COHERE_API_KEY, OPENAI_API_KEY, PROCESSED_DATA_DIR
+from src.utils.chunk_io import iter_chunk_file
+from src.utils.config import (
+    BM25_INDEX_DIR,
+    CHROMA_DB_DIR,
+    COHERE_API_KEY,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_MAX_BYTES,
+    EMBEDDING_MAX_WORKERS,
+    EMBEDDING_PROVIDER,
+    EMBEDDING_TOKENS_PER_MINUTE,
+    MAX_RERANK_CANDIDATES,
+    NUMPY_INDEX_DIR,
+    OPENAI_API_KEY,
+    PROCESSED_DATA_DIR,
+    QUERY_CACHE_SIZE,
+    QUERY_CACHE_TTL_SECONDS,
+    RRF_K,
+    SYNC_MAX_DELETE_SHARE,
+)
 from src.utils.decorators import base_error_handler
 from src.utils.logger import configure_logging, get_logger
+from src.vector_storage.bm25 import BM25Index
+from src.vector_storage.embedding_cache import CachedEmbeddingFunction
+from src.vector_storage.embedding_provider import (
+    DIMENSIONS_KEY,
+    check_query_dimensions,
+    check_store_identity,
+    get_embedding_provider,
+)
+from src.vector_storage.fusion import concat_results, fuse_query_results
+from src.vector_storage.ingest import EmbeddingIngestor
+from src.vector_storage.numpy_index import NumpyCollection
+from src.vector_storage.query_cache import QueryEmbeddingCache
+from src.vector_storage.query_results import as_arrays, resolve_include
+from src.vector_storage.routing import DOC_SET_KEY, SourceRouter, doc_set_name, filter_sources, source_filter
+from src.vector_storage.sync import CONTENT_HASH_KEY, SOURCE_FILE_KEY, SyncPlan, content_hash, sync_collection
 
 logger = get_logger()
 
@@ -25,11 +60,14 @@ class DocumentProcessor:
         self.processed_dir = PROCESSED_DATA_DIR
 
     def load_json(self, filename: str) -> list[dict]:
+        """Loads all chunks of a chunk file (.json, .jsonl or .msgpack)"""
+        return list(self.iter_chunks(filename))
+
+    def iter_chunks(self, filename: str) -> Iterator[dict]:
+        """Yields the chunks of a chunk file lazily, one at a time"""
         try:
             filepath = os.path.join(self.processed_dir, filename)
-            with open(filepath) as f:
-                data = json.load(f)
-            return data
+            yield from iter_chunk_file(filepath)
         except FileNotFoundError:
             logger.error(f"File not found: {filename}")
             raise
@@ -40,7 +78,7 @@ class DocumentProcessor:
 
 class VectorDBInterface(ABC):
     @abstractmethod
-    def prepare_documents(self, chunks: list[dict[str, Any]]) -> dict[str, list[str]]:
+    def prepare_documents(self, chunks: Iterable[dict[str, Any]], file_name: str | None = None) -> dict[str, list[str]]:
         pass
 
     @abstractmethod
@@ -48,7 +86,25 @@ class VectorDBInterface(ABC):
         pass
 
     @abstractmethod
-    def query(self, user_query: str | list[str], n_results: int = 10) -> dict[str, Any]:
+    def sync_documents(
+        self, json_data: Iterable[dict], file_name: str, max_delete_share: float | None = SYNC_MAX_DELETE_SHARE
+    ) -> SyncPlan:
+        pass
+
+    @abstractmethod
+    def query(
+        self,
+        user_query: str | list[str],
+        n_results: int = 10,
+        include: str | Sequence[str] = "documents",
+        where: dict[str, Any] | None = None,
+    ) -> dict[str, Any]:
+        pass
+
+    @abstractmethod
+    def lexical_query(
+        self, user_query: str | list[str], n_results: int = 10, where: dict[str, Any] | None = None
+    ) -> dict[str, Any]:
         pass
 
     @abstractmethod
@@ -56,7 +112,13 @@ class VectorDBInterface(ABC):
         pass
 
     @abstractmethod
-    def deduplicate_documents(self, search_results: dict[str, Any]) -> dict[str, Any]:
+    def deduplicate_documents(
+        self,
+        search_results: dict[str, Any],
+        max_candidates: int | None = None,
+        rrf_k: int = RRF_K,
+        weights: Sequence[float] | None = None,
+    ) -> dict[str, Any]:
         pass
 
     @abstractmethod
@@ -67,33 +129,99 @@ class VectorDBInterface(ABC):
 class VectorDB(VectorDBInterface):
     def __init__(
         self,
-        embedding_function: str = "text-embedding-3-small",
+        embedding_function: str | None = None,
         openai_api_key: str = OPENAI_API_KEY,
+        embedding_provider: str = EMBEDDING_PROVIDER,
+        ingest_workers: int = EMBEDDING_MAX_WORKERS,
+        tokens_per_minute: int | None = EMBEDDING_TOKENS_PER_MINUTE,
+        embedding_cache_dir: str | None = EMBEDDING_CACHE_DIR,
     ):
         self.embedding_function = None
+        self.provider = None
         self.client = None
         self.collection = None
-        self.embedding_function_name = embedding_function
+        self.ingestor = None
+        self.query_cache = None
+        self.embedding_function_name = embedding_function  # Model of the embedding provider, None for its default
+        self.embedding_provider_name = embedding_provider
         self.openai_api_key = openai_api_key
         self.collection_name = "local-collection"
+        self.ingest_workers = ingest_workers  # Concurrent embedding requests while adding documents
+        self.tokens_per_minute = tokens_per_minute  # Embedding rate limit, None for no limit
+        self.embedding_cache_dir = embedding_cache_dir  # Embeddings kept across resets and collections, None to disable
         self.summary_manager = SummaryManager()
+        self.lexical_index = BM25Index(BM25_INDEX_DIR)  # Keyword search over the same chunks, one segment per file
 
         self._init()
 
     def _init(self):
-        self.client = chromadb.PersistentClient(path=CHROMA_DB_DIR)  # using default path for Chroma
-        self.embedding_function = embedding_functions.OpenAIEmbeddingFunction(
-            api_key=self.openai_api_key, model_name=self.embedding_function_name
+        options = {"api_key": self.openai_api_key} if self.embedding_provider_name == "openai" else {}
+        self.provider = get_embedding_provider(self.embedding_provider_name, self.embedding_function_name, **options)
+        self.embedding_function_name = self.provider.model_name
+        self.embedding_function = self.provider
+        # queries skip the disk cache, which is meant for document chunks
+        self.query_cache = QueryEmbeddingCache(
+            self.embedding_function, max_size=QUERY_CACHE_SIZE, ttl_seconds=QUERY_CACHE_TTL_SECONDS
         )
-        self.collection = self.client.get_or_create_collection(
-            self.collection_name, embedding_function=self.embedding_function
+        if self.embedding_cache_dir and self.provider.remote:
+            self.embedding_function = CachedEmbeddingFunction(
+                self.embedding_function,
+                self.embedding_function_name,
+                self.embedding_cache_dir,
+                dimensions=self.provider.dimensions,
+                max_bytes=EMBEDDING_CACHE_MAX_BYTES,
+            )
+            # the cache keeps the recency of hits in memory, closing it writes the LRU order to disk
+            atexit.register(self.embedding_function.close)
+        self.collection = self._open_collection()
+        self._check_embedding_identity()
+        self.ingestor = EmbeddingIngestor(
+            self.embedding_function,
+            self._upsert_embedded,
+            max_workers=self.ingest_workers,
+            tokens_per_minute=self.tokens_per_minute if self.provider.remote else None,
         )
         logger.info(
-            f"Successfully initialized ChromaDb with collection: {self.collection_name}\n with "
-            f"{self.collection.count()} documents (chunks)"
+            f"Successfully initialized {type(self).__name__} with collection: {self.collection_name}\n with "
+            f"{self.collection.count()} documents (chunks) embedded by {self.provider.name} "
+            f"({self.embedding_function_name}, {self.provider.dimensions} dimensions)"
         )
 
-    def prepare_documents(self, chunks: list[dict]) -> dict[str, list[str]]:
+    def close(self) -> None:
+        """Closes the embedding cache, writing the recency of cache hits to disk"""
+        if isinstance(self.embedding_function, CachedEmbeddingFunction):
+            self.embedding_function.close()
+
+    def _open_collection(self):
+        self.client = chromadb.PersistentClient(path=CHROMA_DB_DIR)  # using default path for Chroma
+        # without metadata: get_or_create overwrites differing stored metadata, which would hide the store's identity
+        # from _check_embedding_identity
+        return self.client.get_or_create_collection(self.collection_name, embedding_function=self.embedding_function)
+
+    def _recreate_collection(self):
+        self.client.delete_collection(self.collection_name)
+        return self.client.create_collection(
+            self.collection_name, embedding_function=self.embedding_function, metadata=self.provider.identity
+        )
+
+    def _check_embedding_identity(self) -> None:
+        """Refuses a collection built with another embedding provider, model or dimension count"""
+        stored_dimensions = None
+        if self.collection.count():
+            sample = self.collection.peek(1)
+            if sample["embeddings"] is not None and len(sample["embeddings"]):
+                stored_dimensions = len(sample["embeddings"][0])
+        identity = check_store_identity(self.collection.metadata, self.provider, stored_dimensions)
+        if identity is not None:
+            # collections created before identities were recorded; the distance function cannot be modified
+            metadata = {key: value for key, value in (self.collection.metadata or {}).items() if "hnsw:" not in key}
+            self.collection.modify(metadata={**metadata, **identity})
+
+    def _upsert_embedded(self, ids, embeddings, documents, metadatas) -> None:
+        # resolves self.collection on every call, reset_database replaces it
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def prepare_documents(self, chunks: Iterable[dict], file_name: str | None = None) -> dict[str, list[str]]:
         ids = []
         documents = []
         metadatas = []  # used for filtering
@@ -113,18 +241,21 @@ class VectorDB(VectorDBInterface):
 
             documents.append(combined_text)
 
-            metadatas.append(
-                {
-                    "source_url": chunk["metadata"]["source_url"],
-                    "page_title": chunk["metadata"]["page_title"],
-                }
-            )
+            metadata = {
+                "source_url": chunk["metadata"]["source_url"],
+                "page_title": chunk["metadata"]["page_title"],
+                CONTENT_HASH_KEY: content_hash(combined_text),
+            }
+            if file_name is not None:
+                metadata[SOURCE_FILE_KEY] = file_name
+                metadata[DOC_SET_KEY] = doc_set_name(file_name)
+            metadatas.append(metadata)
 
         return {"ids": ids, "documents": documents, "metadatas": metadatas}
 
     @base_error_handler
     def add_documents(self, json_data: list[dict], file_name: str) -> None:
-        processed_docs = self.prepare_documents(json_data)
+        processed_docs = self.prepare_documents(json_data, file_name)
 
         ids = processed_docs["ids"]
         documents = processed_docs["documents"]
@@ -136,22 +267,49 @@ class VectorDB(VectorDBInterface):
         if all_exist:
             logger.info(f"All documents from {file_name} already loaded.")
         else:
-            # Prepare data for missing documents only
-            missing_indices = [ids.index(m_id) for m_id in missing_ids]
-            missing_docs = [documents[i] for i in missing_indices]
-            missing_metas = [metadatas[i] for i in missing_indices]
-
-            # Add only missing documents
-            self.collection.add(
-                ids=missing_ids,
-                documents=missing_docs,
-                metadatas=missing_metas,
+            # Embed and add only missing documents, in batches as they fit the embedding rate limit
+            missing = set(missing_ids)
+            records = (record for record in zip(ids, documents, metadatas) if record[0] in missing)
+            report = self.ingestor.ingest(records, total=len(missing))
+            logger.info(
+                f"Added {report.documents} new documents to ChromaDB in {report.batches} batches "
+                f"({report.tokens} tokens, {report.retries} retries, {report.seconds:.1f} seconds)."
             )
-            logger.info(f"Added {len(missing_ids)} new documents to ChromaDB.")
+            if report.failed_ids:
+                logger.error(
+                    f"{len(report.failed_ids)} documents from {file_name} could not be embedded, "
+                    f"they are added the next time the file is loaded."
+                )
+
+        self.lexical_index.update(file_name, ids, documents)
 
         # Generate summary for the entire file if not already present
         self.summary_manager.process_file(data=json_data, file_name=file_name)
 
+    @base_error_handler
+    def sync_documents(
+        self, json_data: Iterable[dict], file_name: str, max_delete_share: float | None = SYNC_MAX_DELETE_SHARE
+    ) -> SyncPlan:
+        """Brings the collection's chunks of a chunk file in line with the file.
+
+        New and changed chunks are embedded, chunks whose metadata alone changed are updated without embedding,
+        chunks of the file that are no longer in it are deleted and unchanged chunks are skipped.
+        json_data: the file's chunks, e.g. DocumentProcessor.iter_chunks; they are only held in memory when the file
+        has no summary yet
+        max_delete_share: deleting more than this share of the file's stored chunks is refused (see SyncPlan.held_back),
+        None to delete whatever the file no longer contains
+        """
+        if file_name not in self.summary_manager.summaries and not isinstance(json_data, list):
+            json_data = list(json_data)  # the summary samples chunks from across the whole file
+        processed_docs = self.prepare_documents(json_data, file_name)
+        records = list(zip(processed_docs["ids"], processed_docs["documents"], processed_docs["metadatas"]))
+
+        plan = sync_collection(self.collection, self.ingestor, records, file_name, max_delete_share)
+
+        self.lexical_index.update(file_name, processed_docs["ids"], processed_docs["documents"])
+        self.summary_manager.process_file(data=json_data, file_name=file_name)
+        return plan
+
     @base_error_handler
     def check_documents_exist(self, document_ids: list[str]) -> tuple[bool, list[str]]:
         """Checks if chunks are already added to the database based on chunk ids"""
@@ -173,27 +331,68 @@ class VectorDB(VectorDBInterface):
             return False, document_ids
 
     @base_error_handler
-    def query(self, user_query: str | list[str], n_results: int = 10):
+    def query(
+        self,
+        user_query: str | list[str],
+        n_results: int = 10,
+        include: str | Sequence[str] = "documents",
+        where: dict[str, Any] | None = None,
+    ) -> dict[str, Any]:
         """
-        Handles both a single query and multiple queries
+        Handles both a single query and multiple queries.
+        include: a projection name ("ids", "metadatas", "documents" or "full") or the fields to return, distances
+        come back as one NumPy array per query
+        where: a metadata filter, e.g. {"doc_set": "docs_anthropic_com_en"}, None to search all chunks
         """
         query_texts = [user_query] if isinstance(user_query, str) else user_query
+        query_embeddings = self.query_cache.embed(query_texts)
+        check_query_dimensions(
+            query_embeddings, (self.collection.metadata or {}).get(DIMENSIONS_KEY, self.provider.dimensions)
+        )
         search_results = self.collection.query(
-            query_texts=query_texts, n_results=n_results, include=["documents", "distances", "embeddings"]
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where or None,
+            include=resolve_include(include),
         )
+        search_results = as_arrays(search_results)
+        logger.debug(f"Query embedding cache: {self.query_cache.stats()}")
         return search_results
 
+    @base_error_handler
+    def lexical_query(
+        self, user_query: str | list[str], n_results: int = 10, where: dict[str, Any] | None = None
+    ) -> dict[str, Any]:
+        """BM25 keyword search, returns ids, documents and scores per query in the shape of `query`"""
+        query_texts = [user_query] if isinstance(user_query, str) else user_query
+        # filters on source_file or doc_set only search the segments of the matching chunk files
+        segments = filter_sources(where, self.lexical_index.segments)
+        ranked = self.lexical_index.search_many(query_texts, n_results=n_results, names=segments)
+
+        hit_ids = list(dict.fromkeys(chunk_id for hits in ranked for chunk_id, _ in hits))
+        stored = (
+            self.collection.get(ids=hit_ids, where=where or None, include=["documents"])
+            if hit_ids
+            else {"ids": [], "documents": []}
+        )
+        documents = dict(zip(stored["ids"], stored["documents"]))
+
+        # chunks indexed but not stored, e.g. after a failed embedding, and chunks the filter excludes are left out
+        hits = [[(chunk_id, score) for chunk_id, score in query_hits if chunk_id in documents] for query_hits in ranked]
+        return {
+            "ids": [[chunk_id for chunk_id, _ in query_hits] for query_hits in hits],
+            "documents": [[documents[chunk_id] for chunk_id, _ in query_hits] for query_hits in hits],
+            "scores": [np.array([score for _, score in query_hits], dtype=np.float32) for query_hits in hits],
+        }
+
     @base_error_handler
     def reset_database(self):
         # Delete collection
-        self.client.delete_collection(self.collection_name)
-
-        self.collection = self.client.create_collection(
-            self.collection_name, embedding_function=self.embedding_function
-        )
+        self.collection = self._recreate_collection()
 
-        # Delete the summaries file
+        # Delete the summaries file and the keyword index
         self.summary_manager.clear_summaries()
+        self.lexical_index.clear()
 
         logger.info("Database reset successfully. ")
 
@@ -206,17 +405,40 @@ class VectorDB(VectorDBInterface):
             output.append(f"Distance: {dist:.2f}\n\n{docs}")
         return output
 
-    def deduplicate_documents(self, search_results: dict[str, Any]) -> dict[str, Any]:
-        documents = search_results["documents"][0]
-        distances = search_results["distances"][0]
-        ids = search_results["ids"][0]
+    def deduplicate_documents(
+        self,
+        search_results: dict[str, Any],
+        max_candidates: int | None = None,
+        rrf_k: int = RRF_K,
+        weights: Sequence[float] | None = None,
+    ) -> dict[str, Any]:
+        """Merges the result lists of all queries by reciprocal-rank fusion into unique chunks, best first"""
+        return fuse_query_results(search_results, k=rrf_k, weights=weights, max_candidates=max_candidates)
 
-        unique_documents = {}
 
-        for chunk_id, doc, distance in zip(ids, documents, distances, strict=True):
-            if chunk_id not in unique_documents:
-                unique_documents[chunk_id] = {"text": doc, "distance": distance}
-        return unique_documents
+class NumpyVectorDB(VectorDB):
+    """VectorDB on an in-process NumpyCollection instead of Chroma, for doc sets up to a few hundred thousand chunks.
+
+    Opens without starting a Chroma client and answers a multi-query search with one matrix multiply; syncing,
+    caching, keyword search and fusion are shared with VectorDB.
+    """
+
+    def __init__(self, *args, index_dir: str = NUMPY_INDEX_DIR, **kwargs):
+        self.index_dir = index_dir
+        super().__init__(*args, **kwargs)
+
+    def _open_collection(self) -> NumpyCollection:
+        return NumpyCollection(
+            os.path.join(self.index_dir, self.collection_name), self.collection_name, metadata=self.provider.identity
+        )
+
+    def _recreate_collection(self) -> NumpyCollection:
+        self.collection.clear(metadata=self.provider.identity)
+        return self.collection
+
+
+# Vector store implementations selectable with VECTOR_BACKEND
+VECTOR_BACKENDS: dict[str, type[VectorDB]] = {"chroma": VectorDB, "numpy": NumpyVectorDB}
 
 
 class Reranker:
@@ -268,22 +490,48 @@ class Reranker:
 
 
 class ResultRetriever:
-    def __init__(self, vector_db: VectorDB, reranker: Reranker):
+    def __init__(
+        self,
+        vector_db: VectorDB,
+        reranker: Reranker,
+        max_candidates: int | None = MAX_RERANK_CANDIDATES,
+        rrf_k: int = RRF_K,
+        hybrid: bool = True,
+        router: SourceRouter | None = None,
+    ):
         self.db = vector_db
         self.reranker = reranker
+        self.hybrid = hybrid  # Fuse BM25 keyword results with the embedding search
+        self.router = router  # Restricts searches to the doc sets a query is about, None to always search everything
+        self.max_candidates = max_candidates  # Fused chunks sent to the reranker, None for all
+        self.rrf_k = rrf_k  # Rank offset of reciprocal-rank fusion, larger values flatten the ranks
 
     @base_error_handler
     @weave.op()
-    def retrieve(self, user_query: str, combined_queries: list[str], top_n: int = None):
+    def retrieve(
+        self, user_query: str, combined_queries: list[str], top_n: int = None, where: dict[str, Any] | None = None
+    ):
         """Returns ranked documents based on the user query:
-        top_n: The number of most relevant documents or indices to return, defaults to the length of the documents"""
+        top_n: The number of most relevant documents or indices to return, defaults to the length of the documents
+        where: a metadata filter restricting the search, e.g. {"doc_set": "docs_anthropic_com_en"}; when None the
+        router, if any, picks the doc sets from the user query"""
 
         start_time = time.time()  # Start timing
 
+        routed = False
+        if where is None and self.router is not None:
+            doc_sets = self.router.route(user_query, self.db.summary_manager.summaries)
+            where = source_filter(doc_sets)
+            routed = where is not None
+            if routed:
+                logger.info(f"Routing the search to {doc_sets}")
+
         # get expanded search results
-        search_results = self.db.query(combined_queries)
-        unique_documents = self.db.deduplicate_documents(search_results)
-        logger.info(f"Search returned {len(unique_documents)} unique chunks")
+        unique_documents = self.search(combined_queries, where)
+        if routed and not unique_documents:
+            logger.info("Nothing found in the routed doc sets, searching all of them")
+            unique_documents = self.search(combined_queries)
+        logger.info(f"Search over {len(combined_queries)} queries fused into {len(unique_documents)} unique chunks")
 
         # rerank the results
         ranked_documents = self.reranker.rerank(user_query, unique_documents)
@@ -301,6 +549,13 @@ class ResultRetriever:
 
         return limited_results
 
+    def search(self, combined_queries: list[str], where: dict[str, Any] | None = None) -> dict[str, Any]:
+        """Embedding (and keyword) search for all queries, fused into the unique candidates for the reranker"""
+        search_results = self.db.query(combined_queries, where=where)
+        if self.hybrid:
+            search_results = concat_results(search_results, self.db.lexical_query(combined_queries, where=where))
+        return self.db.deduplicate_documents(search_results, max_candidates=self.max_candidates, rrf_k=self.rrf_k)
+
     def filter_irrelevant_results(
         self, response: RerankResponse, relevance_threshold: float = 0.1
     ) -> dict[int, dict[str, int | float | str]]:
@@ -0,0 +1,49 @@
+import json
+import pickle
+
+from src.benchmarks.chunking_benchmark import CountingTokenizer, _run_chunker
+from src.benchmarks.corpus import generate_raw_file
+from src.benchmarks.decorators_benchmark import DECORATORS, run_benchmark
+from src.benchmarks.vector_index_benchmark import run_benchmark as run_vector_index_benchmark
+from src.utils.tokenizer import get_tokenizer
+
+
+def test_generated_corpus_is_deterministic_and_crawler_shaped(tmp_path):
+    first = generate_raw_file(str(tmp_path / "first.json"), pages=5, seed=3, max_header_depth=5)
+    second = generate_raw_file(str(tmp_path / "second.json"), pages=5, seed=3, max_header_depth=5)
+
+    with open(first, encoding="utf-8") as f1, open(second, encoding="utf-8") as f2:
+        raw = json.load(f1)
+        assert raw == json.load(f2)
+    assert raw["total_pages"] == len(raw["data"]) == 5
+    assert all({"markdown", "metadata"} <= page.keys() and page["metadata"]["sourceURL"] for page in raw["data"])
+
+
+def test_chunker_measurements(tmp_path):
+    filepath = generate_raw_file(str(tmp_path / "corpus.json"), pages=4, long_line_probability=1.0)
+    measurements = _run_chunker(filepath, max_workers=1)
+
+    assert measurements["pages"] == 4
+    assert measurements["chunks"] > 0 and measurements["tokens"] > 0
+    assert measurements["tokenizer_calls"] == sum(measurements["tokenizer_calls_by_method"].values()) > 0
+    assert measurements["peak_rss_mb"] > 0
+    # the process-wide encoder is left as it was, and the wrapper survives a pickle round trip
+    assert not isinstance(get_tokenizer().encoding, CountingTokenizer)
+    counting_tokenizer = pickle.loads(pickle.dumps(CountingTokenizer(get_tokenizer().encoding)))
+    assert counting_tokenizer.encode("hello world") == get_tokenizer().encode("hello world")
+
+
+def test_decorator_benchmark_reports_every_decorator():
+    results = run_benchmark(number=1000, repeat=1, save=False)
+
+    assert results["bare_ns_per_call"] > 0
+    assert set(results["decorators"]) == set(DECORATORS)
+    assert all(result["ns_per_call"] > 0 for result in results["decorators"].values())
+
+
+def test_vector_index_benchmark_measures_the_numpy_backend():
+    results = run_vector_index_benchmark(chunks=300, dimensions=16, repeat=4, backends=("numpy",), save=False)
+
+    measurements = results["backends"]["numpy"]
+    assert measurements["query_ms_p50"] > 0 and measurements["build_seconds"] > 0
+    assert set(measurements["cold_start"]) == {"open_seconds", "first_query_seconds"}
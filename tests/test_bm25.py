@@ -0,0 +1,56 @@
+import os
+
+from src.vector_storage.bm25 import SEGMENT_SUFFIX, BM25Index, tokenize
+
+DOCS = {
+    "install": "Install the package with pip and configure the API key.",
+    "checkpoint": "Pass a MemorySaver checkpointer to compile so the graph keeps state between runs.",
+    "recursion": "GraphRecursionError is raised when recursion_limit is reached, raise the limit in the config.",
+    "streaming": "Stream tokens from the graph with stream_mode set to messages.",
+}
+
+
+def test_tokens_keep_identifiers_whole_and_split():
+    assert tokenize("Set recursion_limit in the Config") == ["set", "recursion_limit", "recursion", "limit", "config"]
+
+
+def test_exact_names_rank_their_chunks_first(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.update("docs-chunked.jsonl", list(DOCS), list(DOCS.values()))
+
+    assert index.search("GraphRecursionError", n_results=3) == [
+        ("recursion", index.search("graphrecursionerror")[0][1])
+    ]
+    assert index.search("how do I set stream_mode?")[0][0] == "streaming"
+    assert [ids[0][0] for ids in index.search_many(["MemorySaver", "pip install"])] == ["checkpoint", "install"]
+    assert index.search("nothing matches this") == []
+
+
+def test_segments_are_persisted_and_only_rebuilt_when_their_file_changed(tmp_path):
+    index = BM25Index(str(tmp_path))
+    assert index.update("a-chunked.jsonl", ["install"], [DOCS["install"]])
+    assert index.update("b-chunked.jsonl", ["streaming", "checkpoint"], [DOCS["streaming"], DOCS["checkpoint"]])
+    assert not index.update("a-chunked.jsonl", ["install"], [DOCS["install"]])
+
+    reloaded = BM25Index(str(tmp_path))
+    assert len(reloaded) == 3
+    assert reloaded.search_many(["checkpointer", "pip"]) == index.search_many(["checkpointer", "pip"])
+
+    reloaded.update("b-chunked.jsonl", ["recursion"], [DOCS["recursion"]])
+    assert reloaded.search("stream") == []
+    assert reloaded.search("recursion_limit")[0][0] == "recursion"
+
+    reloaded.clear()
+    assert len(reloaded) == 0 and not any(name.endswith(SEGMENT_SUFFIX) for name in os.listdir(tmp_path))
+
+
+def test_search_can_be_restricted_to_some_segments(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.update("a-chunked.jsonl", ["install", "recursion"], [DOCS["install"], DOCS["recursion"]])
+    index.update("b-chunked.jsonl", ["streaming", "checkpoint"], [DOCS["streaming"], DOCS["checkpoint"]])
+
+    assert index.search_many(["graph"], names={"b-chunked.jsonl"})[0][0][0] in {"streaming", "checkpoint"}
+    assert index.search_many(["recursion_limit graph"], names=["b-chunked.jsonl"]) == [
+        index.search_many(["graph"], names=["b-chunked.jsonl"])[0]
+    ]
+    assert index.search_many(["pip"], names=[]) == [[]]
@@ -0,0 +1,88 @@
+import json
+import os
+
+from src.processing import chunking
+from src.processing.boilerplate import (
+    BOILERPLATE_SUFFIX,
+    LearnedBoilerplate,
+    learn_boilerplate,
+    load_learned_boilerplate,
+    save_learned_boilerplate,
+)
+from src.processing.chunking import MarkdownChunker
+
+CHROME = ["Skip to main content", "Docs Home | Pricing | Blog", "Was this page helpful?", "© 2024 Example Inc."]
+
+
+def crawl_pages(n_pages: int = 10) -> list[dict]:
+    pages = []
+    for i in range(n_pages):
+        body = [
+            "## Overview",
+            f"Page {i} explains feature {i} in detail. " * 30,
+            "```python",
+            "import example",
+            "Was this page helpful?",
+            "```",
+        ]
+        markdown = "\n".join(CHROME[:2] + [f"# Feature {i}", ""] + body + ["", *CHROME[2:]])
+        pages.append({"markdown": markdown, "metadata": {"sourceURL": f"https://example.com/{i}", "title": f"F{i}"}})
+    return pages
+
+
+def test_lines_on_most_pages_are_learned():
+    pages = crawl_pages()
+    pages[0]["markdown"] += "\nOnly on one page"
+
+    learned = learn_boilerplate(pages, share=0.5, min_pages=5)
+
+    assert learned == {line: 10 for line in CHROME}
+    assert learn_boilerplate(pages[:4], share=0.5, min_pages=5) == {}
+
+
+def test_learned_lines_are_blanked_outside_code_blocks():
+    remove = LearnedBoilerplate(CHROME)
+    cleaned = remove(crawl_pages(1)[0]["markdown"])
+
+    assert "Skip to main content" not in cleaned
+    assert cleaned.count("Was this page helpful?") == 1  # the copy inside the code block stays
+    assert "## Overview" in cleaned
+    assert len(cleaned.split("\n")) == len(crawl_pages(1)[0]["markdown"].split("\n"))
+
+
+def test_learned_lines_are_stored_next_to_the_raw_file(tmp_path):
+    raw_filepath = str(tmp_path / "crawl.json")
+    with open(raw_filepath, "w", encoding="utf-8") as f:
+        json.dump({"data": crawl_pages()}, f)
+    learned = {line: 10 for line in CHROME}
+
+    assert save_learned_boilerplate(raw_filepath, learned, 0.5, 5) == raw_filepath + BOILERPLATE_SUFFIX
+    assert load_learned_boilerplate(raw_filepath, 0.5, 5) == learned
+    assert load_learned_boilerplate(raw_filepath, 0.8, 5) is None
+
+    with open(raw_filepath, "a", encoding="utf-8") as f:
+        f.write("\n")
+    assert load_learned_boilerplate(raw_filepath, 0.5, 5) is None
+
+
+def test_chunker_learns_and_reuses_boilerplate(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunking, "RAW_DATA_DIR", str(tmp_path))
+    with open(tmp_path / "crawl.json", "w", encoding="utf-8") as f:
+        json.dump({"data": crawl_pages()}, f)
+
+    plain = MarkdownChunker(input_filename="crawl.json").process_pages(crawl_pages())
+    chunker = MarkdownChunker(input_filename="crawl.json", boilerplate_share=0.5)
+    chunker.learn_boilerplate()
+    cleaned = chunker.process_pages(crawl_pages())
+
+    assert os.path.exists(tmp_path / f"crawl.json{BOILERPLATE_SUFFIX}")
+    assert any("Skip to main content" in chunk["data"]["text"] for chunk in plain)
+    assert not any(line in chunk["data"]["text"] for chunk in cleaned for line in CHROME[:2])
+    assert sum(chunk["metadata"]["token_count"] for chunk in cleaned) < sum(
+        chunk["metadata"]["token_count"] for chunk in plain
+    )
+
+    reused = MarkdownChunker(input_filename="crawl.json", boilerplate_share=0.5)
+    reused.iter_pages = None  # a stored index must not stream the raw file again
+    reused.learn_boilerplate()
+    assert reused.learned_boilerplate.lines == chunker.learned_boilerplate.lines
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from src.utils.chunk_io import ChunkWriter, iter_chunk_file
+
+CHUNKS = [
+    {"chunk_id": str(i), "metadata": {"token_count": i}, "data": {"headers": {"h1": "Título"}, "text": f"line\n{i}"}}
+    for i in range(3)
+]
+
+
+@pytest.mark.parametrize("extension", [".jsonl", ".json"])
+def test_chunk_files_round_trip(tmp_path, extension):
+    filepath = str(tmp_path / f"chunks{extension}")
+    with ChunkWriter(filepath) as writer:
+        for chunk in CHUNKS:
+            writer.write(chunk)
+
+    assert writer.count == len(CHUNKS)
+    assert list(iter_chunk_file(filepath)) == CHUNKS
+
+
+def test_json_output_matches_json_dump(tmp_path):
+    for chunks in [CHUNKS, []]:
+        filepath = str(tmp_path / "chunks.json")
+        with ChunkWriter(filepath) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+        with open(filepath, encoding="utf-8") as f:
+            assert f.read() == json.dumps(chunks, indent=2)
+
+
+def test_msgpack_round_trip(tmp_path):
+    pytest.importorskip("msgpack")
+    filepath = str(tmp_path / "chunks.msgpack")
+    with ChunkWriter(filepath) as writer:
+        for chunk in CHUNKS:
+            writer.write(chunk)
+    assert list(iter_chunk_file(filepath)) == CHUNKS
+
+
+def test_failed_write_keeps_the_previous_file(tmp_path):
+    filepath = str(tmp_path / "chunks.jsonl")
+    with ChunkWriter(filepath) as writer:
+        writer.write(CHUNKS[0])
+
+    with pytest.raises(RuntimeError):
+        with ChunkWriter(filepath) as writer:
+            writer.write(CHUNKS[1])
+            raise RuntimeError("chunking failed")
+
+    assert list(iter_chunk_file(filepath)) == CHUNKS[:1]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["chunks.jsonl"]
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ChunkWriter(str(tmp_path / "chunks.csv"))
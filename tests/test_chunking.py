@@ -1,4 +1,9 @@
+import json
+import random
+
+from src.benchmarks.corpus import generate_page
 from src.processing.chunking import MarkdownChunker
+from src.utils.chunk_io import iter_chunk_file
 
 
 def test_markdown_chunker_initialization():
@@ -6,3 +11,144 @@ def test_markdown_chunker_initialization():
     assert chunker is not None
     assert chunker.max_tokens == 1000
     assert chunker.soft_token_limit == 800
+
+
+def sample_pages(n_pages: int = 6) -> dict:
+    pages = []
+    for i in range(n_pages):
+        sections = [f"## Section {s}\n\n" + f"Sentence number {s} on page {i}. " * (40 * s + 5) for s in range(4)]
+        markdown = f"# Page {i}\n\n" + "\n\n".join(sections) + "\n\n```python\nprint('hello')\n```\n"
+        pages.append({"markdown": markdown, "metadata": {"sourceURL": f"https://example.com/{i}", "title": f"P{i}"}})
+    return {"data": pages}
+
+
+def without_ids(chunks: list[dict]) -> list[dict]:
+    return [{key: value for key, value in chunk.items() if key != "chunk_id"} for chunk in chunks]
+
+
+def test_parallel_chunking_matches_serial():
+    serial = MarkdownChunker(input_filename="test_input.json")
+    parallel = MarkdownChunker(input_filename="test_input.json", max_workers=2)
+
+    serial_chunks = serial.process_pages(sample_pages())
+    parallel_chunks = parallel.process_pages(sample_pages())
+
+    assert without_ids(parallel_chunks) == without_ids(serial_chunks)
+    assert parallel.validator.chunk_token_counts == serial.validator.chunk_token_counts
+    assert parallel.validator.total_headings == serial.validator.total_headings
+    assert parallel.validator.cleaning_stats.stages == serial.validator.cleaning_stats.stages
+    assert parallel.validator.cleaning_stats.pages == len(sample_pages()["data"])
+
+
+def test_process_pages_accepts_page_stream():
+    chunker = MarkdownChunker(input_filename="test_input.json")
+    streamed_chunks = chunker.process_pages(iter(sample_pages()["data"]))
+
+    assert without_ids(streamed_chunks) == without_ids(MarkdownChunker("test_input.json").process_pages(sample_pages()))
+
+
+def test_chunk_ids_are_content_addressed():
+    first_run = MarkdownChunker(input_filename="test_input.json").process_pages(sample_pages())
+    second_run = MarkdownChunker(input_filename="test_input.json").process_pages(sample_pages())
+    first_ids = [chunk["chunk_id"] for chunk in first_run]
+
+    assert first_ids == [chunk["chunk_id"] for chunk in second_run]
+    assert len(set(first_ids)) == len(first_ids)
+
+    pages = sample_pages()
+    pages["data"][0]["markdown"] += "\nA new closing paragraph."
+    changed_ids = {chunk["chunk_id"] for chunk in MarkdownChunker("test_input.json").process_pages(pages)}
+    assert first_ids[0] in changed_ids
+    assert first_ids[-1] in changed_ids
+    assert changed_ids != set(first_ids)
+
+
+def test_page_cache_replays_chunks_and_statistics(tmp_path):
+    uncached = MarkdownChunker(input_filename="test_input.json")
+    cold = MarkdownChunker(input_filename="test_input.json", cache_dir=str(tmp_path))
+    warm = MarkdownChunker(input_filename="test_input.json", cache_dir=str(tmp_path))
+
+    expected = uncached.process_pages(sample_pages())
+    assert cold.process_pages(sample_pages()) == expected
+    assert warm.process_pages(sample_pages()) == expected
+
+    assert (cold.validator.cache_hits, cold.validator.cache_misses) == (0, 6)
+    assert (warm.validator.cache_hits, warm.validator.cache_misses) == (6, 0)
+    assert (cold.validator.cleaning_stats.pages, warm.validator.cleaning_stats.pages) == (6, 0)
+    assert warm.validator.chunk_token_counts == uncached.validator.chunk_token_counts
+    assert warm.validator.total_headings == uncached.validator.total_headings
+
+    smaller = MarkdownChunker(input_filename="test_input.json", max_tokens=500, cache_dir=str(tmp_path))
+    smaller.process_pages(sample_pages())
+    assert smaller.validator.cache_misses == 6
+
+
+def test_streaming_validation_removes_duplicates_and_writes_incorrect_chunks(tmp_path):
+    pages = sample_pages()
+    pages["data"].append({"markdown": "# Tiny\n\nShort page.", "metadata": {"sourceURL": "https://example.com/t"}})
+    chunker = MarkdownChunker(input_filename="test_input.json", output_dir=str(tmp_path), save=True)
+
+    chunks = list(chunker.iter_validated_chunks(pages["data"] + [pages["data"][0]]))
+
+    assert chunks == MarkdownChunker("test_input.json").process_pages(pages)
+    assert chunker.validator.duplicates_removed > 0
+    assert chunker.validator.total_chunks == len(chunks)
+
+    with open(tmp_path / "test_input-incorrect-chunks.jsonl", encoding="utf-8") as f:
+        incorrect = [json.loads(line) for line in f]
+    assert len(incorrect) == sum(chunker.validator.incorrect_counts.values()) > 0
+    assert all(record["issue"] == "too_small" and record["size"] < 100 for record in incorrect)
+
+
+def test_near_duplicate_chunks_are_removed():
+    pages = sample_pages()
+    repeated = pages["data"][0]["markdown"].replace("page 0", "page 0 ")
+    pages["data"].append({"markdown": repeated, "metadata": {"sourceURL": "https://example.com/copy", "title": "P0"}})
+
+    exact_only = MarkdownChunker(input_filename="test_input.json")
+    near = MarkdownChunker(input_filename="test_input.json", near_duplicate_threshold=0.9)
+    exact_chunks = exact_only.process_pages(pages)
+    near_chunks = near.process_pages(pages)
+
+    assert near.validator.near_duplicates_removed > 0
+    assert len(near_chunks) == len(exact_chunks) - near.validator.near_duplicates_removed
+    assert near.validator.total_chunks == len(near_chunks)
+
+
+def test_chunks_are_streamed_to_jsonl(tmp_path):
+    chunker = MarkdownChunker(input_filename="test_input.json", output_dir=str(tmp_path))
+    output_filepath = chunker.save_chunks(chunker.iter_validated_chunks(sample_pages()["data"]))
+
+    assert output_filepath.endswith("test_input-chunked.jsonl")
+    assert list(iter_chunk_file(output_filepath)) == MarkdownChunker("test_input.json").process_pages(sample_pages())
+
+
+def adversarial_pages(rng: random.Random, n_lines: int = 200) -> list[dict]:
+    """Pages of text with few bytes per token: digits, single letters, symbol tables, emoji, CJK and dense code"""
+    lines = {
+        "digits": lambda: " ".join(str(rng.randint(0, 10**9)) for _ in range(20)),
+        "letters": lambda: " ".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(60)),
+        "symbols": lambda: "| " + " | ".join(rng.choice(["->", "=>", "!=", "&&", "::", "@", "%"]) for _ in range(20)),
+        "emoji": lambda: " ".join(rng.choice("😀🚀🔥✨🎉👍🏽") for _ in range(30)),
+        "cjk": lambda: "".join(chr(rng.randint(0x4E00, 0x9FFF)) for _ in range(40)),
+        "code": lambda: f"x[{rng.randint(0, 99)}]=f(y,{rng.randint(0, 999)})&0x{rng.randint(0, 65535):X};",
+    }
+    return [
+        {
+            "markdown": f"# {name}\n\n" + "\n".join(line() for _ in range(n_lines)) + "\n",
+            "metadata": {"sourceURL": f"https://example.com/{name}", "title": name},
+        }
+        for name, line in lines.items()
+    ]
+
+
+def test_estimated_token_limits_match_exact_chunking():
+    rng = random.Random(0)
+    pages = sample_pages()["data"] + [generate_page(rng, i, long_line_probability=0.1) for i in range(30)]
+    pages += [generate_page(rng, i, code_block_lines=(50, 400), code_block_probability=0.8) for i in range(10)]
+    pages += adversarial_pages(rng)
+
+    estimated = MarkdownChunker(input_filename="test_input.json", estimate_margin=0.25).process_pages(pages)
+    exact = MarkdownChunker(input_filename="test_input.json", estimate_margin=0).process_pages(pages)
+
+    assert estimated == exact
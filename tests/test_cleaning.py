@@ -0,0 +1,120 @@
+import random
+import re
+
+import pytest
+
+import src.processing.cleaning as cleaning
+from src.benchmarks.corpus import generate_page
+from src.processing.chunking import MarkdownChunker
+from src.processing.cleaning import CleaningPipeline, CleaningStage, CleaningStats
+
+PAGE = """[Anthropic home page![light logo](/logo/light.svg)](/)
+
+English
+
+Search...
+
+Ctrl K
+
+
+
+Navigation
+# Messages <img src="x.png">
+
+Send a message ![diagram](/images/flow.png) and read the reply.
+![inline](data:image/png;base64,iVBORw0KGgo
+AAAA)
+[logo]: https://example.com/logo.svg
+[chart]: /static/chart.PNG
+On this page
+* * *
+Ünïcödé text stays.   \n\n"""
+
+
+def sequential_clean(chunker: MarkdownChunker, content: str) -> str:
+    """The cleaning steps one full-page re.sub at a time, as the chunker used to run them"""
+    content = re.sub("|".join(chunker.boilerplate_patterns.values()), "", content, flags=re.MULTILINE)
+    content = re.sub(r"\n{2,}", "\n\n", content).strip()
+    content = re.sub(r"<img[^>]+>", "", content)
+    content = re.sub(r"!\[.*?\]\(.*?\)", "", content)
+    content = re.sub(r"^\[.*?\]:\s*http.*$", "", content, flags=re.MULTILINE)
+    content = re.sub(r"!\[.*?\]\(data:image/[^;]+;base64,[^\)]+\)", "", content)
+    return re.sub(r"\[.*?\]:\s*\S*\.(png|jpg|jpeg|gif|svg|webp)", "", content, flags=re.MULTILINE | re.IGNORECASE)
+
+
+def test_pipeline_matches_sequential_cleaning():
+    chunker = MarkdownChunker(input_filename="test_input.json")
+    rng = random.Random(0)
+    pages = [PAGE, PAGE.replace("\n", "\r\n"), ""] + [generate_page(rng, i)["markdown"] for i in range(50)]
+
+    for page in pages:
+        assert chunker.cleaning_pipeline.clean(page) == sequential_clean(chunker, page)
+        assert chunker.cleaning_pipeline.clean(page, CleaningStats()) == sequential_clean(chunker, page)
+
+
+def test_boilerplate_stages_share_one_pass():
+    chunker = MarkdownChunker(input_filename="test_input.json")
+    pass_names = [cleaning_pass.name for cleaning_pass in chunker.cleaning_pipeline.passes]
+
+    assert pass_names[0] == "boilerplate"
+    assert len(chunker.cleaning_pipeline.passes[0].stages) == len(chunker.boilerplate_patterns)
+    assert "strip" in pass_names
+
+
+def test_stats_report_bytes_removed_per_stage():
+    pipeline = CleaningPipeline(
+        [
+            CleaningStage("noise.banner", r"^BANNER$", flags=re.MULTILINE),
+            CleaningStage("noise.cookies", r"^Accept cookies$", flags=re.MULTILINE | re.IGNORECASE, fuse=True),
+            CleaningStage("strip", function=str.strip),
+        ]
+    )
+    stats = CleaningStats()
+
+    assert pipeline.clean("BANNER\nbody é\nACCEPT COOKIES\n", stats) == "body é"
+    assert stats.pages == 1
+    assert set(stats.passes) == {"noise", "strip"}
+    assert stats.stages["noise.banner"] == {"pass": "noise", "matches": 1, "bytes_removed": 6}
+    assert stats.stages["noise.cookies"] == {"pass": "noise", "matches": 1, "bytes_removed": 14}
+    assert stats.stages["strip"]["bytes_removed"] == 3
+
+    merged = CleaningStats()
+    merged.merge(stats)
+    merged.merge(stats)
+    assert merged.pages == 2
+    assert merged.stages["noise.banner"]["bytes_removed"] == 12
+    assert "noise.cookies: 28 bytes" in merged.summary()
+
+
+def test_fused_stages_match_without_prefilter():
+    stages = [
+        CleaningStage("a.digits", r"\d+", fuse=True),
+        CleaningStage("a.word", r"(?i:foo)bar", fuse=True),
+        CleaningStage("a.anchored", r"^-+$", flags=re.MULTILINE, fuse=True),
+    ]
+    pipeline = CleaningPipeline(stages)
+    unfiltered = re.compile("|".join(stage.scoped_pattern() for stage in stages))
+
+    assert len(pipeline.passes) == 1
+    assert pipeline.passes[0].regex.pattern.startswith("(?=[")
+    for text in ["FOObar 12 x\n---\nfoobar", "no matches here", "\n-\n9"]:
+        assert pipeline.clean(text) == unfiltered.sub("", text)
+
+
+def test_fused_stages_are_left_unfiltered_without_the_regex_parser(monkeypatch):
+    stages = [CleaningStage("a.digits", r"\d+", fuse=True), CleaningStage("a.word", r"foo", fuse=True)]
+    filtered = CleaningPipeline(stages)
+    monkeypatch.setattr(cleaning, "sre_parse", None)
+    unfiltered = CleaningPipeline(stages)
+
+    assert unfiltered.passes[0].regex.pattern == r"(?P<s0>\d+)|(?P<s1>foo)"
+    assert unfiltered.clean("foo 12 bar") == filtered.clean("foo 12 bar") == "  bar"
+
+
+def test_invalid_stages_are_rejected():
+    with pytest.raises(ValueError):
+        CleaningStage("empty")
+    with pytest.raises(ValueError):
+        CleaningStage("backreference", r"(a)", replacement=r"\1")
+    with pytest.raises(ValueError):
+        CleaningPipeline([CleaningStage("twice", "a"), CleaningStage("twice", "b")])
@@ -0,0 +1,53 @@
+import logging
+from unittest.mock import patch
+
+import pytest
+
+from src.utils import decorators
+from src.utils.decorators import base_error_handler, performance_logger
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_logger_is_resolved_once_per_decorated_function():
+    with patch.object(decorators, "get_logger", wraps=decorators.get_logger) as get_logger:
+
+        @base_error_handler
+        def add(a, b):
+            return a + b
+
+        assert [add(i, 1) for i in range(3)] == [1, 2, 3]
+    assert get_logger.call_count == 1
+    assert add.__name__ == "add"
+
+
+def test_errors_are_logged_to_the_decorated_function_module():
+    handler = RecordingHandler()
+    module_logger = logging.getLogger(f"omni-claude.{__name__}")
+    module_logger.addHandler(handler)
+
+    @base_error_handler
+    def fail():
+        raise ValueError("boom")
+
+    try:
+        with pytest.raises(ValueError):
+            fail()
+    finally:
+        module_logger.removeHandler(handler)
+    assert handler.messages == ["Error in fail: boom"]
+
+
+def test_performance_logger_returns_the_result():
+    @performance_logger
+    def square(x):
+        return x * x
+
+    assert square(4) == 16
@@ -0,0 +1,21 @@
+from src.processing.deduplication import NearDuplicateDetector
+
+ADMONITION = (
+    "Note: the API key is read from the ANTHROPIC_API_KEY environment variable. Keep it out of version control "
+    "and rotate it regularly, requests made with a revoked key fail with an authentication error."
+)
+
+
+def test_near_duplicates_are_detected():
+    detector = NearDuplicateDetector(threshold=0.8)
+
+    assert not detector.is_duplicate(ADMONITION)
+    assert detector.is_duplicate("  " + ADMONITION.replace(" and ", "  and\n") + "\n")
+    assert detector.is_duplicate("Important. " + ADMONITION)
+    assert not detector.is_duplicate("Install the package with pip, then import the client and send a message.")
+
+
+def test_signatures_are_deterministic():
+    first, second = NearDuplicateDetector(), NearDuplicateDetector()
+    assert (first.signature(ADMONITION) == second.signature(ADMONITION)).all()
+    assert first.similarity(first.signature(ADMONITION), second.signature(ADMONITION.upper())) == 1.0
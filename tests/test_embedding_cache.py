@@ -0,0 +1,121 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.vector_storage.embedding_cache import CachedEmbeddingFunction, EmbeddingCache
+from src.vector_storage.ingest import EmbeddingIngestor
+from tests.test_ingest import LocalEmbeddingFunction, RecordingStore, records
+
+
+def vector(i: int, dimensions: int = 4) -> np.ndarray:
+    return np.full(dimensions, i, dtype=np.float32)
+
+
+def test_cached_texts_are_not_embedded_again(tmp_path):
+    embed = LocalEmbeddingFunction(dimensions=8)
+    cached = CachedEmbeddingFunction(embed, "text-embedding-3-small", str(tmp_path))
+
+    first = cached(["alpha", "beta", "alpha"])
+    second = cached(["beta", "gamma"])
+
+    assert embed.calls == [["alpha", "beta"], ["gamma"]]
+    assert first[0] == first[2] and second[0] == first[1]
+    assert first[0] == pytest.approx(embed(["alpha"])[0], abs=1e-7)
+    assert all(type(value) is float for value in second[1])
+    assert (cached.hits, cached.misses) == (2, 3)
+
+    reopened = CachedEmbeddingFunction(
+        LocalEmbeddingFunction(dimensions=8, fail_on=""), "text-embedding-3-small", str(tmp_path)
+    )
+    assert reopened(["gamma", "alpha"]) == [second[1], first[0]]
+    assert os.listdir(tmp_path) == ["text-embedding-3-small-8d"]
+
+
+def test_least_recently_used_vectors_are_evicted_within_the_size_budget(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", dimensions=4, max_bytes=3 * 16)
+    cache.put({"a": vector(1), "b": vector(2), "c": vector(3)})
+    cache.get(["a"])
+    cache.put({"d": vector(4)})
+
+    assert sorted(cache.get(["a", "b", "c", "d"])) == ["a", "c", "d"]
+    assert cache.evictions == 1
+    assert os.path.getsize(cache.vectors_path) <= 3 * 16
+
+    reopened = EmbeddingCache(str(tmp_path), "model", dimensions=4, max_bytes=3 * 16)
+    found = reopened.get(["a", "b", "c", "d"])
+    assert sorted(found) == ["a", "c", "d"]
+    assert found["d"].tolist() == vector(4).tolist()  # d reuses b's row, the journal's last line wins
+
+
+def test_a_crash_while_reusing_a_row_never_serves_another_texts_vector(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", dimensions=4, max_bytes=3 * 16)
+    cache.put({"a": vector(1), "b": vector(2), "c": vector(3)})
+    append_journal = cache._append_journal
+
+    def crash_after_tombstones(entries, sync=False):
+        if not sync:
+            raise KeyboardInterrupt  # the vector of "d" is written, its journal line is lost
+        append_journal(entries, sync)
+
+    cache._append_journal = crash_after_tombstones
+    with pytest.raises(KeyboardInterrupt):
+        cache.put({"d": vector(4)})
+
+    reopened = EmbeddingCache(str(tmp_path), "model", dimensions=4, max_bytes=3 * 16)
+    found = reopened.get(["a", "b", "c", "d"])
+    assert sorted(found) == ["b", "c"]  # "a" was evicted for "d"
+    assert [found[key].tolist() for key in ("b", "c")] == [vector(2).tolist(), vector(3).tolist()]
+
+
+def test_hits_are_only_persisted_on_close_and_compaction(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", dimensions=4, max_bytes=3 * 16)
+    cache.put({"a": vector(1), "b": vector(2), "c": vector(3)})
+    journal_size = os.path.getsize(cache.journal_path)
+    cache.get(["a"])
+    assert os.path.getsize(cache.journal_path) == journal_size
+    cache.close()
+
+    reopened = EmbeddingCache(str(tmp_path), "model", dimensions=4, max_bytes=3 * 16)
+    reopened.put({"d": vector(4)})
+    assert sorted(reopened.get(["a", "b", "c", "d"])) == ["a", "c", "d"]
+    assert sorted(os.listdir(reopened.directory)) == ["CURRENT", "index.1.log", "vectors.f32"]
+
+
+def test_files_of_an_interrupted_compaction_are_ignored(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", dimensions=4)
+    cache.put({str(i): vector(i) for i in range(5)})
+    cache._compact()
+    cache.close()
+    # a later compaction that crashed before switching generations
+    for name in ("vectors.2.f32", "index.2.log"):
+        with open(os.path.join(cache.directory, name), "w") as f:
+            f.write("0 0\n")
+
+    reopened = EmbeddingCache(str(tmp_path), "model", dimensions=4)
+
+    assert reopened.get(["3"])["3"].tolist() == vector(3).tolist()
+    assert sorted(os.listdir(reopened.directory)) == ["CURRENT", "index.1.log", "vectors.1.f32"]
+
+
+def test_a_smaller_budget_shrinks_the_cache_on_open(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", dimensions=4)
+    cache.put({str(i): vector(i) for i in range(10)})
+    cache.get(["0"])
+    cache.close()
+
+    shrunk = EmbeddingCache(str(tmp_path), "model", dimensions=4, max_bytes=2 * 16)
+
+    assert sorted(shrunk.get([str(i) for i in range(10)])) == ["0", "9"]
+    assert os.path.getsize(shrunk.vectors_path) == shrunk.nbytes == 2 * 16
+
+
+def test_cached_texts_do_not_count_against_the_rate_limit(tmp_path):
+    cached = CachedEmbeddingFunction(LocalEmbeddingFunction(), "model", str(tmp_path))
+    EmbeddingIngestor(cached, RecordingStore().upsert, tokens_per_minute=None).ingest(records(10))
+
+    ingestor = EmbeddingIngestor(cached, RecordingStore().upsert, max_batch_size=5)
+    batches = list(ingestor.iter_batches(records(12)))
+
+    assert [ingestor._billed_tokens(batch) for batch in batches[:2]] == [0, 0]
+    assert ingestor._billed_tokens(batches[2]) == batches[2].tokens > 0
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from src.vector_storage.embedding_provider import (
+    DIMENSIONS_KEY,
+    HashingEmbeddingProvider,
+    check_query_dimensions,
+    check_store_identity,
+    get_embedding_provider,
+)
+
+
+def test_hashing_embeddings_are_deterministic_normalized_and_topical():
+    provider = get_embedding_provider("hashing", dimensions=256)
+    texts = ["Compile the graph with a checkpointer", "compile the GRAPH with a checkpointer!", "Install with pip", ""]
+
+    vectors = np.array(provider(texts))
+
+    assert vectors.shape == (4, 256)
+    assert vectors.tolist() == HashingEmbeddingProvider(dimensions=256).embed(texts)
+    assert np.allclose(np.linalg.norm(vectors[:3], axis=1), 1.0) and not vectors[3].any()
+    assert vectors[0] @ vectors[1] == pytest.approx(1.0) and vectors[0] @ vectors[2] < 0.5
+    with pytest.raises(ValueError):
+        get_embedding_provider("word2vec")
+
+
+def test_stores_refuse_other_providers_and_dimensions():
+    provider = HashingEmbeddingProvider(dimensions=64)
+
+    assert check_store_identity(None, provider) == provider.identity
+    assert check_store_identity({"hnsw:space": "l2"}, provider, stored_dimensions=64) == provider.identity
+    assert check_store_identity(provider.identity, provider) is None
+    with pytest.raises(ValueError, match="1536-dimensional"):
+        check_store_identity({}, provider, stored_dimensions=1536)
+    with pytest.raises(ValueError, match="built with"):
+        check_store_identity({**provider.identity, DIMENSIONS_KEY: 128}, provider)
+
+    check_query_dimensions(provider(["query"]), 64)
+    with pytest.raises(ValueError):
+        check_query_dimensions(provider(["query"]), 1536)
@@ -0,0 +1,36 @@
+import numpy as np
+
+from src.vector_storage.fusion import concat_results, fuse_query_results, reciprocal_rank_fusion
+
+
+def test_ids_found_by_several_queries_rank_first():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"], ["c", "b"]], k=1)
+
+    assert [chunk_id for chunk_id, _ in fused] == ["c", "b", "a", "d"]
+    assert fused[0][1] == 1 / 4 + 1 / 2 + 1 / 2
+    assert reciprocal_rank_fusion([["a", "a", "b"]], k=1) == [("a", 0.5), ("b", 1 / 4)]
+    assert reciprocal_rank_fusion([["a"], ["b"]], weights=[1.0, 2.0], limit=1)[0][0] == "b"
+
+
+def test_every_query_contributes_to_the_capped_candidates():
+    search_results = {
+        "ids": [["a", "b"], ["c", "a"], ["d", "e"]],
+        "documents": [["A", "B"], ["C", "A"], ["D", "E"]],
+        "distances": [np.array([0.4, 0.5]), np.array([0.1, 0.2]), np.array([0.3, 0.9])],
+    }
+
+    fused = fuse_query_results(search_results, max_candidates=4)
+
+    assert list(fused) == ["a", "c", "d", "b"]
+    assert fused["a"] == {"text": "A", "distance": 0.2, "score": 1 / 61 + 1 / 62}
+    assert fuse_query_results({"ids": [["a"]], "documents": [["A"]]})["a"]["distance"] is None
+
+
+def test_keyword_results_join_the_fusion_without_distances():
+    vector = {"ids": [["a", "b"]], "documents": [["A", "B"]], "distances": [np.array([0.1, 0.2])]}
+    keyword = {"ids": [["c", "b"]], "documents": [["C", "B"]], "scores": [np.array([3.0, 2.0])]}
+
+    fused = fuse_query_results(concat_results(vector, keyword))
+
+    assert list(fused) == ["b", "a", "c"]
+    assert fused["b"]["distance"] == 0.2 and fused["c"]["distance"] is None
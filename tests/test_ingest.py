@@ -0,0 +1,86 @@
+import hashlib
+import threading
+
+import pytest
+
+from src.vector_storage.ingest import EmbeddingIngestor, TokenRateLimiter
+
+
+class LocalEmbeddingFunction:
+    """Deterministic stand-in for the OpenAI embedding function, optionally failing its first calls"""
+
+    def __init__(self, dimensions: int = 8, failures: int = 0, fail_on: str | None = None):
+        self.dimensions = dimensions
+        self.failures = failures
+        self.fail_on = fail_on  # texts containing this always fail
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, input: list[str]) -> list[list[float]]:
+        with self._lock:
+            self.calls.append(list(input))
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("429 rate limit exceeded")
+        if self.fail_on and any(self.fail_on in text for text in input):
+            raise RuntimeError("400 bad request")
+        return [[byte / 255 for byte in hashlib.sha256(text.encode()).digest()[: self.dimensions]] for text in input]
+
+
+class RecordingStore:
+    def __init__(self):
+        self.rows = {}
+        self.upserts = 0
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.upserts += 1
+        for row in zip(ids, embeddings, documents, metadatas, strict=True):
+            self.rows[row[0]] = row[1:]
+
+
+def records(n: int, words: int = 20) -> list[tuple[str, str, dict]]:
+    return [(f"id-{i}", f"chunk {i} " + "word " * words, {"source_url": f"https://example.com/{i}"}) for i in range(n)]
+
+
+def test_ingest_embeds_in_bounded_batches_and_upserts_each():
+    embed, store = LocalEmbeddingFunction(), RecordingStore()
+    ingestor = EmbeddingIngestor(embed, store.upsert, max_workers=3, max_batch_tokens=100, max_batch_size=8)
+
+    report = ingestor.ingest(records(50) + records(5), total=50)
+
+    assert report.documents == len(store.rows) == 50
+    assert report.batches == store.upserts == len(embed.calls)
+    assert all(len(call) <= 8 for call in embed.calls)
+    assert all(sum(ingestor.token_service.count_batch(call)) <= 100 for call in embed.calls)
+    assert store.rows["id-7"][0] == embed(["chunk 7 " + "word " * 20])[0]
+    assert report.failed_ids == [] and report.retries == 0
+
+
+def test_only_failed_batches_are_retried():
+    embed, store = LocalEmbeddingFunction(failures=2), RecordingStore()
+    ingestor = EmbeddingIngestor(embed, store.upsert, max_workers=1, max_batch_size=10, retry_backoff=0)
+
+    report = ingestor.ingest(records(30))
+
+    assert report.documents == 30 and report.retries == 2
+    assert len(embed.calls) == 3 + 2  # three batches, the first one failing twice
+
+
+def test_batches_that_keep_failing_are_reported():
+    embed, store = LocalEmbeddingFunction(fail_on="chunk 3 "), RecordingStore()
+    ingestor = EmbeddingIngestor(embed, store.upsert, max_batch_size=2, max_retries=1, retry_backoff=0)
+
+    report = ingestor.ingest(records(6))
+
+    assert sorted(report.failed_ids) == ["id-2", "id-3"]
+    assert sorted(store.rows) == ["id-0", "id-1", "id-4", "id-5"]
+
+
+def test_rate_limiter_spreads_tokens_over_the_minute():
+    now = [0.0]
+    limiter = TokenRateLimiter(600, clock=lambda: now[0], sleep=lambda seconds: now.__setitem__(0, now[0] + seconds))
+
+    assert limiter.acquire(600) == 0.0  # the bucket starts full
+    assert limiter.acquire(300) == pytest.approx(30.0)
+    assert limiter.acquire(1200) == pytest.approx(60.0)  # larger than the budget: waits for a full bucket
+    assert TokenRateLimiter(None).acquire(10**9) == 0.0
@@ -0,0 +1,31 @@
+import json
+
+from src.utils.json_stream import iter_json_array
+
+
+def test_iter_json_array_matches_json_load(tmp_path):
+    doc = {
+        "input_url": "https://example.com",
+        "total_pages": 3,
+        "unique_links": ["https://example.com/a", "https://example.com/b"],
+        "data": [
+            {"markdown": '# Title\n\nSome text with "quotes" and unicode é日', "metadata": {"title": "A"}},
+            {"markdown": "", "metadata": {"score": 1.5e-3, "count": 12345}},
+            [1, 2.5, None, True, {}],
+        ],
+    }
+    filepath = tmp_path / "crawl.json"
+    filepath.write_text(json.dumps(doc, indent=2), encoding="utf-8")
+
+    # tiny buffers force values to be split across reads
+    for buffer_size in [1, 7, 1 << 20]:
+        assert list(iter_json_array(str(filepath), key="data", buffer_size=buffer_size)) == doc["data"]
+
+
+def test_iter_json_array_is_lazy(tmp_path):
+    filepath = tmp_path / "crawl.json"
+    # the document is truncated after the first page, so only a lazy reader can yield it
+    filepath.write_text('{"data": [{"markdown": "first"}, {"markdown": "sec', encoding="utf-8")
+
+    pages = iter_json_array(str(filepath), key="data", buffer_size=8)
+    assert next(pages) == {"markdown": "first"}
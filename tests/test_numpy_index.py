@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+
+from src.vector_storage.numpy_index import NumpyCollection
+
+
+def unit_vectors(n: int, dimensions: int = 16, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(n, dimensions)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def fill(collection: NumpyCollection, vectors: np.ndarray) -> list[str]:
+    ids = [f"id-{i}" for i in range(len(vectors))]
+    metadatas = [{"source_file": f"file-{i % 3}.jsonl", "page_title": f"Page {i}"} for i in range(len(vectors))]
+    collection.upsert(ids=ids, embeddings=vectors.tolist(), documents=[f"doc {i}" for i in ids], metadatas=metadatas)
+    return ids
+
+
+def test_batched_queries_match_exhaustive_search(tmp_path):
+    vectors = unit_vectors(500)
+    collection = NumpyCollection(str(tmp_path))
+    fill(collection, vectors)
+    queries = unit_vectors(4, seed=1)
+
+    results = collection.query(query_embeddings=queries.tolist(), n_results=5, include=["documents", "distances"])
+
+    expected = np.argsort(-(queries @ vectors.T), axis=1)[:, :5]
+    assert results["ids"] == [[f"id-{row}" for row in rows] for rows in expected]
+    assert results["documents"][0][0] == f"doc {results['ids'][0][0]}"
+    assert np.allclose(results["distances"][2], 2 - 2 * np.sort(queries[2] @ vectors.T)[::-1][:5], atol=1e-5)
+    assert results["metadatas"] is None and results["embeddings"] is None
+
+
+def test_where_filters_and_paging(tmp_path):
+    collection = NumpyCollection(str(tmp_path))
+    fill(collection, unit_vectors(30))
+
+    filtered = collection.query(
+        query_embeddings=unit_vectors(1).tolist(), n_results=50, where={"source_file": "file-1.jsonl"}
+    )
+    assert len(filtered["ids"][0]) == 10
+    assert all(metadata["source_file"] == "file-1.jsonl" for metadata in filtered["metadatas"][0])
+
+    where = {"$or": [{"source_file": "file-0.jsonl"}, {"page_title": {"$in": ["Page 1", "Page 2"]}}]}
+    pages = [collection.get(where=where, limit=4, offset=offset)["ids"] for offset in (0, 4, 8, 12)]
+    assert sum(pages, []) == ["id-0", "id-1", "id-2"] + [f"id-{i}" for i in range(3, 30, 3)]
+    with pytest.raises(ValueError):
+        collection.get(where={"page_title": {"$contains": "Page"}})
+
+
+def test_changes_persist_across_reopening(tmp_path):
+    vectors = unit_vectors(20)
+    collection = NumpyCollection(str(tmp_path), metadata={"embedding_provider": "hashing"})
+    ids = fill(collection, vectors)
+    collection.delete(ids=ids[:5])
+    collection.update(ids=["id-7"], metadatas=[{"source_file": "moved.jsonl"}])
+    collection.upsert(ids=["new", "id-8"], embeddings=vectors[:2].tolist(), documents=["new doc", "changed"])
+
+    reopened = NumpyCollection(str(tmp_path), metadata={"ignored": True})
+
+    assert reopened.count() == collection.count() == 16
+    assert reopened.metadata == {"embedding_provider": "hashing"}
+    assert reopened.get(ids=["id-0", "id-7", "id-8", "new"])["metadatas"] == [
+        {"source_file": "moved.jsonl"},
+        None,
+        None,
+    ]
+    assert reopened.get(ids=["id-8"])["documents"] == ["changed"]
+    query = reopened.query(query_embeddings=vectors[:1].tolist(), n_results=2)
+    assert query["ids"] == collection.query(query_embeddings=vectors[:1].tolist(), n_results=2)["ids"]
+    assert reopened.query(query_embeddings=vectors[:2].tolist(), n_results=1)["ids"] == [["new"], ["id-8"]]
+    assert len(reopened.peek(3)["embeddings"]) == 3
+
+
+def test_compaction_keeps_live_records(tmp_path):
+    collection = NumpyCollection(str(tmp_path))
+    vectors = unit_vectors(600)
+    for _ in range(3):
+        ids = fill(collection, vectors)
+    collection.delete(ids=ids[100:])
+
+    reopened = NumpyCollection(str(tmp_path))
+
+    assert reopened.count() == 100
+    assert reopened.query(query_embeddings=vectors[42:43].tolist(), n_results=1)["ids"] == [["id-42"]]
+    assert reopened.query(query_embeddings=vectors[142:143].tolist(), n_results=1)["ids"] != [["id-142"]]
+    assert NumpyCollection(str(tmp_path / "empty")).query(query_embeddings=vectors[:2].tolist())["ids"] == [[], []]
+
+
+def test_in_filters_skip_records_without_the_key(tmp_path):
+    collection = NumpyCollection(str(tmp_path))
+    vectors = unit_vectors(4)
+    metadatas = [{"doc_set": "a"}, {"page_title": "no doc set"}, None, {"doc_set": "b"}]
+    collection.upsert(ids=["a", "untitled", "bare", "b"], embeddings=vectors.tolist(), metadatas=metadatas)
+
+    assert collection.get(where={"doc_set": {"$in": ["a", "b"]}})["ids"] == ["a", "b"]
+    assert collection.get(where={"doc_set": {"$nin": ["a"]}})["ids"] == ["untitled", "bare", "b"]
+    assert collection.get(where={"doc_set": {"$in": []}})["ids"] == []
+    query = collection.query(query_embeddings=vectors[1:2].tolist(), n_results=4, where={"doc_set": {"$in": ["b"]}})
+    assert query["ids"] == [["b"]]
+
+
+def test_files_of_an_interrupted_compaction_are_ignored(tmp_path):
+    vectors = unit_vectors(20)
+    collection = NumpyCollection(str(tmp_path))
+    ids = fill(collection, vectors)
+    collection._compact()
+    # a later compaction that crashed before replacing collection.json, next to the current generation
+    for filename in ("vectors.2.f32", "records.2.jsonl"):
+        (tmp_path / filename).write_bytes(b"\0" * 64)
+
+    reopened = NumpyCollection(str(tmp_path))
+
+    assert reopened.count() == 20
+    assert reopened.query(query_embeddings=vectors[7:8].tolist(), n_results=1)["ids"] == [[ids[7]]]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["collection.json", "records.1.jsonl", "vectors.1.f32"]
+
+
+def test_upsert_interrupted_before_its_journal_line_keeps_the_previous_record(tmp_path):
+    vectors = unit_vectors(20)
+    collection = NumpyCollection(str(tmp_path))
+    ids = fill(collection, vectors)
+
+    def crash(operations):
+        raise OSError("disk full")
+
+    collection._append_journal = crash
+    with pytest.raises(OSError):
+        collection.upsert(ids=[ids[3], "new"], embeddings=vectors[10:12].tolist(), documents=["changed", "new doc"])
+
+    reopened = NumpyCollection(str(tmp_path))
+    assert reopened.count() == 20
+    assert reopened.get(ids=[ids[3]])["documents"] == [f"doc {ids[3]}"]
+    assert reopened.query(query_embeddings=vectors[3:4].tolist(), n_results=1)["ids"] == [[ids[3]]]
+
+    reopened.upsert(ids=[ids[3]], embeddings=vectors[10:11].tolist(), documents=["changed"])
+    again = NumpyCollection(str(tmp_path))
+    assert sorted(again.query(query_embeddings=vectors[10:11].tolist(), n_results=2)["ids"][0]) == [ids[10], ids[3]]
+    assert again.get(ids=[ids[3]])["documents"] == ["changed"]
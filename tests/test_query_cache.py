@@ -0,0 +1,32 @@
+from src.vector_storage.query_cache import QueryEmbeddingCache
+from tests.test_ingest import LocalEmbeddingFunction
+
+
+def test_repeated_queries_are_served_from_the_cache():
+    embed = LocalEmbeddingFunction()
+    cache = QueryEmbeddingCache(embed)
+
+    first = cache.embed(["how to stream", "what is a graph"])
+    second = cache.embed(["what is a graph", "how to stream", "checkpointers", "checkpointers"])
+
+    assert embed.calls == [["how to stream", "what is a graph"], ["checkpointers"]]
+    assert second[:2] == first[::-1] and second[2] == second[3]
+    assert cache.stats() == {"size": 3, "hits": 2, "misses": 3, "expired": 0, "hit_rate": 0.4}
+
+
+def test_entries_expire_and_least_recently_used_are_evicted():
+    now = [0.0]
+    embed = LocalEmbeddingFunction()
+    cache = QueryEmbeddingCache(embed, max_size=2, ttl_seconds=60, clock=lambda: now[0])
+
+    cache.embed(["a", "b"])
+    cache.embed(["a"])
+    cache.embed(["c"])  # evicts b
+    now[0] = 30.0
+    cache.embed(["a", "b"])
+    assert embed.calls[-1] == ["b"]
+
+    now[0] = 61.0
+    cache.embed(["a", "b"])  # a was embedded at 0, b at 30
+    assert embed.calls[-1] == ["a"] and cache.expired == 1
+    assert len(cache) == 2
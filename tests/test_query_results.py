@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from src.vector_storage.query_results import as_arrays, resolve_include
+
+
+def test_projections_request_only_the_named_fields():
+    assert resolve_include("ids") == []
+    assert resolve_include("metadatas") == ["metadatas"]
+    assert resolve_include("documents") == ["documents", "distances"]
+    assert resolve_include(["distances", "documents", "distances"]) == ["distances", "documents"]
+    with pytest.raises(ValueError):
+        resolve_include("vectors")
+    with pytest.raises(ValueError):
+        resolve_include(["ids"])
+
+
+def test_distances_are_returned_as_arrays():
+    results = as_arrays({"ids": [["a", "b"], ["c"]], "distances": [[0.1, 0.2], [0.3]], "embeddings": None})
+
+    assert isinstance(results["distances"][0], np.ndarray)
+    assert results["distances"][1].tolist() == [0.3]
+    assert results["embeddings"] is None
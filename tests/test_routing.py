@@ -0,0 +1,59 @@
+import numpy as np
+
+from src.vector_storage.numpy_index import NumpyCollection
+from src.vector_storage.routing import DOC_SET_KEY, SourceRouter, doc_set_name, filter_sources, source_filter
+from src.vector_storage.sync import SOURCE_FILE_KEY
+
+ANTHROPIC_FILE = "docs_anthropic_com_en_20240928_135426-chunked.json"
+ANTHROPIC_RECRAWL = "docs_anthropic_com_en_20241012_081500-chunked.jsonl"
+LANGGRAPH_FILE = "langchain-ai_github_io_langgraph_20240928_143920-chunked.json"
+SUMMARIES = {
+    ANTHROPIC_FILE: {"summary": "...", "keywords": ["Claude AI", "Anthropic", "API", "Prompt engineering", "Tool use"]},
+    ANTHROPIC_RECRAWL: {"summary": "...", "keywords": ["Claude AI", "Rate limits", "API"]},
+    LANGGRAPH_FILE: {"summary": "...", "keywords": ["LangGraph", "API", "Checkpointers", "Tool use", "Graph state"]},
+}
+
+
+def test_doc_set_names_drop_crawl_timestamp_and_suffixes():
+    assert doc_set_name(ANTHROPIC_FILE) == doc_set_name(ANTHROPIC_RECRAWL) == "docs_anthropic_com_en"
+    assert doc_set_name(f"src/data/chunks/{LANGGRAPH_FILE}") == "langchain-ai_github_io_langgraph"
+    assert doc_set_name("notes.md") == "notes"
+
+
+def test_router_picks_doc_sets_by_distinctive_keywords():
+    router = SourceRouter()
+
+    assert router.route("How do I add checkpointers to a LangGraph graph?", SUMMARIES) == [
+        "langchain-ai_github_io_langgraph"
+    ]
+    assert router.route("What are the rate limits of the Claude API?", SUMMARIES) == ["docs_anthropic_com_en"]
+    # shared by every doc set, or nothing matches: search everything
+    assert router.route("Which API should I call?", SUMMARIES) == []
+    assert router.route("How do I bake bread?", SUMMARIES) == []
+    assert router.route("Claude API", {ANTHROPIC_FILE: SUMMARIES[ANTHROPIC_FILE]}) == []
+    # a shared keyword adds to both, the distinctive one decides
+    assert router.route("tool use in LangGraph", SUMMARIES) == ["langchain-ai_github_io_langgraph"]
+    assert SourceRouter(min_share=0.1).route("tool use in LangGraph", SUMMARIES) == []
+
+
+def test_filters_restrict_chunk_files_and_collections(tmp_path):
+    files = [ANTHROPIC_FILE, ANTHROPIC_RECRAWL, LANGGRAPH_FILE]
+    where = source_filter(["docs_anthropic_com_en"])
+
+    assert source_filter([]) is None
+    assert filter_sources(where, files) == {ANTHROPIC_FILE, ANTHROPIC_RECRAWL}
+    assert filter_sources({"$and": [where, {SOURCE_FILE_KEY: {"$in": [ANTHROPIC_RECRAWL]}}]}, files) == {
+        ANTHROPIC_RECRAWL
+    }
+    assert filter_sources({"page_title": "Intro"}, files) is None
+    assert filter_sources(None, files) is None
+
+    collection = NumpyCollection(str(tmp_path))
+    vectors = np.eye(6, dtype=np.float32)
+    metadatas = [{SOURCE_FILE_KEY: files[i % 3], DOC_SET_KEY: doc_set_name(files[i % 3])} for i in range(6)]
+    collection.upsert(ids=[f"id-{i}" for i in range(6)], embeddings=vectors.tolist(), metadatas=metadatas)
+
+    results = collection.query(query_embeddings=vectors[2:3].tolist(), n_results=6, where=where)
+    assert sorted(results["ids"][0]) == ["id-0", "id-1", "id-3", "id-4"]
+    both = source_filter(["docs_anthropic_com_en", "langchain-ai_github_io_langgraph"])
+    assert collection.query(query_embeddings=vectors[2:3].tolist(), n_results=1, where=both)["ids"] == [["id-2"]]
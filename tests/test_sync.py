@@ -0,0 +1,108 @@
+from src.vector_storage.ingest import EmbeddingIngestor
+from src.vector_storage.numpy_index import NumpyCollection
+from src.vector_storage.sync import CONTENT_HASH_KEY, SOURCE_FILE_KEY, content_hash, plan_sync, sync_collection
+from tests.test_ingest import LocalEmbeddingFunction
+
+
+def record(chunk_id: str, text: str, title: str = "Guide") -> tuple[str, str, dict]:
+    metadata = {"page_title": title, CONTENT_HASH_KEY: content_hash(text), SOURCE_FILE_KEY: "docs-chunked.jsonl"}
+    return chunk_id, text, metadata
+
+
+def test_plan_sync_diffs_a_file_against_stored_chunks():
+    stored = [
+        record("same", "unchanged"),
+        record("renamed", "text", "Old"),
+        record("edited", "old"),
+        record("gone", "x"),
+    ]
+    current = [
+        record("same", "unchanged"),
+        record("renamed", "text", "New"),
+        record("edited", "new"),
+        record("new", "y"),
+    ]
+
+    plan = plan_sync(current + [current[0]], {chunk_id: metadata for chunk_id, _, metadata in stored})
+
+    assert [chunk_id for chunk_id, _, _ in plan.to_embed] == ["edited", "new"]
+    assert [chunk_id for chunk_id, _, _ in plan.to_update] == ["renamed"]
+    assert plan.to_delete == ["gone"]
+    assert plan.to_dict() == {"embed": 2, "update": 1, "delete": 1, "superseded": 0, "unchanged": 1}
+
+
+def test_chunks_stored_without_hashes_are_compared_by_text():
+    legacy = {"a": {"page_title": "Guide"}, "b": {"page_title": "Guide"}}
+    plan = plan_sync([record("a", "same text"), record("b", "new text")], legacy, {"a": "same text", "b": "old"})
+
+    assert [chunk_id for chunk_id, _, _ in plan.to_update] == ["a"]  # gains source_file and content_hash
+    assert [chunk_id for chunk_id, _, _ in plan.to_embed] == ["b"]
+    assert plan.to_delete == []
+
+
+def test_plan_sync_scales_linearly():
+    stored = {f"id-{i}": record(f"id-{i}", f"text {i}")[2] for i in range(50_000)}
+    current = [record(f"id-{i}", f"text {i}") for i in range(1, 50_001)]
+
+    plan = plan_sync(current, stored)
+
+    assert plan.unchanged == 49_999 and len(plan.to_embed) == 1 and plan.to_delete == ["id-0"]
+
+
+def test_deleting_most_of_a_files_chunks_is_held_back():
+    stored = {chunk_id: record(chunk_id, chunk_id)[2] for chunk_id in "abcd"}
+
+    truncated = plan_sync([record("a", "a")], stored, max_delete_share=0.5)
+    assert truncated.to_delete == [] and truncated.held_back == ["b", "c", "d"]
+    assert plan_sync([], stored, max_delete_share=0.5).held_back == ["a", "b", "c", "d"]
+    assert plan_sync([record("a", "a"), record("b", "b")], stored, max_delete_share=0.5).to_delete == ["c", "d"]
+    assert plan_sync([], stored).to_delete == ["a", "b", "c", "d"]
+
+
+def test_sync_collection_applies_the_plan_to_a_collection(tmp_path):
+    collection = NumpyCollection(str(tmp_path))
+    embed = LocalEmbeddingFunction()
+    ingestor = EmbeddingIngestor(embed, collection.upsert, tokens_per_minute=None)
+    first = [record(chunk_id, f"text {chunk_id}") for chunk_id in "abcd"]
+
+    assert sync_collection(collection, ingestor, first, "docs-chunked.jsonl").to_dict()["embed"] == 4
+    assert collection.count() == 4
+
+    edited = [record("a", "text a"), record("b", "text b", "Renamed"), record("c", "edited"), record("e", "text e")]
+    plan = sync_collection(collection, ingestor, edited, "docs-chunked.jsonl", max_delete_share=0.5)
+
+    assert plan.to_dict() == {"embed": 2, "update": 1, "delete": 1, "superseded": 0, "unchanged": 1}
+    assert embed.calls[-1] == ["edited", "text e"]
+    stored = collection.get(include=["documents", "metadatas"])
+    assert sorted(stored["ids"]) == ["a", "b", "c", "e"]
+    assert stored["metadatas"][stored["ids"].index("b")]["page_title"] == "Renamed"
+
+    # an empty (e.g. truncated) chunk file deletes nothing unless forced
+    assert sync_collection(collection, ingestor, [], "docs-chunked.jsonl", max_delete_share=0.5).held_back
+    assert collection.count() == 4
+    sync_collection(collection, ingestor, [], "docs-chunked.jsonl", max_delete_share=None)
+    assert collection.count() == 0
+
+
+def test_sync_deletes_chunks_of_older_chunkers_for_the_files_pages(tmp_path):
+    collection = NumpyCollection(str(tmp_path))
+    embed = LocalEmbeddingFunction()
+    ingestor = EmbeddingIngestor(embed, collection.upsert, tokens_per_minute=None)
+    # stored by an old chunker: random ids, no source_file or content_hash
+    legacy_texts = {"uuid4-a": ("https://docs/a", "text a"), "uuid4-b": ("https://docs/b", "old b")}
+    legacy_texts["uuid4-c"] = ("https://docs/other", "other page")
+    collection.upsert(
+        ids=list(legacy_texts),
+        embeddings=embed([text for _, text in legacy_texts.values()]),
+        documents=[text for _, text in legacy_texts.values()],
+        metadatas=[{"source_url": url, "page_title": "Guide"} for url, _ in legacy_texts.values()],
+    )
+    records = [record("a", "text a"), record("b", "new b")]
+    for chunk_id, _, metadata in records:
+        metadata["source_url"] = f"https://docs/{chunk_id}"
+
+    plan = sync_collection(collection, ingestor, records, "docs-chunked.jsonl", max_delete_share=0.5)
+
+    assert sorted(plan.superseded) == ["uuid4-a", "uuid4-b"]
+    assert sorted(collection.get()["ids"]) == ["a", "b", "uuid4-c"]  # the other page is not in this file
+    assert sync_collection(collection, ingestor, records, "docs-chunked.jsonl").to_dict()["unchanged"] == 2
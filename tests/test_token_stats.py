@@ -0,0 +1,23 @@
+import random
+import statistics
+
+from src.processing.token_stats import TokenCountSketch
+
+
+def test_sketch_matches_statistics_module():
+    rng = random.Random(0)
+    for size in [2, 3, 4, 5, 10, 101, 1000]:
+        values = [rng.randint(1, 1200) for _ in range(size)]
+        sketch = TokenCountSketch(values)
+
+        assert sketch.median() == statistics.median(values)
+        assert sketch.quantiles(n=4) == statistics.quantiles(values, n=4)
+        assert (sketch.min(), sketch.max(), len(sketch)) == (min(values), max(values), len(values))
+
+
+def test_sketch_round_trips_and_merges():
+    first, second = TokenCountSketch([5, 5, 7]), TokenCountSketch([7, 900])
+    first.merge(TokenCountSketch.from_dict(second.to_dict()))
+
+    assert first == TokenCountSketch([5, 5, 7, 7, 900])
+    assert len(first.histogram) == 3
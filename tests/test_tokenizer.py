@@ -0,0 +1,33 @@
+import pickle
+
+import tiktoken
+
+from src.utils.tokenizer import TokenizerService, get_tokenizer
+
+ENCODING = tiktoken.get_encoding("cl100k_base")
+TEXTS = ["Hello world", "tool result:\n" + "row, value\n" * 50, "", "日本語のテキスト 😀", "Hello world"]
+
+
+def test_get_tokenizer_is_shared_and_survives_pickling():
+    service = get_tokenizer()
+    assert get_tokenizer("cl100k_base") is service
+    assert pickle.loads(pickle.dumps(service)) is service
+
+
+def test_counts_match_encoder_and_are_memoized():
+    service = TokenizerService(cache_size=2)
+    assert [service.count(text) for text in TEXTS] == [len(ENCODING.encode(text)) for text in TEXTS]
+    assert service.hits == 0
+
+    service.count(TEXTS[-1])
+    assert service.hits == 1
+    assert service.cache_info()["size"] == 2
+
+
+def test_count_batch_matches_encoder():
+    service = TokenizerService()
+    service.count(TEXTS[1])
+    assert service.count_batch(TEXTS) == [len(ENCODING.encode(text)) for text in TEXTS]
+    assert service.hits == 1
+    assert service.count(TEXTS[0]) == service.count(TEXTS[-1])
+    assert service.hits == 3
@@ -0,0 +1,123 @@
+import random
+
+import tiktoken
+
+from src.processing.tokens import (
+    TokenAccumulator,
+    concatenated_token_count,
+    estimate_tokens,
+    is_token_boundary,
+    last_tokens,
+)
+
+TOKENIZER = tiktoken.get_encoding("cl100k_base")
+
+FRAGMENTS = [
+    "foo",
+    "Bar",
+    " ",
+    "  ",
+    "\t",
+    "\n",
+    "\r\n",
+    ".",
+    ":",
+    "```",
+    "- ",
+    "#",
+    "42",
+    "'s",
+    "é",
+    "日本",
+    "😀",
+    "{",
+]
+
+
+def random_line(rng: random.Random) -> str:
+    line = "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 8)))
+    return line + "\n" if rng.random() < 0.7 else line
+
+
+def test_is_token_boundary():
+    assert is_token_boundary("", "anything")
+    assert is_token_boundary("line\n", "next line")
+    assert is_token_boundary("line\n", "    indented")
+    assert not is_token_boundary("line", "continued")
+    assert not is_token_boundary("line\n", "\nblank")
+    assert not is_token_boundary("line\n", "   ")
+
+
+def test_token_accumulator_matches_full_encoding():
+    rng = random.Random(0)
+    for _ in range(300):
+        accumulator = TokenAccumulator(TOKENIZER)
+        text = ""
+        for _ in range(rng.randint(1, 60)):
+            addition = random_line(rng)
+            assert accumulator.count_with(addition) == len(TOKENIZER.encode(text + addition))
+            text += addition
+            assert accumulator.append(addition) == len(TOKENIZER.encode(text))
+
+
+def test_token_accumulator_reset():
+    accumulator = TokenAccumulator(TOKENIZER, "first line\n")
+    accumulator.count_with("second line\n")
+    assert accumulator.reset("second line\n") == len(TOKENIZER.encode("second line\n"))
+    assert accumulator.append("third\n") == len(TOKENIZER.encode("second line\nthird\n"))
+    assert accumulator.reset() == 0
+
+
+def test_estimate_tokens_is_an_upper_bound():
+    prose = "The API client sends a request with the model name and returns a streamed response.\n" * 20
+    code = "    response = client.messages.create(model=model, max_tokens=1024, messages=messages)\n" * 20
+    table = "| `timeout` | Seconds before a request is retried. |\n" * 20
+    digits = " ".join(str(n * 7919 % 1000003) for n in range(300))
+    letters = " ".join("qzxjkvbw"[n % 8] for n in range(500))
+    symbols = "| -> | => | != | && | :: | @ | # | % |\n" * 20
+    emoji, cjk = "😀 🚀 🔥 ✨ 👍🏽 " * 50, "".join(chr(0x4E00 + n * 37 % 20000) for n in range(400))
+    for text in (prose, code, table, digits, letters, symbols, emoji, cjk):
+        assert estimate_tokens(text) >= len(TOKENIZER.encode(text))
+    assert estimate_tokens("") == 0
+
+
+def test_token_accumulator_fits_with_estimates_matches_exact_counts():
+    rng = random.Random(1)
+    for _ in range(100):
+        accumulator = TokenAccumulator(TOKENIZER)
+        text = ""
+        for _ in range(rng.randint(1, 60)):
+            addition = random_line(rng)
+            limit = rng.randint(1, 80)
+            exact = len(TOKENIZER.encode(text + addition))
+            if accumulator.fits(addition, limit, margin=0.5):
+                assert exact <= limit
+                text += addition
+                accumulator.push(addition)
+            else:
+                assert exact > limit
+        assert accumulator.token_count == len(TOKENIZER.encode(text))
+
+
+def test_concatenated_token_count():
+    left, right = "some text:\n", "  - a list item\n"
+    count = concatenated_token_count(TOKENIZER, left, len(TOKENIZER.encode(left)), right, len(TOKENIZER.encode(right)))
+    assert count == len(TOKENIZER.encode(left + right))
+
+
+def test_concatenated_token_count_matches_full_encoding():
+    rng = random.Random(1)
+    for _ in range(500):
+        left = "".join(random_line(rng) for _ in range(rng.randint(0, 6)))
+        right = "".join(random_line(rng) for _ in range(rng.randint(0, 6)))
+        left_tokens, right_tokens = len(TOKENIZER.encode(left)), len(TOKENIZER.encode(right))
+        count = concatenated_token_count(TOKENIZER, left, left_tokens, right, right_tokens)
+        assert count == len(TOKENIZER.encode(left + right))
+
+
+def test_last_tokens_matches_full_encoding():
+    rng = random.Random(2)
+    for _ in range(300):
+        text = "".join(random_line(rng) for _ in range(rng.randint(0, 40)))
+        n = rng.randint(1, 60)
+        assert last_tokens(TOKENIZER, text, n) == TOKENIZER.encode(text)[-n:]
@@ -1,4 +1,16 @@
-from src.vector_storage.vector_db import DocumentProcessor, VectorDB
+import pytest
+
+import src.vector_storage.vector_db as vector_db_module
+from src.vector_storage.embedding_provider import MODEL_KEY
+from src.vector_storage.vector_db import VECTOR_BACKENDS, DocumentProcessor, NumpyVectorDB, VectorDB
+
+
+class StubSummaryManager:
+    def __init__(self):
+        self.summaries = {}
+
+    def clear_summaries(self):
+        self.summaries = {}
 
 
 def test_vector_db_initialization():
@@ -10,3 +22,20 @@ def test_vector_db_initialization():
 def test_document_processor_initialization():
     processor = DocumentProcessor()
     assert processor is not None
+
+
+@pytest.mark.parametrize("backend", sorted(VECTOR_BACKENDS))
+def test_reopening_a_store_with_another_model_is_refused(backend, tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_db_module, "SummaryManager", StubSummaryManager)
+    monkeypatch.setattr(vector_db_module, "CHROMA_DB_DIR", str(tmp_path / "chroma"))
+    monkeypatch.setattr(vector_db_module, "BM25_INDEX_DIR", str(tmp_path / "bm25"))
+
+    def open_store(model_name: str) -> VectorDB:
+        options = {"index_dir": str(tmp_path / "numpy")} if VECTOR_BACKENDS[backend] is NumpyVectorDB else {}
+        return VECTOR_BACKENDS[backend](model_name, embedding_provider="hashing", embedding_cache_dir=None, **options)
+
+    assert open_store("hashing-v1").collection.metadata[MODEL_KEY] == "hashing-v1"
+    # same dimension count, other model: the vectors are not comparable
+    with pytest.raises(ValueError, match="built with"):
+        open_store("hashing-v2")
+    assert open_store("hashing-v1").collection.metadata[MODEL_KEY] == "hashing-v1"